@@ -66,7 +66,7 @@ db_names = config.get_main_option("databases")
 logger.warning(f"Using the following databases with alembic: {db_names}")
 
 ######### Import all of the models we want to be autogenerated. Will proliferate to all schemas.
-from models import Pod, Password #, ExportedData
+from models import Pod, Password, PodStatusEvent, PodUsage #, ExportedData
 target_metadata = SQLModel.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,36 @@
+"""pod_permissions_gin
+
+Revision ID: 3f9a2c7d1e64
+Revises: 11c4c5bb1411
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c7d1e64'
+down_revision = '11c4c5bb1411'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    # GIN index so Pod.permissions.overlap() (`&&`) in db_get_all_with_permission is index backed.
+    op.create_index('ix_pod_permissions_gin', 'pod', ['permissions'], unique=False, postgresql_using='gin')
+
+
+def downgrade_alltenants():
+    op.drop_index('ix_pod_permissions_gin', table_name='pod')
@@ -0,0 +1,39 @@
+"""pod_resource_profiles
+
+Revision ID: 5b91d3e7a4c2
+Revises: e2f8b6a1c953
+Create Date: 2026-10-19 20:12:48.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = '5b91d3e7a4c2'
+down_revision = 'e2f8b6a1c953'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    # Existing pods keep the resources every pod got before profiles, which is the medium profile.
+    # Their resources are backfilled with it in 9d3c6f1a8e54, until then they're read from the profile when started.
+    op.add_column('pod', sa.Column('resource_profile', sqlmodel.sql.sqltypes.AutoString(), nullable=False, server_default='medium'))
+    op.add_column('pod', sa.Column('resources', sa.JSON(), nullable=True, server_default=sa.text("'{}'::json")))
+
+
+def downgrade_alltenants():
+    op.drop_column('pod', 'resources')
+    op.drop_column('pod', 'resource_profile')
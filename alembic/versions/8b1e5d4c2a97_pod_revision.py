@@ -0,0 +1,35 @@
+"""pod_revision
+
+Revision ID: 8b1e5d4c2a97
+Revises: 3f9a2c7d1e64
+Create Date: 2026-10-19 14:02:47.615230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e5d4c2a97'
+down_revision = '3f9a2c7d1e64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    op.add_column('pod', sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade_alltenants():
+    op.drop_column('pod', 'revision')
@@ -0,0 +1,133 @@
+"""pod_usage_quotas
+
+Revision ID: 9d3c6f1a8e54
+Revises: 5b91d3e7a4c2
+Create Date: 2026-10-19 21:40:17.662403
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3c6f1a8e54'
+down_revision = '5b91d3e7a4c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    op.add_column('pod', sa.Column('creator', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_table('pod_usage',
+        sa.Column('username', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('running_pods', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cpu', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('memory', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('pvc_storage', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('username')
+    )
+
+    # Existing pods: creator is the user of the first permission, which create_pod made the author's ADMIN.
+    # Resources are what they were started with before profiles (medium) and the fixed 10Gi pvc.
+    op.execute("UPDATE pod SET creator = split_part(permissions[1], ':', 1) WHERE creator IS NULL;")
+    op.execute("""
+        UPDATE pod SET resources = '{"mem_request": "250M", "cpu_request": "500", "mem_limit": "4G", "cpu_limit": "3000"}'::json
+        WHERE resources IS NULL OR resources::text = '{}';
+    """)
+    op.execute("""
+        UPDATE pod SET resources = (resources::jsonb || '{"pvc_storage": "10Gi"}'::jsonb)::json
+        WHERE persistent_volume IS NOT NULL AND persistent_volume::text NOT IN ('{}', 'null');
+    """)
+
+    # Bytes in a k8 memory quantity, same as resources.parse_memory.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_quota_bytes(quantity text) RETURNS bigint AS $$
+            SELECT COALESCE(trunc(substring(quantity from '^[0-9.]+')::numeric *
+                CASE substring(quantity from '[A-Za-z]+$')
+                    WHEN 'k' THEN 1000 WHEN 'M' THEN 1000000 WHEN 'G' THEN 1000000000 WHEN 'T' THEN 1000000000000
+                    WHEN 'Ki' THEN 1024 WHEN 'Mi' THEN 1048576 WHEN 'Gi' THEN 1073741824 WHEN 'Ti' THEN 1099511627776
+                    ELSE 1 END)::bigint, 0)
+        $$ LANGUAGE sql IMMUTABLE;
+    """)
+    # Adds (direction 1) or removes (-1) a pod row's claim to the tenant ("*") and creator usage rows.
+    # Rows are always locked "*" first, so concurrent writers can't deadlock on them.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_usage_add(pod_creator text, direction int, pod_status_requested text, pod_resources json) RETURNS void AS $$
+        DECLARE
+            running int := CASE WHEN pod_status_requested IN ('ON', 'RESTART') THEN 1 ELSE 0 END;
+        BEGIN
+            INSERT INTO pod_usage AS u (username, running_pods, cpu, memory, pvc_storage)
+            SELECT name,
+                   direction * running,
+                   direction * running * COALESCE((pod_resources->>'cpu_limit')::bigint, 0),
+                   direction * running * pod_quota_bytes(pod_resources->>'mem_limit'),
+                   direction * pod_quota_bytes(pod_resources->>'pvc_storage')
+            FROM unnest(ARRAY['*', pod_creator]) WITH ORDINALITY AS names(name, ord)
+            WHERE name IS NOT NULL
+            ORDER BY ord
+            ON CONFLICT (username) DO UPDATE SET running_pods = u.running_pods + EXCLUDED.running_pods,
+                                                 cpu = u.cpu + EXCLUDED.cpu,
+                                                 memory = u.memory + EXCLUDED.memory,
+                                                 pvc_storage = u.pvc_storage + EXCLUDED.pvc_storage;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    # Every writer (api, spawner, health, ttl) claims and releases through the pod table, so usage is kept
+    # by a trigger. Unlike pod_status_event it pins search_path to the tenant schema it's created in
+    # (migrations run with search_path set to the tenant), so the functions above resolve per tenant.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_quota_usage() RETURNS trigger
+        SET search_path FROM CURRENT AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.status_requested IS NOT DISTINCT FROM OLD.status_requested
+               AND NEW.resources::text IS NOT DISTINCT FROM OLD.resources::text
+               AND NEW.creator IS NOT DISTINCT FROM OLD.creator THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pod_usage_add(OLD.creator, -1, OLD.status_requested, OLD.resources);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pod_usage_add(NEW.creator, 1, NEW.status_requested, NEW.resources);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER pod_quota_usage AFTER INSERT OR DELETE OR UPDATE OF status_requested, resources, creator ON pod
+        FOR EACH ROW EXECUTE FUNCTION pod_quota_usage();
+    """)
+
+    # Start the counters from the pods that exist now.
+    op.execute("""
+        INSERT INTO pod_usage (username, running_pods, cpu, memory, pvc_storage)
+        SELECT CASE WHEN GROUPING(creator) = 1 THEN '*' ELSE creator END,
+               count(*) FILTER (WHERE status_requested IN ('ON', 'RESTART')),
+               COALESCE(sum((resources->>'cpu_limit')::bigint) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+               COALESCE(sum(pod_quota_bytes(resources->>'mem_limit')) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+               COALESCE(sum(pod_quota_bytes(resources->>'pvc_storage')), 0)
+        FROM pod
+        GROUP BY GROUPING SETS ((creator), ())
+        HAVING GROUPING(creator) = 1 OR creator IS NOT NULL;
+    """)
+
+
+def downgrade_alltenants():
+    op.execute("DROP TRIGGER IF EXISTS pod_quota_usage ON pod;")
+    op.execute("DROP FUNCTION IF EXISTS pod_quota_usage();")
+    op.execute("DROP FUNCTION IF EXISTS pod_usage_add(text, int, text, json);")
+    op.execute("DROP FUNCTION IF EXISTS pod_quota_bytes(text);")
+    op.drop_table('pod_usage')
+    op.drop_column('pod', 'creator')
@@ -0,0 +1,39 @@
+"""pod_keep_service_on_stop
+
+Revision ID: b6d2f8e4a317
+Revises: 9d3c6f1a8e54
+Create Date: 2026-10-19 23:12:05.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+from tapisservice.config import conf
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f8e4a317'
+down_revision = '9d3c6f1a8e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    op.add_column('pod', sa.Column('keep_service_on_stop', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Existing pods keep what the site-wide keep_service_on_stop gave them.
+    if conf.get("keep_service_on_stop", False):
+        op.execute("UPDATE pod SET keep_service_on_stop = true;")
+
+
+def downgrade_alltenants():
+    op.drop_column('pod', 'keep_service_on_stop')
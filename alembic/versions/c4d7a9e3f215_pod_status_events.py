@@ -0,0 +1,76 @@
+"""pod_status_events
+
+Revision ID: c4d7a9e3f215
+Revises: 8b1e5d4c2a97
+Create Date: 2026-10-19 16:40:12.918364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7a9e3f215'
+down_revision = '8b1e5d4c2a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    op.create_table('pod_status_events',
+        sa.Column('event_id', sa.BigInteger(), nullable=False),
+        sa.Column('pod_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('status_requested', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('event_ts', sa.DateTime(), server_default=sa.text("(now() at time zone 'utc')"), nullable=True),
+        sa.PrimaryKeyConstraint('event_id')
+    )
+    op.create_index(op.f('ix_pod_status_events_pod_id'), 'pod_status_events', ['pod_id'], unique=False)
+
+    # Every writer (api, spawner, health, ttl) changes status through the pod table, so the change log
+    # is kept by a trigger. Schema comes from TG_TABLE_SCHEMA as the app routes tenants with
+    # schema_translate_map, not search_path. NOTIFY payload lets listeners wake up per tenant.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_status_event() RETURNS trigger AS $$
+        DECLARE
+            new_event_id bigint;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status
+               AND NEW.status_requested IS NOT DISTINCT FROM OLD.status_requested THEN
+                RETURN NEW;
+            END IF;
+            EXECUTE format('INSERT INTO %I.pod_status_events (pod_id, status, status_requested) '
+                           'VALUES ($1, $2, $3) RETURNING event_id', TG_TABLE_SCHEMA)
+                INTO new_event_id
+                USING NEW.pod_id, NEW.status, NEW.status_requested;
+            PERFORM pg_notify('pod_status_events',
+                              json_build_object('tenant_id', TG_TABLE_SCHEMA,
+                                                'event_id', new_event_id,
+                                                'pod_id', NEW.pod_id,
+                                                'status', NEW.status)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER pod_status_event AFTER INSERT OR UPDATE OF status, status_requested ON pod
+        FOR EACH ROW EXECUTE FUNCTION pod_status_event();
+    """)
+
+
+def downgrade_alltenants():
+    op.execute("DROP TRIGGER IF EXISTS pod_status_event ON pod;")
+    op.execute("DROP FUNCTION IF EXISTS pod_status_event();")
+    op.drop_index(op.f('ix_pod_status_events_pod_id'), table_name='pod_status_events')
+    op.drop_table('pod_status_events')
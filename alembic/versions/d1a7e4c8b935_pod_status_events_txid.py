@@ -0,0 +1,40 @@
+"""pod_status_events_txid
+
+Revision ID: d1a7e4c8b935
+Revises: b6d2f8e4a317
+Create Date: 2026-10-20 00:41:53.207716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a7e4c8b935'
+down_revision = 'b6d2f8e4a317'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    # Existing events get txid 0, they're all committed and stay in event_id order ahead of new ones.
+    op.add_column('pod_status_events', sa.Column('txid', sa.BigInteger(), server_default='0', nullable=False))
+    # The pod_status_event trigger doesn't list txid, new events get the writing transaction's id.
+    op.execute("ALTER TABLE pod_status_events ALTER COLUMN txid SET DEFAULT pg_current_xact_id()::text::bigint;")
+    op.create_index('ix_pod_status_events_txid_event_id', 'pod_status_events', ['txid', 'event_id'], unique=False)
+
+
+def downgrade_alltenants():
+    op.drop_index('ix_pod_status_events_txid_event_id', table_name='pod_status_events')
+    op.drop_column('pod_status_events', 'txid')
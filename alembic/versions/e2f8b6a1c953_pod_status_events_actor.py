@@ -0,0 +1,90 @@
+"""pod_status_events_actor
+
+Revision ID: e2f8b6a1c953
+Revises: c4d7a9e3f215
+Create Date: 2026-10-19 18:05:33.207841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f8b6a1c953'
+down_revision = 'c4d7a9e3f215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+
+
+def upgrade_alltenants():
+    op.add_column('pod_status_events', sa.Column('pod_template', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('pod_status_events', sa.Column('actor', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('pod_status_events', sa.Column('reason', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_pod_status_events_event_ts'), 'pod_status_events', ['event_ts'], unique=False)
+
+    # actor is the writing connection's application_name, set to PODS_COMPONENT by each process.
+    # reason is the status_container message health writes alongside status.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_status_event() RETURNS trigger AS $$
+        DECLARE
+            new_event_id bigint;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status
+               AND NEW.status_requested IS NOT DISTINCT FROM OLD.status_requested THEN
+                RETURN NEW;
+            END IF;
+            EXECUTE format('INSERT INTO %I.pod_status_events (pod_id, status, status_requested, pod_template, actor, reason) '
+                           'VALUES ($1, $2, $3, $4, $5, $6) RETURNING event_id', TG_TABLE_SCHEMA)
+                INTO new_event_id
+                USING NEW.pod_id, NEW.status, NEW.status_requested, NEW.pod_template,
+                      NULLIF(current_setting('application_name', true), ''),
+                      NEW.status_container::json->>'message';
+            PERFORM pg_notify('pod_status_events',
+                              json_build_object('tenant_id', TG_TABLE_SCHEMA,
+                                                'event_id', new_event_id,
+                                                'pod_id', NEW.pod_id,
+                                                'status', NEW.status)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade_alltenants():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_status_event() RETURNS trigger AS $$
+        DECLARE
+            new_event_id bigint;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status
+               AND NEW.status_requested IS NOT DISTINCT FROM OLD.status_requested THEN
+                RETURN NEW;
+            END IF;
+            EXECUTE format('INSERT INTO %I.pod_status_events (pod_id, status, status_requested) '
+                           'VALUES ($1, $2, $3) RETURNING event_id', TG_TABLE_SCHEMA)
+                INTO new_event_id
+                USING NEW.pod_id, NEW.status, NEW.status_requested;
+            PERFORM pg_notify('pod_status_events',
+                              json_build_object('tenant_id', TG_TABLE_SCHEMA,
+                                                'event_id', new_event_id,
+                                                'pod_id', NEW.pod_id,
+                                                'status', NEW.status)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.drop_index(op.f('ix_pod_status_events_event_ts'), table_name='pod_status_events')
+    op.drop_column('pod_status_events', 'reason')
+    op.drop_column('pod_status_events', 'actor')
+    op.drop_column('pod_status_events', 'pod_template')
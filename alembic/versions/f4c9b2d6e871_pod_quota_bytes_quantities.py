@@ -0,0 +1,74 @@
+"""pod_quota_bytes_quantities
+
+Revision ID: f4c9b2d6e871
+Revises: d1a7e4c8b935
+Create Date: 2026-10-20 01:27:36.904152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel              ##### Required when using sqlmodel and not use sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c9b2d6e871'
+down_revision = 'd1a7e4c8b935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_alltenants"]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_alltenants"]()
+
+
+# Recount usage with the current pod_quota_bytes, so releases subtract what claims added.
+RECOUNT_USAGE = """
+    DELETE FROM pod_usage;
+    INSERT INTO pod_usage (username, running_pods, cpu, memory, pvc_storage)
+    SELECT CASE WHEN GROUPING(creator) = 1 THEN '*' ELSE creator END,
+           count(*) FILTER (WHERE status_requested IN ('ON', 'RESTART')),
+           COALESCE(sum((resources->>'cpu_limit')::bigint) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+           COALESCE(sum(pod_quota_bytes(resources->>'mem_limit')) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+           COALESCE(sum(pod_quota_bytes(resources->>'pvc_storage')), 0)
+    FROM pod
+    GROUP BY GROUPING SETS ((creator), ())
+    HAVING GROUPING(creator) = 1 OR creator IS NOT NULL;
+"""
+
+
+def upgrade_alltenants():
+    # Same as resources.parse_memory: every k8 suffix (n, u, m, P, E, Pi, Ei too), decimal exponents
+    # ("129e6"), and fractions of a byte rounded up.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_quota_bytes(quantity text) RETURNS bigint AS $$
+            SELECT COALESCE(ceil(substring(quantity from '^([0-9]+[.]?[0-9]*|[.][0-9]+)')::numeric *
+                CASE WHEN quantity ~ '[eE][-+]?[0-9]+$'
+                    THEN power(10::numeric, substring(quantity from '[eE]([-+]?[0-9]+)$')::numeric)
+                    ELSE CASE substring(quantity from '[A-Za-z]+$')
+                        WHEN 'n' THEN 0.000000001 WHEN 'u' THEN 0.000001 WHEN 'm' THEN 0.001
+                        WHEN 'k' THEN 1000 WHEN 'M' THEN 1000000 WHEN 'G' THEN 1000000000 WHEN 'T' THEN 1000000000000
+                        WHEN 'P' THEN 1000000000000000 WHEN 'E' THEN 1000000000000000000
+                        WHEN 'Ki' THEN 1024 WHEN 'Mi' THEN 1048576 WHEN 'Gi' THEN 1073741824 WHEN 'Ti' THEN 1099511627776
+                        WHEN 'Pi' THEN 1125899906842624 WHEN 'Ei' THEN 1152921504606846976
+                        ELSE 1 END
+                END)::bigint, 0)
+        $$ LANGUAGE sql IMMUTABLE;
+    """)
+    op.execute(RECOUNT_USAGE)
+
+
+def downgrade_alltenants():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pod_quota_bytes(quantity text) RETURNS bigint AS $$
+            SELECT COALESCE(trunc(substring(quantity from '^[0-9.]+')::numeric *
+                CASE substring(quantity from '[A-Za-z]+$')
+                    WHEN 'k' THEN 1000 WHEN 'M' THEN 1000000 WHEN 'G' THEN 1000000000 WHEN 'T' THEN 1000000000000
+                    WHEN 'Ki' THEN 1024 WHEN 'Mi' THEN 1048576 WHEN 'Gi' THEN 1073741824 WHEN 'Ti' THEN 1099511627776
+                    ELSE 1 END)::bigint, 0)
+        $$ LANGUAGE sql IMMUTABLE;
+    """)
+    op.execute(RECOUNT_USAGE)
@@ -1,11 +1,33 @@
+import threading
 from tapisservice.tenants import TenantCache
 from tapisservice.auth import get_service_tapis_client
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
 Tenants = TenantCache()
-try:
-    t = get_service_tapis_client(tenants=Tenants)
-except Exception as e:
-    logger.error(f'Could not instantiate tapy service client. Exception: {e}')
-    raise e
\ No newline at end of file
+
+
+class LazyServiceClient():
+    """
+    Creates the tapy service client on first attribute access instead of at import.
+    """
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        self._client = get_service_tapis_client(tenants=Tenants)
+                    except Exception as e:
+                        logger.error(f'Could not instantiate tapy service client. Exception: {e}')
+                        raise e
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+
+t = LazyServiceClient()
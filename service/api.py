@@ -1,4 +1,4 @@
-from req_utils import error_handler, HttpUrlRedirectMiddleware
+from req_utils import error_handler, HttpUrlRedirectMiddleware, TraceMiddleware
 from tapisservice.tapisfastapi.utils import GlobalsMiddleware
 from tapisservice.tapisfastapi.auth import TapisMiddleware
 
@@ -11,6 +11,7 @@ from api_pods import router as router_pods
 from api_pods_podid import router as router_pods_podsname
 from api_pods_podid_func import router as router_pods_podsname_func
 from api_misc import router as router_misc
+from tracing import trace_log_handlers
 
 
 description = """
@@ -60,6 +61,7 @@ api = FastAPI(
     exception_handlers={Exception: error_handler},
     middleware=[
         Middleware(HttpUrlRedirectMiddleware),
+        Middleware(TraceMiddleware),
         Middleware(GlobalsMiddleware),
         Middleware(TapisMiddleware, tenant_cache=Tenants, authn_callback=authentication, authz_callback=authorization)
     ])
@@ -68,3 +70,5 @@ api.include_router(router_pods)
 api.include_router(router_pods_podsname)
 api.include_router(router_pods_podsname_func)
 api.include_router(router_misc)
+
+trace_log_handlers()
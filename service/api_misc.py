@@ -1,24 +1,137 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import hashlib
+import json
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
 from tapisservice.errors import BaseTapisError
 from tapisservice.tapisfastapi.utils import g, ok, error
 from kubernetes_utils import get_traefik_configmap
+from routes import get_route_table, shard_names, shard_configmap_name
+from errors import ResourceError
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
 from models import TapisApiModel
 import yaml
+logger = get_logger(__name__)
 
 router = APIRouter()
 
+# Parsed traefik config shards: {(source, shard): {'version', 'config'}}. A shard is only re-parsed when its
+# version changes, version is the route table shard version or the shard configmap's resourceVersion.
+TRAEFIK_SHARD_CACHE = {}
+# /traefik-config responses: {shard or "merged": {'versions', 'body', 'etag'}}.
+TRAEFIK_CONFIG_CACHE = {}
+LIVE_ROUTES = conf.get("api_live_routes", True)
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    """If-None-Match check. Weak comparison, as RFC 9110 has for If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def get_traefik_config_shards():
+    """
+    Returns (source, {shard: (version, traefik.yml text)}). The live route table from the database, or the
+    pods-traefik-conf(-<shard>) configmaps health writes if live routes are off or the database can't be read.
+    """
+    if LIVE_ROUTES:
+        try:
+            return "live", get_route_table(conf.site_id).get()
+        except Exception as e:
+            logger.error(f"Error building live route table, serving traefik configmaps. e: {repr(e)}")
+    shards = {}
+    for shard in shard_names():
+        config = get_traefik_configmap(shard_configmap_name(shard))
+        if config is None:
+            logger.warning(f"Traefik configmap {shard_configmap_name(shard)} not found, skipping shard.")
+            continue
+        shards[shard] = (config.metadata.resource_version, config.data['traefik.yml'])
+    return "configmap", shards
+
+
+def parse_shard(source: str, shard: str, version, config_text: str):
+    cached = TRAEFIK_SHARD_CACHE.get((source, shard))
+    if cached and version is not None and cached['version'] == version:
+        return cached['config']
+    # Shards without pods render to an empty document.
+    config = yaml.safe_load(config_text) or {}
+    TRAEFIK_SHARD_CACHE[(source, shard)] = {'version': version, 'config': config}
+    return config
+
+
+def merge_traefik_configs(configs):
+    """Merge shard configs two levels deep, e.g. http.routers of every shard into one http.routers."""
+    merged = {}
+    for config in configs:
+        for section, section_val in config.items():
+            if not isinstance(section_val, dict):
+                merged[section] = section_val
+                continue
+            merged_section = merged.setdefault(section, {})
+            for key, val in section_val.items():
+                if isinstance(val, dict):
+                    merged_section.setdefault(key, {}).update(val)
+                elif val is not None:
+                    merged_section[key] = val
+    return merged
+
+
+def get_traefik_config_response(shard: str | None = None):
+    """
+    Parsed traefik config as json bytes with a strong ETag, one shard or all of them merged.
+    Cached by shard versions, only changed shards are re-parsed.
+    """
+    source, shards = get_traefik_config_shards()
+    if shard is not None:
+        if shard not in shards:
+            raise ResourceError(f"Traefik config shard {shard} not found. Shards: {list(shards)}.", 404)
+        shards = {shard: shards[shard]}
+    versions = (source, tuple((name, version) for name, (version, _) in sorted(shards.items())))
+    cache_key = shard or "merged"
+    cached = TRAEFIK_CONFIG_CACHE.get(cache_key)
+    if cached and cached['versions'] == versions and all(version is not None for _, version in versions[1]):
+        return cached
+    configs = [parse_shard(source, name, version, config_text) for name, (version, config_text) in shards.items()]
+    body = json.dumps(merge_traefik_configs(configs), sort_keys=True, separators=(",", ":")).encode('utf-8')
+    cached = {'versions': versions,
+              'body': body,
+              'etag': f'"{hashlib.sha256(body).hexdigest()}"'}
+    TRAEFIK_CONFIG_CACHE[cache_key] = cached
+    return cached
+
+
+def traefik_config_response(request: Request, shard: str | None = None):
+    config = get_traefik_config_response(shard)
+    headers = {"ETag": config['etag'], "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), config['etag']):
+        return Response(status_code=304, headers=headers)
+    return Response(content=config['body'], media_type="application/json", headers=headers)
+
+
+# Plain def, so FastAPI runs these in its threadpool. Route tables are built in the background, but the
+# configmap fallback and parsing/merging shards shouldn't hold the event loop either.
 @router.get("/traefik-config")
-async def api_traefik_config():
+def api_traefik_config(request: Request):
     """
     Supplies traefik-config to service. Returns json traefik-config object for
     traefik to use with the http provider. Dynamic configs don't work well in 
     Kubernetes.
+    Routes come live from the database (api_live_routes), with the configmap as fallback.
+    All route_shards are merged. Responses have an ETag, a matching If-None-Match gets a 304 with no body.
+    """
+    return traefik_config_response(request)
+
+@router.get("/traefik-config/shards/{shard}")
+def api_traefik_config_shard(request: Request, shard: str):
     """
-    print("boo")
-    config = get_traefik_configmap()
-    yaml_config = yaml.safe_load(config.to_dict()['data']['traefik.yml'])
-    return yaml_config
+    One shard of the traefik-config, "base" or 0..route_shards-1. For proxies that each serve a
+    subset of routes, or to read a single shard of a large route table.
+    """
+    return traefik_config_response(request, shard)
 
 @router.get("/healthcheck")
 async def api_healthcheck():
@@ -28,6 +141,14 @@ async def api_healthcheck():
     """
     return ok("I promise I'm healthy.")
 
+@router.api_route("/error-handler/pod-stopped", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+async def pod_stopped():
+    """Traefik's pod-stopped errors middleware sends 502/503s of keep_service_on_stop http pods here,
+    which is what their kept service answers with while the pod is stopped.
+    """
+    message = "Pod is not running. Start it with /pods/{pod_id}/start and retry once it's RUNNING."
+    return JSONResponse(status_code=503, content=error(message))
+
 @router.get("/error-handler")
 
 @router.get(
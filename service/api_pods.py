@@ -1,8 +1,17 @@
+import time
+from datetime import datetime, timedelta
+
 from fastapi import APIRouter
-from models import Pod, NewPod, Password, PodsResponse, PodResponse
-from channels import CommandChannel
+from fastapi.concurrency import run_in_threadpool
+from models import Pod, NewPod, Password, PodsResponse, PodResponse, PodStatusEvent, PodEventsResponse, PhaseDurationsResponse, \
+    DeadLettersResponse, QuotaResponse
+from channels import CommandChannel, CommandDeadLetterChannel
+from events import get_pod_event_notifier
+from errors import PermissionsException, ResourceError
+from quotas import check_quota, admit_pod, quota_usage
 from tapisservice.tapisfastapi.utils import g, ok
-from codes import REQUESTED, ON
+from tapisservice.config import conf
+from codes import REQUESTED, ON, STOPPED, ERROR, ADMIN_ROLE
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
@@ -49,6 +58,7 @@ async def create_pod(new_pod: NewPod):
     Notes:
     - Author will be given ADMIN level permissions to the pod.
     - status_requested defaults to "ON". So pod will immediately begin creation.
+    - Fails with 403 if the pod would put your tenant or you over quota, see GET /pods/quota.
 
     Returns new pod object.
     """
@@ -56,14 +66,20 @@ async def create_pod(new_pod: NewPod):
 
     # Create full Pod object. Validates as well.
     pod = Pod(**new_pod.dict())
+    # Fails fast before anything is written, admit_pod's check below is the one that holds.
+    check_quota(pod, running=pod.status_requested == ON, storage=True)
 
     # Create pod password db entry. If it's successful, we continue.
     password = Password(pod_id=pod.pod_id)
     password.db_create()
     logger.debug(f"Created password entry for {pod.pod_id}")
 
-    # Create pod database entry
-    pod.db_create()
+    # Create pod database entry, within quota.
+    try:
+        admit_pod(pod, "add", running=pod.status_requested == ON, storage=True)
+    except ResourceError:
+        password.db_delete()
+        raise
     logger.debug(f"New pod saved in db. pod_id: {pod.pod_id}; pod_template: {pod.pod_template}; tenant: {g.request_tenant_id}.")
 
     # If status_requested = On, then we request pod and put a command. Else leave in default STOPPED state. 
@@ -80,3 +96,199 @@ async def create_pod(new_pod: NewPod):
         logger.debug(f"Command Channel - Added msg for pod_id: {pod.pod_id}.")
 
     return ok(result=pod.display(), msg="Pod created successfully.")
+
+
+#### /pods/events
+
+@router.get(
+    "/pods/events",
+    tags=["Pods"],
+    summary="get_pod_events",
+    operation_id="get_pod_events",
+    response_model=PodEventsResponse)
+async def get_pod_events(cursor: str = "0", pod_id: str | None = None, timeout: int = 30):
+    """
+    Get pod status change events after cursor, for pods you have READ or higher access to.
+
+    Notes:
+    - Long-poll. If there are no events after cursor, waits up to timeout seconds (capped at api_wait_max_timeout) for one.
+    - Pass the returned cursor to the next call to get only newer events. Cursors are opaque, start with 0.
+    - Events show up once every transaction started before them has finished, so none are skipped.
+    - Optionally filter to one pod with pod_id.
+
+    Returns events and the next cursor.
+    """
+    logger.info(f"GET /pods/events - Top of get_pod_events. cursor: {cursor}; pod_id: {pod_id}")
+
+    try:
+        PodStatusEvent.parse_cursor(cursor)
+    except ValueError:
+        raise ResourceError(f"Invalid cursor: {cursor}. Use 0 or a cursor returned by this endpoint.", 400)
+
+    timeout = min(max(timeout, 0), conf.get("api_wait_max_timeout", 300))
+    deadline = time.monotonic() + timeout
+    notifier = get_pod_event_notifier(g.site_id)
+    notifier.start()
+    while True:
+        version = notifier.version
+        events = await run_in_threadpool(PodStatusEvent.db_get_since, cursor, user=g.username, tenant=g.request_tenant_id, site=g.site_id, pod_id=pod_id)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            break
+        # Woken by the pod_status_events NOTIFY for this tenant, re-query. Events held back for an
+        # older transaction that was still running get no NOTIFY of their own, the poll interval covers them.
+        await notifier.wait(g.request_tenant_id, min(remaining, conf.get("api_wait_poll_interval", 10)), since_version=version)
+
+    next_cursor = events[-1].cursor() if events else cursor
+    result = {"events": [event.dict() for event in events], "cursor": next_cursor}
+    return ok(result=result, msg=f"Retrieved {len(events)} pod events.")
+
+
+@router.get(
+    "/pods/events/durations",
+    tags=["Pods"],
+    summary="get_pod_phase_durations",
+    operation_id="get_pod_phase_durations",
+    response_model=PhaseDurationsResponse)
+async def get_pod_phase_durations(pod_template: str | None = None, since_hours: int = 168):
+    """
+    Report of how long pods spend in each status, per pod_template, from pod status events.
+
+    Notes:
+    - p50/p95/p99 seconds from entering status to moving to next_status, e.g. REQUESTED -> SPAWNER SETUP is queue time.
+    - Only counts pods you have READ or higher access to, with events in the last since_hours.
+
+    Returns a row per (pod_template, status, next_status).
+    """
+    logger.info(f"GET /pods/events/durations - Top of get_pod_phase_durations. pod_template: {pod_template}")
+
+    since = datetime.utcnow() - timedelta(hours=since_hours)
+    rows = await run_in_threadpool(PodStatusEvent.db_get_phase_durations, user=g.username, tenant=g.request_tenant_id,
+                                   site=g.site_id, since=since, pod_template=pod_template)
+
+    return ok(result=[dict(row._mapping) for row in rows], msg=f"Phase durations for events since {since}.")
+
+
+#### /pods/quota
+
+@router.get(
+    "/pods/quota",
+    tags=["Pods"],
+    summary="get_quota",
+    operation_id="get_quota",
+    response_model=QuotaResponse)
+async def get_quota(username: str | None = None):
+    """
+    Get your usage and quota, and your tenant's, of running pods, cpu, memory, and pvc storage.
+
+    Notes:
+    - Pods count as running while status_requested is ON or RESTART. pvc storage counts until the pod is deleted.
+    - Pods admins can get another user's usage with username.
+
+    Returns tenant and user usage and quota.
+    """
+    logger.info(f"GET /pods/quota - Top of get_quota. username: {username}")
+
+    if username and username != g.username and ADMIN_ROLE not in g.roles:
+        raise PermissionsException(f"Not authorized -- {ADMIN_ROLE} role required to view other users' quota.")
+    result = quota_usage(g.request_tenant_id, g.site_id, username or g.username)
+
+    return ok(result=result, msg="Quota retrieved successfully.")
+
+
+#### /pods/admin/dead-letters
+
+def dead_letter_display(cmd, headers):
+    return {"pod_id": cmd.get("pod_id"),
+            "command": cmd.get("command", "start"),
+            "attempts": int(headers.get("attempts", 1)),
+            "error": headers.get("error", ""),
+            "failed_at": headers.get("failed_at")}
+
+
+def read_dead_letters(site_id, tenant_id, limit):
+    dead_ch = CommandDeadLetterChannel(name=site_id)
+    try:
+        dead = dead_ch.get_dead(limit, match=lambda cmd: cmd.get("tenant_id") == tenant_id)
+        for _, _, msg in dead:
+            msg.nack(requeue=True)
+    finally:
+        dead_ch.close()
+    return [dead_letter_display(cmd, headers) for cmd, headers, _ in dead]
+
+
+def replay_tenant_dead_letters(site_id, tenant_id, pod_id, limit):
+    dead_ch = CommandDeadLetterChannel(name=site_id)
+    replayed = []
+    try:
+        match = lambda cmd: cmd.get("tenant_id") == tenant_id and (not pod_id or cmd.get("pod_id") == pod_id)
+        for cmd, headers, msg in dead_ch.get_dead(limit, match=match):
+            pod = Pod.db_get_with_pk(cmd["pod_id"], tenant=cmd["tenant_id"], site=cmd["site_id"])
+            if not pod:
+                logger.info(f"Dropping dead-lettered command for deleted pod: {cmd['pod_id']}.")
+                msg.ack()
+                continue
+            if pod.status not in [STOPPED, ERROR]:
+                logger.info(f"Not replaying command for pod: {pod.pod_id} in status: {pod.status}.")
+                msg.nack(requeue=True)
+                continue
+            pod.status = REQUESTED
+            pod.status_requested = ON
+            pod.db_update()
+            ch = CommandChannel(name=pod.site_id)
+            ch.replay(cmd, headers)
+            ch.close()
+            msg.ack()
+            replayed.append(dead_letter_display(cmd, headers))
+            logger.debug(f"Command Channel - Replayed dead-lettered msg for pod_id: {pod.pod_id}.")
+    finally:
+        dead_ch.close()
+    return replayed
+
+
+@router.get(
+    "/pods/admin/dead-letters",
+    tags=["Pods"],
+    summary="get_dead_letters",
+    operation_id="get_dead_letters",
+    response_model=DeadLettersResponse)
+async def get_dead_letters(limit: int = 100):
+    """
+    Get pod commands that the spawner gave up on, for pods in your tenant. Requires the pods admin role.
+
+    Notes:
+    - Transient errors are retried with exponential delay up to spawner_max_attempts, other errors are dead-lettered right away.
+    - Messages are only inspected, they stay on the dead-letter queue.
+
+    Returns a list of dead-lettered commands, oldest first.
+    """
+    logger.info(f"GET /pods/admin/dead-letters - Top of get_dead_letters.")
+
+    # rabbitpy calls block, keep them off the event loop.
+    dead_letters = await run_in_threadpool(read_dead_letters, g.site_id, g.request_tenant_id, limit)
+
+    return ok(result=dead_letters, msg=f"Retrieved {len(dead_letters)} dead-lettered commands.")
+
+
+@router.post(
+    "/pods/admin/dead-letters/replay",
+    tags=["Pods"],
+    summary="replay_dead_letters",
+    operation_id="replay_dead_letters",
+    response_model=DeadLettersResponse)
+async def replay_dead_letters(pod_id: str | None = None, limit: int = 100):
+    """
+    Put dead-lettered pod commands in your tenant back on the command channel. Requires the pods admin role.
+
+    Notes:
+    - Optionally only replay commands for pod_id.
+    - Commands are replayed as a start with attempts reset. Pods must be STOPPED or ERROR, others are left on the queue.
+    - Commands for pods that no longer exist are dropped.
+
+    Returns the replayed commands.
+    """
+    logger.info(f"POST /pods/admin/dead-letters/replay - Top of replay_dead_letters. pod_id: {pod_id}")
+
+    replayed = await run_in_threadpool(replay_tenant_dead_letters, g.site_id, g.request_tenant_id, pod_id, limit)
+
+    return ok(result=replayed, msg=f"Replayed {len(replayed)} dead-lettered commands.")
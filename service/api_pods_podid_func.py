@@ -1,8 +1,15 @@
+import time
+
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from models import Pod, NewPod, UpdatePod, Password, SetPermission, DeletePermission, PodResponse, PodPermissionsResponse, PodCredentialsResponse, PodLogsResponse
 from channels import CommandChannel
-from codes import OFF, ON, RESTART, REQUESTED
+from codes import OFF, ON, RESTART, REQUESTED, SPAWNER_SETUP, CREATING_CONTAINER, RUNNING, ERROR, POD_STATUSES
+from errors import ResourceError
+from events import get_pod_event_notifier
+from quotas import admit_pod
 from tapisservice.tapisfastapi.utils import g, ok
+from tapisservice.config import conf
 
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
@@ -201,15 +208,26 @@ async def start_pod(pod_id):
 
     Note:
     - Sets status_requested to ON. Pod will attempt to deploy.
+    - No-op if the pod is already ON and spawning or RUNNING. Repeated starts while REQUESTED are coalesced by the spawner.
+    - Fails with 403 if starting would put the tenant or pod creator over quota.
 
     Returns updated pod object.
     """
     logger.info(f"GET /pods/{pod_id}/start - Top of start_pod.")
 
     pod = Pod.db_get_with_pk(pod_id, tenant=g.request_tenant_id, site=g.site_id)
+    # Already starting or up, another command would only be discarded by the spawner (or fail on the existing k8 pod).
+    if pod.status_requested == ON and pod.status in [SPAWNER_SETUP, CREATING_CONTAINER, RUNNING]:
+        logger.debug(f"Pod {pod.pod_id} already ON in status {pod.status}, not adding command.")
+        return ok(result=pod.display(), msg = f"Pod already requested, status is {pod.status}.")
+    # Pods already ON or RESTART are counted against quota.
+    admit = pod.status_requested not in [ON, RESTART]
     pod.status_requested = ON
     pod.status = REQUESTED
-    pod.db_update()
+    if admit:
+        admit_pod(pod, "merge", running=True)
+    else:
+        pod.db_update()
 
     # Send command to start new pod
     ch = CommandChannel(name=pod.site_id)
@@ -230,17 +248,84 @@ async def start_pod(pod_id):
     response_model=PodResponse)
 async def restart_pod(pod_id):
     """
-    Restart a pod. CURRENTLY WORK IN PROGRESS. BROKEN.
+    Restart a pod.
 
     Note:
-    - Sets status_requested to OFF. If pod status gets to STOPPED, status_requested will be flipped to ON.
+    - RUNNING pods are restarted in place. Spawner replaces the k8 pod with revision + 1 and keeps
+      the service, pvc, and proxy route, so downtime is roughly the container start time.
+    - Otherwise sets status_requested to RESTART. If pod status gets to STOPPED, status_requested will be flipped to ON.
 
     Returns updated pod object.
     """
     logger.info(f"GET /pods/{pod_id}/restart - Top of restart_pod.")
 
     pod = Pod.db_get_with_pk(pod_id, tenant=g.request_tenant_id, site=g.site_id)
+    if pod.status == RUNNING and pod.status_requested == ON:
+        # Revision is bumped here, not in spawner, so health skips the old k8 pod (still ready, on the old
+        # revision) and can't move the pod back to RUNNING before spawner picks up the command.
+        pod.status = REQUESTED
+        pod.revision += 1
+        pod.db_update()
+
+        # Send command to replace the k8 pod
+        ch = CommandChannel(name=pod.site_id)
+        ch.put_cmd(pod_id=pod.pod_id,
+                   tenant_id=pod.tenant_id,
+                   site_id=pod.site_id,
+                   command="restart")
+        ch.close()
+        logger.debug(f"Command Channel - Added restart msg for pod_id: {pod.pod_id}.")
+
+        return ok(result=pod.display(), msg = "Restarting pod in place, k8 pod is being replaced.")
+
+    # Restarting a stopped pod starts it.
+    admit = pod.status_requested not in [ON, RESTART]
     pod.status_requested = RESTART
-    pod.db_update()
+    if admit:
+        admit_pod(pod, "merge", running=True)
+    else:
+        pod.db_update()
 
     return ok(result=pod.display(), msg = "Updated pod's status_requested to RESTART.")
+
+
+@router.get(
+    "/pods/{pod_id}/wait",
+    tags=["Pods"],
+    summary="wait_for_pod",
+    operation_id="wait_for_pod",
+    response_model=PodResponse)
+async def wait_for_pod(pod_id, status: str = RUNNING, timeout: int = 60):
+    """
+    Wait for a pod to reach a status. Long-poll, use instead of polling get_pod.
+
+    Note:
+    - Returns as soon as the pod is in status, or is in ERROR.
+    - Otherwise returns the current pod after timeout seconds, capped at api_wait_max_timeout (300 default).
+
+    Returns pod object.
+    """
+    logger.info(f"GET /pods/{pod_id}/wait - Top of wait_for_pod. status: {status}; timeout: {timeout}")
+    if status not in POD_STATUSES:
+        raise ResourceError(f"Invalid status: {status}. Must be one of {POD_STATUSES}.", 400)
+
+    timeout = min(max(timeout, 0), conf.get("api_wait_max_timeout", 300))
+    deadline = time.monotonic() + timeout
+    notifier = get_pod_event_notifier(g.site_id)
+    notifier.start()
+    while True:
+        version = notifier.version
+        pod = await run_in_threadpool(Pod.db_get_with_pk, pod_id, tenant=g.request_tenant_id, site=g.site_id)
+        if not pod:
+            # Deleted while waiting.
+            raise ResourceError(f"Pod with identifier '{pod_id}' not found", 404)
+        if pod.status == status:
+            return ok(result=pod.display(), msg = f"Pod reached status {status}.")
+        if pod.status == ERROR:
+            return ok(result=pod.display(), msg = f"Pod in ERROR while waiting for status {status}.")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return ok(result=pod.display(), msg = f"Timed out after {timeout}s waiting for status {status}. Current status: {pod.status}.")
+        # Re-read once the pod_status_events NOTIFY for this tenant comes in. The poll interval only
+        # covers notifications missed while the notifier reconnects.
+        await notifier.wait(g.request_tenant_id, min(remaining, conf.get("api_wait_poll_interval", 10)), since_version=version)
@@ -24,6 +24,14 @@ TOKEN_RE = re.compile('Bearer (.+)')
 WORLD_USER = 'ABACO_WORLD'
 
 
+# Paths under /pods without a pod_id. "events" is a reserved pod_id.
+EVENTS_PATHS = ('/pods/events', '/pods/events/durations')
+# Paths under /pods without a pod_id for the user's own usage. "quota" is a reserved pod_id.
+QUOTA_PATHS = ('/pods/quota',)
+# Tenant wide admin paths, require the pods admin role. "admin" is a reserved pod_id.
+ADMIN_PATHS = ('/pods/admin/dead-letters', '/pods/admin/dead-letters/replay')
+
+
 def get_user_sk_roles():
     """
     Using values from the g object. Gets roles for a user with g.username and g.request_tenant_id
@@ -140,11 +148,15 @@ def authorization(request):
         request.url.path == '/docs' or
         request.url.path == '/openapi.json' or
         request.url.path == '/traefik-config' or
+        request.url.path.startswith('/traefik-config/') or
         request.url.path.startswith('/error-handler/')):
         logger.debug(f"Spec, Docs, Traefik conf doesn't need auth. Skipping. url.path: {request.url.path}")
         return
     elif (request.url.path == '/pods' or 
           request.url.path == '/pods/' or
+          request.url.path in EVENTS_PATHS or
+          request.url.path in QUOTA_PATHS or
+          request.url.path in ADMIN_PATHS or
           request.url.path == '/docs'):
         logger.debug(f"Don't need to run check_pod_id(), no pod_id in url.path: {request.url.path}")
         pass
@@ -179,6 +191,23 @@ def authorization(request):
     #     return True
 
     #### Do checks for pods read/user/admin roles. Add in "required_roles" attr when neccessary in api.
+    # /pods/events paths only return data for pods the user has READ on, filtered in the query.
+    if request.url.path in EVENTS_PATHS:
+        logger.debug("GET on pod events. allowing request.")
+        return True
+
+    # /pods/quota checks the pods admin role itself when another user's usage is asked for.
+    if request.url.path in QUOTA_PATHS:
+        logger.debug("GET on quota. allowing request.")
+        return True
+
+    if request.url.path in ADMIN_PATHS:
+        if codes.ADMIN_ROLE in g.roles:
+            logger.info("Allowing request on admin path because of ADMIN_ROLE.")
+            return True
+        logger.info("NOT allowing request on admin path, user lacks ADMIN_ROLE.")
+        raise PermissionsException(f"Not authorized -- {codes.ADMIN_ROLE} role required.")
+
     # there are special rules on the pods root collection:
     if '/pods' == request.url.path or '/pods/' == request.url.path:
         logger.debug("Checking permissions on root collection.")
@@ -239,6 +268,11 @@ def authorization(request):
             if request.method == 'GET':
                 # GET creds requires USER
                 has_pem = check_permissions(user=g.username, pod=pod, level=codes.ADMIN)
+        # Check for func = wait
+        if path_split[3] == "wait":
+            if request.method == 'GET':
+                # GET wait requires READ
+                has_pem = check_permissions(user=g.username, pod=pod, level=codes.READ)
     else:
         # Now just /pods/{pod_id}
         if request.method == 'GET':
@@ -266,5 +300,6 @@ def authentication(request):
         request.url.path == '/docs' or
         request.url.path == '/openapi.json' or
         request.url.path == '/traefik-config' or
+        request.url.path.startswith('/traefik-config/') or
         request.url.path.startswith('/error-handler/')):
         pass
\ No newline at end of file
@@ -1,8 +1,10 @@
-
+import time
+from datetime import datetime
 
 from tapisservice.config import conf
 from stores import get_site_rabbitmq_uri
 from queues import BinaryTaskQueue
+from tracing import current_traceparent
 from tapisservice.tapisfastapi.utils import g
 
 def site():
@@ -11,22 +13,122 @@ def site():
 
 RABBIT_URI = get_site_rabbitmq_uri(site())
 
+def check_queue_name(name: str):
+    queues_list = ["tacc"]
+    #queues_list = conf.get('spawner_host_queues')
+    if name not in queues_list:
+        raise Exception('Invalid Queue name.')
+
+
 class CommandChannel(BinaryTaskQueue):
     """Work with commands on the command channel."""
 
     def __init__(self, name: str = "tacc"):
         self.uri = RABBIT_URI
-        queues_list = ["tacc"]
-        #queues_list = conf.get('spawner_host_queues')
-        if name not in queues_list:
-            raise Exception('Invalid Queue name.')
+        check_queue_name(name)
 
         super().__init__(name=f'command_channel_{name}')
 
-    def put_cmd(self, pod_id, tenant_id, site_id):
-        """Put a new command on the command channel."""
+    def put_cmd(self, pod_id, tenant_id, site_id, command: str = "start"):
+        """
+        Put a new command on the command channel. command is "start" or "restart".
+        The current traceparent and publish time are sent as message headers for the spawner's spans.
+        """
         msg = {'pod_id': pod_id,
                'tenant_id': tenant_id,
-               'site_id': site_id}
+               'site_id': site_id,
+               'command': command}
+        headers = {'sent_ns': str(time.time_ns())}
+        traceparent = current_traceparent()
+        if traceparent:
+            headers['traceparent'] = traceparent
+
+        self.put(msg, headers=headers)
+
+    def replay(self, cmd, headers: dict):
+        """
+        Put a dead-lettered command back on the command channel as a first attempt. Always a start,
+        the pod was shut down (service included) when the command was dead-lettered.
+        """
+        cmd = {**cmd, 'command': 'start'}
+        headers = {key: val for key, val in headers.items() if key in ('traceparent',)}
+        headers['sent_ns'] = str(time.time_ns())
+        self.put(cmd, headers=headers)
+
+
+class CommandRetryChannel(BinaryTaskQueue):
+    """
+    Delay queue for command retries. Nothing consumes it, messages expire after delay seconds and
+    RabbitMQ dead-letters them back onto the command channel. Queue TTL is fixed at declare time,
+    so there's one queue per delay, named by it.
+    """
+
+    def __init__(self, delay: int, name: str = "tacc"):
+        self.uri = RABBIT_URI
+        check_queue_name(name)
+        self.delay = delay
+
+        super().__init__(name=f'command_channel_{name}_retry_{delay}s',
+                         message_ttl=delay * 1000,
+                         dead_letter_routing_key=f'command_channel_{name}',
+                         # Default exchange. rabbitpy drops a falsy dead_letter_exchange, so it's set directly.
+                         arguments={'x-dead-letter-exchange': ''})
+
+    def put_retry(self, cmd, attempt: int, error: str):
+        """Put cmd on this delay queue. It reaches the spawner again as attempt `attempt`."""
+        headers = {'attempt': str(attempt),
+                   'last_error': error[:1000],
+                   # Time the command is back on the command channel, for the queued span.
+                   'sent_ns': str(time.time_ns() + self.delay * 1_000_000_000)}
+        traceparent = current_traceparent()
+        if traceparent:
+            headers['traceparent'] = traceparent
+
+        self.put(cmd, headers=headers)
+
+
+class CommandDeadLetterChannel(BinaryTaskQueue):
+    """Commands that failed permanently or ran out of attempts. Inspected and replayed by admins."""
+
+    def __init__(self, name: str = "tacc"):
+        self.uri = RABBIT_URI
+        check_queue_name(name)
+
+        super().__init__(name=f'command_channel_{name}_dead')
+
+    def put_dead(self, cmd, attempts: int, error: str):
+        headers = {'attempts': str(attempts),
+                   'error': error[:1000],
+                   'failed_at': datetime.utcnow().isoformat()}
+        traceparent = current_traceparent()
+        if traceparent:
+            headers['traceparent'] = traceparent
+
+        self.put(cmd, headers=headers)
 
-        self.put(msg)
+    def get_dead(self, limit: int = 100, match=None):
+        """
+        Up to limit dead-lettered messages as (cmd, headers, msg) for which match(cmd) is true, all if match
+        is None. Caller must ack() each msg to remove it or nack(requeue=True) to leave it on the queue.
+        Messages that don't match are left on the queue.
+        """
+        dead = []
+        skipped = []
+        try:
+            while len(dead) < limit:
+                msgs = self.get_messages(1)
+                if not msgs:
+                    break
+                msg = msgs[0]
+                cmd = self._post_process(msg)
+                if match and not match(cmd):
+                    # Held unacked until we're done, so it isn't fetched again.
+                    skipped.append(msg)
+                    continue
+                headers = {key: val.decode('utf-8') if isinstance(val, bytes) else val
+                           for key, val in (msg.properties.get('headers') or {}).items()}
+                dead.append((cmd, headers, msg))
+        finally:
+            for msg in skipped:
+                msg.nack(requeue=True)
+        return dead
@@ -13,6 +13,7 @@ RUNNING = 'RUNNING'
 SHUTTING_DOWN = 'SHUTTING_DOWN'
 STOPPED = 'STOPPED'
 ERROR = 'ERROR'
+POD_STATUSES = [REQUESTED, SPAWNER_SETUP, CREATING_CONTAINER, COMPLETE, RUNNING, SHUTTING_DOWN, STOPPED, ERROR]
 
 class PermissionLevel(object):
 
@@ -0,0 +1,124 @@
+"""
+Deletion tracker for pods. Health issues the k8 pod and service deletes for a pod once and records
+the deletion here. The k8 pod and service caches' watches mark each k8 object gone on its DELETED event,
+and when both are gone (just the pod for pods with keep_service_on_stop) the pod is moved to STOPPED right away instead of waiting for later sweeps.
+Health's k8 listings are also fed in each tick so a missed watch event can't leave a pod SHUTTING_DOWN.
+"""
+import functools
+import threading
+import timeit
+
+from sqlalchemy import update, case
+from codes import ON, OFF, RESTART, STOPPED
+from kubernetes_utils import K8_POD_CACHE, K8_SERVICE_CACHE, rm_container, rm_service, KubernetesError
+from metrics import POD_DELETION_SECONDS, PODS_DELETING, POD_DELETION_REISSUES
+from models import Pod
+from stores import pg_store
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+
+class DeletionTracker():
+    def __init__(self, timeout: int = 120):
+        # Seconds before deletes are reissued for a pod whose k8 objects are still around.
+        self.timeout = timeout
+        # k8_name: {'key': (site_id, tenant_id, pod_id), 'started': float, 'pod_gone': bool, 'service_gone': bool, 'keep_service': bool}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def track(self, pod):
+        """
+        Issue k8 deletes for pod unless they're already in flight. Deletes are only reissued once
+        the deletion is older than self.timeout. Returns True if deletes were issued.
+        """
+        now = timeit.default_timer()
+        with self.lock:
+            entry = self.in_flight.get(pod.k8_name)
+            if entry and now - entry['started'] < self.timeout:
+                return False
+            if entry:
+                logger.warning(f"Deletion of {pod.k8_name} not done after {self.timeout}s. Reissuing deletes.")
+                POD_DELETION_REISSUES.inc()
+                entry['started'] = now
+            else:
+                entry = {'key': (pod.site_id, pod.tenant_id, pod.pod_id),
+                         'started': now,
+                         'pod_gone': False,
+                         # keep_service_on_stop pods only delete the k8 pod, the service is kept for the next start.
+                         'service_gone': pod.keep_service_on_stop,
+                         'keep_service': pod.keep_service_on_stop}
+                self.in_flight[pod.k8_name] = entry
+            PODS_DELETING.set(len(self.in_flight))
+
+        # Errors (including not found) are left for the watches and health listings to settle.
+        if not entry['pod_gone']:
+            try:
+                rm_container(pod.k8_name)
+            except KubernetesError:
+                pass
+        if not entry['service_gone']:
+            try:
+                rm_service(pod.k8_name)
+            except KubernetesError:
+                pass
+        return True
+
+    def is_deleting(self, k8_name: str):
+        with self.lock:
+            return k8_name in self.in_flight
+
+    def mark_deleted(self, kind: str, k8_name: str):
+        """Mark k8 pod or service of a tracked deletion as gone. Finishes the deletion once both are."""
+        with self.lock:
+            entry = self.in_flight.get(k8_name)
+            if not entry:
+                return
+            entry[f"{kind}_gone"] = True
+            if not (entry['pod_gone'] and entry['service_gone']):
+                return
+            del self.in_flight[k8_name]
+            PODS_DELETING.set(len(self.in_flight))
+        POD_DELETION_SECONDS.observe(timeit.default_timer() - entry['started'])
+        self.finish(k8_name, *entry['key'])
+
+    def reconcile(self, k8_pod_keys, k8_service_keys):
+        """Mark tracked deletions gone when health's listings no longer have their k8 pod or service."""
+        with self.lock:
+            entries = list(self.in_flight.items())
+        for k8_name, entry in entries:
+            if entry['key'] not in k8_pod_keys:
+                self.mark_deleted("pod", k8_name)
+            if not entry['keep_service'] and entry['key'] not in k8_service_keys:
+                self.mark_deleted("service", k8_name)
+
+    def finish(self, k8_name, site_id, tenant_id, pod_id):
+        """Move pod to STOPPED, and RESTART back to ON. Conditions skip pods that changed since tracking."""
+        stmt = (update(Pod)
+                .where(Pod.pod_id == pod_id,
+                       Pod.status != STOPPED,
+                       Pod.status_requested.in_([OFF, RESTART]))
+                .values(status=STOPPED,
+                        start_instance_ts=None,
+                        time_to_stop_ts=None,
+                        time_to_stop_instance=None,
+                        status_container={},
+                        status_requested=case((Pod.status_requested == RESTART, ON), else_=Pod.status_requested))
+                .execution_options(synchronize_session=False))
+        try:
+            pg_store[site_id][tenant_id].run("execute", stmt)
+            logger.info(f"pod_id: {pod_id} found with container and service stopped. Moving to status = STOPPED.")
+        except Exception as e:
+            logger.error(f"Error moving pod {k8_name} to STOPPED after deletion. e: {repr(e)}")
+
+    def on_event(self, kind: str, event_type: str, k8_object):
+        if event_type == "DELETED":
+            self.mark_deleted(kind, k8_object.metadata.name)
+
+    def start(self):
+        for kind, cache in [("pod", K8_POD_CACHE), ("service", K8_SERVICE_CACHE)]:
+            cache.add_handler(functools.partial(self.on_event, kind))
+            cache.start()
+
+
+DELETION_TRACKER = DeletionTracker(timeout=conf.get("health_deletion_timeout", 120))
@@ -0,0 +1,114 @@
+"""
+Push side of GET /pods/events. The pod_status_event trigger NOTIFYs on the pod_status_events channel
+with every status transition. PodEventNotifier LISTENs on a dedicated connection per site and wakes
+long-poll requests waiting on that tenant, so waiting requests don't poll the database.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+
+import psycopg2
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+
+class PodEventNotifier():
+    def __init__(self, site_id: str):
+        self.site_id = site_id
+        # tenant_id: {(loop, asyncio.Event), ...}
+        self.waiters = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        # Bumped on every batch of notifications (and on reconnect, events may have been missed).
+        # Lets caches of pod derived data know when to rebuild.
+        self.version = 0
+        self.version_changed = threading.Condition()
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.listen, name=f"pod-events-{self.site_id}", daemon=True)
+            self.thread.start()
+
+    def listen(self):
+        logger.info(f"Top of PodEventNotifier.listen() for site: {self.site_id}.")
+        while True:
+            try:
+                # Dedicated connection, LISTEN holds it for good so it shouldn't come from the pool.
+                conn = psycopg2.connect(host=conf.postgres_host,
+                                        user=conf.postgres_user,
+                                        password=conf.postgres_pass,
+                                        dbname=self.site_id)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute("LISTEN pod_status_events;")
+                self.bump_version()
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    tenants = set()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            tenants.add(json.loads(notify.payload)['tenant_id'])
+                        except Exception as e:
+                            logger.debug(f"Couldn't parse pod_status_events payload: {notify.payload}. e: {repr(e)}")
+                    self.bump_version()
+                    for tenant_id in tenants:
+                        self.wake(tenant_id)
+            except Exception as e:
+                logger.error(f"Error listening for pod events in site: {self.site_id}, reconnecting. e: {repr(e)}")
+                time.sleep(5)
+
+    def bump_version(self):
+        with self.version_changed:
+            self.version += 1
+            self.version_changed.notify_all()
+
+    def wait_version(self, version: int, timeout: float):
+        """Block up to timeout seconds until self.version isn't version. Returns the current version."""
+        self.start()
+        with self.version_changed:
+            self.version_changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def wake(self, tenant_id: str):
+        with self.lock:
+            waiters = self.waiters.pop(tenant_id, set())
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, tenant_id: str, timeout: float, since_version: int | None = None):
+        """
+        Wait up to timeout seconds for a pod event in tenant_id. Returns True if one came in.
+        since_version is self.version from before the caller's last read, if notifications came in
+        since then this returns right away, so events between the read and the wait aren't missed.
+        """
+        self.start()
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self.lock:
+            self.waiters.setdefault(tenant_id, set()).add(waiter)
+        if since_version is not None and self.version != since_version:
+            event.set()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.lock:
+                self.waiters.get(tenant_id, set()).discard(waiter)
+
+
+POD_EVENT_NOTIFIERS = {}
+
+def get_pod_event_notifier(site_id: str):
+    notifier = POD_EVENT_NOTIFIERS.get(site_id)
+    if notifier is None:
+        notifier = POD_EVENT_NOTIFIERS.setdefault(site_id, PodEventNotifier(site_id))
+    return notifier
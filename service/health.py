@@ -32,23 +32,45 @@ Running mode, either:
 """
 
 import time
+import timeit
+import contextvars
 import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
 from datetime import datetime, timedelta
-from kubernetes import client, config
 from kubernetes_utils import get_current_k8_services, get_current_k8_pods, rm_container, \
-    get_current_k8_pods, rm_service, KubernetesError, update_traefik_configmap, get_k8_logs
+    get_current_k8_pods, rm_service, KubernetesError, update_traefik_configmap, get_k8_logs, \
+    get_current_k8_pvcs, rm_stale_traefik_configmaps, k8
 from codes import RUNNING, SHUTTING_DOWN, STOPPED, ERROR, COMPLETE, RESTART, ON, OFF
-from stores import pg_store, SITE_TENANT_DICT
+from stores import pg_store, SITE_TENANT_DICT, get_pg_pool_stats
+from store import count_queries
 from models import Pod, ExportedData
+from ttl import TTL_SCHEDULER
+from deletions import DELETION_TRACKER
+from routes import RouteShards, shard_configmap_name
+from tracing import span, trace_log_handlers, TRACEPARENT_ANNOTATION
+from metrics import HEALTH_TICK_SECONDS, HEALTH_PHASE_SECONDS, HEALTH_TICKS_OVER_BUDGET, \
+    HEALTH_DB_QUERIES_LAST_TICK, HEALTH_RECONCILE, set_pod_status_counts, set_pool_stats, start_metrics_server
 from sqlmodel import select
+from sqlalchemy import update
 from tapisservice.config import conf
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
 
-# k8 client creation
-config.load_incluster_config()
-k8 = client.CoreV1Api()
+# Worker pool for health sweeps. Tenant fetches and per pod checks run here.
+# health_postgres_pool should allow about this many connections.
+HEALTH_EXECUTOR = ThreadPoolExecutor(conf.get("health_max_workers", 8))
+HEALTH_TENANT_TIMEOUT = conf.get("health_tenant_timeout", 30)
+# {tenant_id: [Pod, ...]} from the last successful fetch of each tenant.
+LAST_TENANT_PODS = {}
+# Health aims to start a tick every health_tick_interval seconds, warns when one takes over health_tick_budget.
+HEALTH_TICK_INTERVAL = conf.get("health_tick_interval", 1)
+HEALTH_TICK_BUDGET = conf.get("health_tick_budget", 30)
+# Rendered traefik config shards, written to the pods-traefik-conf(-<shard>) configmaps.
+HEALTH_ROUTES = RouteShards()
+# Whole route table when sharded, written to pods-traefik-conf. Traefik mounts that one.
+HEALTH_FULL_ROUTES = RouteShards(shards=1)
 
 
 def rm_pod(k8_name):
@@ -83,6 +105,39 @@ def graceful_rm_pod(pod):
 
     return rm_pod(pod.k8_name)
 
+def write_pod_columns(pod, *columns, where=()):
+    """
+    Writes only columns of pod to its row. Health runs alongside the TTL and deletion threads, a whole row
+    merge (db_update) of a pod read earlier would undo their status_requested and status writes.
+    where adds conditions to the update. Returns False if the row no longer matched them.
+    """
+    stmt = (update(Pod)
+            .where(Pod.pod_id == pod.pod_id, *where)
+            .values({column: getattr(pod, column) for column in columns})
+            .execution_options(synchronize_session=False))
+    result = pg_store[pod.site_id][pod.tenant_id].run("execute", stmt)
+    return result.rowcount > 0
+
+def k8_index(k8_objects):
+    """
+    Hash index of k8 objects from get_current_k8_* keyed by (site_id, tenant_id, pod_id).
+    """
+    return {(k8_obj['site_id'], k8_obj['tenant_id'], k8_obj['pod_id']): k8_obj for k8_obj in k8_objects}
+
+def record_pod_ready_span(k8_pod):
+    """
+    Span from k8 pod creation to health seeing it ready, continuing the spawner's trace from the
+    pod's traceparent annotation.
+    """
+    metadata = k8_pod['pod_info'].metadata
+    traceparent = (metadata.annotations or {}).get(TRACEPARENT_ANNOTATION)
+    if not traceparent:
+        return
+    start_ns = int(metadata.creation_timestamp.timestamp() * 1e9) if metadata.creation_timestamp else None
+    with span("health.pod_ready", traceparent=traceparent, start_ns=start_ns,
+              attributes={"pod_id": k8_pod['pod_id'], "tenant_id": k8_pod['tenant_id'], "site_id": k8_pod['site_id']}):
+        logger.info(f"pod_id: {k8_pod['pod_id']} is ready. Moving to status = RUNNING.")
+
 def check_k8_pods(k8_pods):
     # This is all for only the site specified in conf.site_id.
     # Each site should get it's own health pod.
@@ -92,6 +147,10 @@ def check_k8_pods(k8_pods):
     for k8_pod in k8_pods:
         logger.info(f"Checking pod health for pod_id: {k8_pod['pod_id']}")
 
+        # Pod is being deleted, DELETION_TRACKER handles its status from here.
+        if DELETION_TRACKER.is_deleting(k8_pod['k8_name']):
+            continue
+
         # Check if pod is found in database.
         pod = Pod.db_get_with_pk(k8_pod['pod_id'], k8_pod['tenant_id'], k8_pod['site_id'])
         # We've found a pod without a database entry. Shut it and potential service down.
@@ -99,6 +158,12 @@ def check_k8_pods(k8_pods):
             logger.warning(f"Found k8 pod without any database entry. Deleting. Pod: {k8_pod['k8_name']}")
             rm_pod(k8_pod['k8_name'])
             continue
+
+        # Old revision being replaced by a restart. Its shutdown shouldn't change the pod's status.
+        k8_revision = (k8_pod['pod_info'].metadata.labels or {}).get('revision')
+        if k8_revision and int(k8_revision) < pod.revision:
+            logger.debug(f"Skipping k8 pod {k8_pod['k8_name']} revision {k8_revision}, pod is on revision {pod.revision}.")
+            continue
         
         # Found pod in db.
         # TODO Update status in db.
@@ -115,8 +180,10 @@ def check_k8_pods(k8_pods):
         # We try to get c_state. c_state when pending is None for a bit.
         try:
             c_state = k8_pod['pod_info'].status.container_statuses[0].state
+            c_ready = bool(k8_pod['pod_info'].status.container_statuses[0].ready)
         except:
             c_state = None
+            c_ready = False
         logger.debug(f'state: {c_state}')
 
         # This is actually bad. Means the pod has stopped, which shouldn't be the case.
@@ -126,7 +193,7 @@ def check_k8_pods(k8_pods):
             status_container['message'] = "Pod phase in Succeeded, putting in COMPLETE status."
             pod.status_container = status_container
             pod.status = COMPLETE
-            pod.db_update()
+            write_pod_columns(pod, "status", "status_container")
             continue
         elif k8_pod_phase in ["Running", "Pending", "Failed"]:
             # Check if container running or in error state
@@ -137,33 +204,46 @@ def check_k8_pods(k8_pods):
                     status_container['message'] = f"Pod in waiting state for reason: {c_state.waiting.message}."
                     pod.status_container = status_container
                     pod.status = ERROR
-                    pod.db_update()
+                    write_pod_columns(pod, "status", "status_container")
                     continue
                 elif c_state.terminated:
                     logger.critical(f"Kube pod in terminated state. msg:{c_state.terminated.message}; reason: {c_state.terminated.reason}")
                     status_container['message'] = f"Pod in terminated state for reason: {c_state.terminated.message}."
                     pod.status_container = status_container
                     pod.status = ERROR
-                    pod.db_update()
+                    write_pod_columns(pod, "status", "status_container")
                     continue
                 elif c_state.waiting and c_state.waiting.reason == "ContainerCreating":
                     logger.info(f"Kube pod in waiting state, still creating container.")
                     status_container['message'] = "Pod is still initializing."
                     pod.status_container = status_container
-                    pod.db_update()
+                    write_pod_columns(pod, "status_container")
                     continue
+                elif c_state.running and not c_ready and pod.status != RUNNING:
+                    # Templates define readiness probes, only RUNNING once the server accepts connections.
+                    logger.info(f"Kube pod running, waiting on readiness probe.")
+                    status_container['message'] = "Pod is running, waiting for it to pass its readiness probe."
+                    pod.status_container = status_container
+                    write_pod_columns(pod, "status_container")
                 elif c_state.running:
                     status_container['message'] = "Pod is running."
                     pod.status_container = status_container
                     # This is the first time pod is in RUNNING. Update start_instance_ts.
                     if pod.status != RUNNING:
+                        record_pod_ready_span(k8_pod)
                         pod.start_instance_ts = datetime.utcnow()
                         if isinstance(pod.time_to_stop_instance, int):
-                            pod.time_to_stop_ts = datetime.utcnow() + timedelta(seconds=pod.time_to_stop_instance)
+                            time_to_stop = pod.time_to_stop_instance
+                        else:
+                            time_to_stop = pod.time_to_stop_default
+                        # -1 is unlimited, no time_to_stop_ts to schedule.
+                        if time_to_stop == -1:
+                            pod.time_to_stop_ts = None
                         else:
-                            pod.time_to_stop_ts = datetime.utcnow() + timedelta(seconds=pod.time_to_stop_default)
+                            pod.time_to_stop_ts = datetime.utcnow() + timedelta(seconds=time_to_stop)
                     pod.status = RUNNING
-                    pod.db_update()
+                    write_pod_columns(pod, "status", "status_container", "start_instance_ts", "time_to_stop_ts")
+                    TTL_SCHEDULER.schedule(pod)
             else:
                 # Not sure if this is possible/what happens here.
                 # There is definitely an Error state. Can't replicate locally yet.
@@ -172,13 +252,14 @@ def check_k8_pods(k8_pods):
         # Getting here means pod is running. Store logs now.
         logs = get_k8_logs(k8_pod['k8_name'])
         pod.logs = logs
-        pod.db_update()
+        write_pod_columns(pod, "logs")
 
-def check_k8_services():
+def check_k8_services(k8_services=None):
     # This is all for only the site specified in conf.site_id.
     # Each site should get it's own health pod.
     # Go through live containers first as it's "truth". Set database from that info. (error if needed, update statuses)
-    k8_services = get_current_k8_services() # Returns {service_info, site, tenant, pod_id}
+    if k8_services is None:
+        k8_services = get_current_k8_services() # Returns {service_info, site, tenant, pod_id}
 
     # Check each service.
     for k8_service in k8_services:
@@ -192,73 +273,137 @@ def check_k8_services():
             rm_pod(k8_service['k8_name'])
             continue
 
-def check_db_pods(k8_pods):
-    """Go through database for all tenants in this site. Delete/Create whatever is needed. Do proxy config stuff.
-    """
-    all_pods = []
+def get_tenant_pods(tenant):
+    """Get all pods for a tenant in this site. Run in HEALTH_EXECUTOR, one task per tenant."""
     stmt = select(Pod)
-    for tenant in SITE_TENANT_DICT[conf.site_id]:
-        all_pods += pg_store[conf.site_id][tenant].run("execute", stmt, scalars=True, all=True)
+    return pg_store[conf.site_id][tenant].run("execute", stmt, scalars=True, all=True)
+
+def get_site_pods():
+    """
+    Get all pods for all tenants in this site, fetching tenants in parallel.
+    Tenants that error or take longer than health_tenant_timeout are logged and their pods from
+    the last successful sweep are used instead, so one slow schema can't stall the sweep or drop routes.
+    """
+    tenants = list(SITE_TENANT_DICT[conf.site_id])
+    futures = {HEALTH_EXECUTOR.submit(contextvars.copy_context().run, get_tenant_pods, tenant): tenant for tenant in tenants}
+    done, not_done = wait(futures, timeout=HEALTH_TENANT_TIMEOUT)
 
-    ### Go through all pod entries in the database
-    for pod in all_pods:
-        ### Delete pods with status_requested = OFF or RESTART
-        if pod.status_requested in [OFF, RESTART] and pod.status != STOPPED:
+    all_pods = []
+    fresh_tenants = set()
+    for future in done:
+        tenant = futures[future]
+        try:
+            LAST_TENANT_PODS[tenant] = future.result()
+            fresh_tenants.add(tenant)
+        except Exception as e:
+            logger.error(f"Error getting pods for tenant: {tenant}. Using pods from last sweep. e: {repr(e)}")
+    for future in not_done:
+        logger.warning(f"Timed out getting pods for tenant: {futures[future]} after {HEALTH_TENANT_TIMEOUT}s. Using pods from last sweep.")
+    for tenant in tenants:
+        all_pods += LAST_TENANT_PODS.get(tenant, [])
+    return all_pods, fresh_tenants
+
+def check_db_pod(pod, k8_pod_keys):
+    """
+    Health checks for one db pod. Run in HEALTH_EXECUTOR, one task per pod.
+    Returns True if the pod should be running but has no k8 pod.
+    """
+    missing = False
+    ### Delete pods with status_requested = OFF or RESTART
+    if pod.status_requested in [OFF, RESTART] and pod.status != STOPPED:
+        if pod.status != SHUTTING_DOWN:
             logger.info(f"pod_id: {pod.pod_id} found with status_requested: {pod.status_requested}. Gracefully shutting pod down.")
-            container_exists, service_exists = graceful_rm_pod(pod)
-            # if container and service not alive. Update status to STOPPED. UPDATE RESTART to ON.
-            if not container_exists and not service_exists:
-                logger.info(f"pod_id: {pod.pod_id} found with container and service stopped. Moving to status = STOPPED.")
-                pod.status = STOPPED
-                pod.start_instance_ts = None
-                pod.time_to_stop_ts = None
-                pod.time_to_stop_instance = None
-                pod.status_container = {}
-                if pod.status_requested == RESTART:
-                    logger.info(f"pod_id: {pod.pod_id} in RESTART. Now in STOPPED, so switching status_requested back to ON.")
-                    pod.status_requested = ON
-                pod.db_update()
-        
-        ### DB entries without a running pod should be updated to STOPPED.
-        if pod.status_requested in ['ON'] and pod.status in [RUNNING, SHUTTING_DOWN]:
-            k8_pod_found = False
-            for k8_pod in k8_pods:
-                if pod.pod_id in k8_pod['pod_id']:
-                    k8_pod_found = True
-            if not k8_pod_found:
-                logger.info(f"pod_id: {pod.pod_id} found with no running pods. Setting status = STOPPED.")
-                pod.status = STOPPED
-                pod.start_instance_ts = None
-                pod.time_to_stop_ts = None
-                pod.time_to_stop_instance = None
-                pod.status_container = {}
-                pod.db_update()
-
-        ### Sets pods to status_requested = OFF when current time > time_to_stop_ts.
-        if pod.status_requested in ['ON'] and pod.time_to_stop_ts and pod.time_to_stop_ts < datetime.utcnow():
-            logger.info(f"pod_id: {pod.pod_id} time_to_stop trigger passed. Current time: {datetime.utcnow()} > time_to_stop_ts: {pod.time_to_stop_ts}")
-            pod.status_requested = OFF
-            pod.db_update()
+            pod.status = SHUTTING_DOWN
+            if not write_pod_columns(pod, "status", where=(Pod.status_requested.in_([OFF, RESTART]), Pod.status != STOPPED)):
+                logger.info(f"pod_id: {pod.pod_id} changed since it was read, not shutting it down.")
+                return missing
+        # Deletes are only issued once, DELETION_TRACKER moves the pod to STOPPED (and RESTART back
+        # to ON) once its k8 pod and service are gone. Reissued after health_deletion_timeout.
+        DELETION_TRACKER.track(pod)
+
+    ### DB entries without a running pod should be updated to STOPPED.
+    if pod.status_requested in ['ON'] and pod.status in [RUNNING, SHUTTING_DOWN]:
+        if (pod.site_id, pod.tenant_id, pod.pod_id) not in k8_pod_keys:
+            missing = True
+            logger.info(f"pod_id: {pod.pod_id} found with no running pods. Setting status = STOPPED.")
+            pod.status = STOPPED
+            pod.start_instance_ts = None
+            pod.time_to_stop_ts = None
+            pod.time_to_stop_instance = None
+            pod.status_container = {}
+            write_pod_columns(pod, "status", "start_instance_ts", "time_to_stop_ts", "time_to_stop_instance", "status_container",
+                              where=(Pod.status_requested == ON, Pod.status.in_([RUNNING, SHUTTING_DOWN])))
+
+    ### status_requested = OFF when current time > time_to_stop_ts is handled by TTL_SCHEDULER.
+    return missing
+
+def check_db_pods(k8_pods, k8_services=None, k8_pvcs=None):
+    """Go through database for all tenants in this site. Delete/Create whatever is needed. Do proxy config stuff.
+
+    k8 objects are indexed by (site_id, tenant_id, pod_id) so reconciliation is linear in pods + k8 objects.
+    Tenants and pods are fanned out over HEALTH_EXECUTOR.
+    Returns dict with the sizes of the reconciliation sets and per phase timings (ms).
+    """
+    timings = {}
+    phase_start = timeit.default_timer()
+    all_pods, fresh_tenants = get_site_pods()
+    if SITE_TENANT_DICT[conf.site_id] and not fresh_tenants:
+        raise RuntimeError(f"Could not get pods for any tenant in site: {conf.site_id}.")
+    timings['fetch_ms'] = (timeit.default_timer() - phase_start) * 1000
+    TTL_SCHEDULER.sync(all_pods)
+
+    ### Index k8 objects and db pods by (site_id, tenant_id, pod_id)
+    k8_pod_keys = k8_index(k8_pods).keys()
+    k8_service_keys = k8_index(k8_services or []).keys()
+    k8_pvc_keys = k8_index(k8_pvcs or []).keys()
+    db_pod_keys = {(pod.site_id, pod.tenant_id, pod.pod_id) for pod in all_pods}
+
+    ### Go through all pod entries in the database. Only pods from tenants fetched this sweep,
+    # stale pods are only used for proxy config.
+    phase_start = timeit.default_timer()
+    missing_pods = 0
+    pod_futures = {HEALTH_EXECUTOR.submit(contextvars.copy_context().run, check_db_pod, pod, k8_pod_keys): pod
+                   for pod in all_pods if pod.tenant_id in fresh_tenants}
+    for future in as_completed(pod_futures):
+        try:
+            if future.result():
+                missing_pods += 1
+        except Exception as e:
+            logger.error(f"Error checking pod_id: {pod_futures[future].pod_id}. e: {repr(e)}")
+    timings['pods_ms'] = (timeit.default_timer() - phase_start) * 1000
         
     ### Proxy ports and config changes
-    # pod_info = {pod.k8_name: {routing_port, url}, ...}
-    # for proxy config later
-    tcp_proxy_info = {}
-    http_proxy_info = {}
-    postgres_proxy_info = {}
-    for pod in all_pods:
-        template_info = {"routing_port": pod.routing_port,
-                         "url": pod.url}
-        match pod.server_protocol:
-            case "tcp":
-                tcp_proxy_info[pod.k8_name] = template_info
-            case "http":
-                http_proxy_info[pod.k8_name] = template_info
-            case "postgres":
-                postgres_proxy_info[pod.k8_name] = template_info
-
-    # This functions only updates if config is out of date.
-    update_traefik_configmap(tcp_proxy_info, http_proxy_info, postgres_proxy_info)
+    # Only shards whose pods' routes changed are re-rendered. Every shard is compared to its
+    # (cached) configmap, so one edited or deleted out of band is rewritten.
+    phase_start = timeit.default_timer()
+    HEALTH_ROUTES.update(all_pods)
+    configmaps = {shard_configmap_name(shard): rendered for shard, rendered in HEALTH_ROUTES.rendered.items()}
+    if HEALTH_ROUTES.shards > 1:
+        HEALTH_FULL_ROUTES.update(all_pods)
+        configmaps["pods-traefik-conf"] = HEALTH_FULL_ROUTES.rendered["base"]
+    for name, rendered in configmaps.items():
+        # This functions only updates if config is out of date.
+        update_traefik_configmap(rendered, name=name)
+    # Shards that no longer exist after route_shards was lowered.
+    try:
+        rm_stale_traefik_configmaps(HEALTH_ROUTES.shards)
+    except Exception as e:
+        logger.error(f"Error deleting stale traefik configmaps. e: {repr(e)}")
+    timings['update_traefik_configmap_ms'] = (timeit.default_timer() - phase_start) * 1000
+
+    ### Reconciliation set sizes. Dangling pods/services are removed by check_k8_pods/check_k8_services.
+    # Orphaned pvcs are only reported, they hold user data.
+    reconcile_stats = {"db_pods": len(db_pod_keys),
+                       "k8_pods": len(k8_pod_keys),
+                       "dangling_k8_pods": len(k8_pod_keys - db_pod_keys),
+                       "dangling_k8_services": len(k8_service_keys - db_pod_keys),
+                       "orphaned_k8_services": len(k8_service_keys - k8_pod_keys),
+                       "orphaned_k8_pvcs": len(k8_pvc_keys - db_pod_keys),
+                       "missing_k8_pods": missing_pods,
+                       "status_counts": dict(Counter(pod.status for pod in all_pods)),
+                       "timings": timings}
+    logger.info(f"check_db_pods reconciliation: {reconcile_stats}")
+    return reconcile_stats
 
 
 def main():
@@ -280,27 +425,62 @@ def main():
         logger.critical("Health could not connect to databases. Shutting down!")
         return
 
+    # Enforces pod time_to_stop_ts. Fed by check_db_pods each sweep.
+    TTL_SCHEDULER.start()
+    # Moves pods to STOPPED as soon as their k8 deletions finish.
+    DELETION_TRACKER.start()
+
+    start_metrics_server()
     while True:
-        logger.info(f"Running pods health checks. Now: {time.time()}")
-        k8_pods = get_current_k8_pods() # Returns {pod_info, site, tenant, pod_id}
+        tick_start = timeit.default_timer()
+        run_health_tick()
+        elapsed = timeit.default_timer() - tick_start
+        HEALTH_TICK_SECONDS.observe(elapsed)
+        if elapsed > HEALTH_TICK_BUDGET:
+            HEALTH_TICKS_OVER_BUDGET.inc()
+            logger.warning(f"Health tick took {elapsed:.2f}s, over health_tick_budget of {HEALTH_TICK_BUDGET}s.")
+
+        ### Sleep for whatever is left of the tick interval, keeps a fixed tick cadence.
+        time.sleep(max(0, HEALTH_TICK_INTERVAL - elapsed))
+
+def run_health_tick():
+    """
+    One pass of health checks. Each phase is timed into HEALTH_PHASE_SECONDS.
+    """
+    # Only this tick's queries, HEALTH_EXECUTOR jobs get a copy of the context. Not the ttl scheduler's or deletion tracker's.
+    with count_queries() as tick_queries:
+        run_health_phases()
+    HEALTH_DB_QUERIES_LAST_TICK.set(tick_queries.count)
+
+def run_health_phases():
+    logger.info(f"Running pods health checks. Now: {time.time()}")
 
+    with HEALTH_PHASE_SECONDS.labels(phase="list_k8").time():
+        k8_pods = get_current_k8_pods() # Returns {pod_info, site, tenant, pod_id}
+        k8_services = get_current_k8_services() # Returns {service_info, site, tenant, pod_id}
+        k8_pvcs = get_current_k8_pvcs() # Returns {pvc_info, site, tenant, pod_id}
+    # Settle tracked deletions whose k8 objects are gone, in case a watch event was missed.
+    DELETION_TRACKER.reconcile(k8_index(k8_pods).keys(), k8_index(k8_services).keys())
+    with HEALTH_PHASE_SECONDS.labels(phase="check_k8_pods").time():
         check_k8_pods(k8_pods)
-        check_k8_services()
-        check_db_pods(k8_pods)
-        ########
-        #######
-        # Go through database for each tenant in site now.
-        logger.info(f"Health going through all tenants in site: {conf.site_id}")
-        for tenant, store in pg_store[conf.site_id].items():
-            pass
-        ### Go through all of caddy.
-
-        ### Go through and check services.
-        
-        ### Have a short wait
-        time.sleep(1)
+    with HEALTH_PHASE_SECONDS.labels(phase="check_k8_services").time():
+        check_k8_services(k8_services)
+    with HEALTH_PHASE_SECONDS.labels(phase="check_db_pods").time():
+        reconcile_stats = check_db_pods(k8_pods, k8_services, k8_pvcs)
+
+    # check_db_pods sub phases.
+    for phase, phase_ms in reconcile_stats.pop('timings').items():
+        HEALTH_PHASE_SECONDS.labels(phase=f"check_db_pods_{phase.removesuffix('_ms')}").observe(phase_ms / 1000)
+    set_pod_status_counts(reconcile_stats.pop('status_counts'))
+    for set_name, size in reconcile_stats.items():
+        HEALTH_RECONCILE.labels(set=set_name).set(size)
+
+    pool_stats = get_pg_pool_stats()
+    set_pool_stats(pool_stats)
+    logger.debug(f"Postgres pool stats: {pool_stats}")
 
 if __name__ == '__main__':
+    trace_log_handlers()
     main()
 
 
@@ -0,0 +1,127 @@
+"""
+Watch-backed local cache of k8 objects in the pods namespace. Each cache lists its kind once, then
+follows a watch from that resourceVersion, relisting when the watch expires (410 Gone) or errors.
+Reads (get/list) are served from memory, so api, spawner, and health don't hit the Kubernetes API
+for pods, services, pvcs, or the traefik configmap. Handlers get every event, DeletionTracker uses
+them instead of running its own watches. Objects missing after a relist are sent as DELETED.
+"""
+import threading
+import time
+
+from kubernetes import client, watch
+from metrics import K8_CACHE_OBJECTS, K8_CACHE_RELISTS
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+
+class K8Cache():
+    def __init__(self, kind: str, list_fn, watch_fn, namespace: str,
+                 field_selector: str | None = None,
+                 enabled: bool = True,
+                 watch_timeout: int = 300,
+                 sync_timeout: float = 10):
+        self.kind = kind
+        # Initial lists go through K8Client (rate limit, retries). Watch needs the raw CoreV1Api method,
+        # it reads the docstring for the return type.
+        self.list_fn = list_fn
+        self.watch_fn = watch_fn
+        self.namespace = namespace
+        self.field_selector = field_selector
+        # Serve reads from the cache. Handlers get events either way.
+        self.enabled = enabled
+        # Seconds each watch request stays open before it's restarted.
+        self.watch_timeout = watch_timeout
+        # Seconds reads wait for the first list before falling back to the Kubernetes API.
+        self.sync_timeout = sync_timeout
+        # name: k8 object
+        self.objects = {}
+        self.resource_version = None
+        self.synced = threading.Event()
+        self.handlers = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add_handler(self, handler):
+        """handler(event_type, k8_object) is called from the watch thread for each ADDED/MODIFIED/DELETED."""
+        self.handlers.append(handler)
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, name=f"k8-cache-{self.kind}", daemon=True)
+            self.thread.start()
+
+    def ready(self):
+        """True if reads should come from the cache. Starts the cache and waits for the first list."""
+        if not self.enabled:
+            return False
+        self.start()
+        return self.synced.wait(self.sync_timeout)
+
+    def get(self, name: str):
+        """Cached object named name, None if there's no such object."""
+        with self.lock:
+            return self.objects.get(name)
+
+    def list(self):
+        with self.lock:
+            return list(self.objects.values())
+
+    def selector_kwargs(self):
+        return {"field_selector": self.field_selector} if self.field_selector else {}
+
+    def notify(self, event_type: str, k8_object):
+        for handler in self.handlers:
+            try:
+                handler(event_type, k8_object)
+            except Exception as e:
+                logger.error(f"Error in k8 {self.kind} cache handler for {event_type}. e: {repr(e)}")
+
+    def relist(self):
+        result = self.list_fn(self.namespace, **self.selector_kwargs())
+        objects = {obj.metadata.name: obj for obj in result.items}
+        with self.lock:
+            gone = [obj for name, obj in self.objects.items() if name not in objects]
+            self.objects = objects
+            self.resource_version = result.metadata.resource_version
+        K8_CACHE_RELISTS.labels(kind=self.kind).inc()
+        K8_CACHE_OBJECTS.labels(kind=self.kind).set(len(objects))
+        self.synced.set()
+        # Deletions that happened while the watch was down.
+        for obj in gone:
+            self.notify("DELETED", obj)
+
+    def run(self):
+        logger.info(f"Top of K8Cache.run() for {self.kind}s.")
+        while True:
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                stream = watch.Watch().stream(self.watch_fn, self.namespace,
+                                              resource_version=self.resource_version,
+                                              timeout_seconds=self.watch_timeout,
+                                              **self.selector_kwargs())
+                for event in stream:
+                    event_type, obj = event['type'], event['object']
+                    if event_type not in ("ADDED", "MODIFIED", "DELETED"):
+                        continue
+                    with self.lock:
+                        if event_type == "DELETED":
+                            self.objects.pop(obj.metadata.name, None)
+                        else:
+                            self.objects[obj.metadata.name] = obj
+                        self.resource_version = obj.metadata.resource_version
+                        K8_CACHE_OBJECTS.labels(kind=self.kind).set(len(self.objects))
+                    self.notify(event_type, obj)
+            except client.ApiException as e:
+                if e.status == 410:
+                    logger.info(f"k8 {self.kind} watch resourceVersion expired, relisting.")
+                else:
+                    logger.error(f"Error watching k8 {self.kind}s, relisting. e: {repr(e)}")
+                    time.sleep(5)
+                self.resource_version = None
+            except Exception as e:
+                logger.error(f"Error watching k8 {self.kind}s, relisting. e: {repr(e)}")
+                self.resource_version = None
+                time.sleep(5)
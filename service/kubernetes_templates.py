@@ -1,20 +1,17 @@
 from codes import ERROR, SPAWNER_SETUP, CREATING_CONTAINER, \
     REQUESTED, SHUTTING_DOWN
 from models import Pod, Password
+from resources import pod_resources, DEFAULT_PVC_STORAGE
 from kubernetes_utils import create_pod, create_service, create_pvc, KubernetesError
-from kubernetes import client, config
+from kubernetes import client
 
 from tapisservice.config import conf
 from tapisservice.logs import get_logger
 from tapisservice.errors import BaseTapisError
 logger = get_logger(__name__)
 
-# k8 client creation
-config.load_incluster_config()
-k8 = client.CoreV1Api()
 
-
-def start_postgres_pod(pod, revision: int):
+def start_postgres_pod(pod, revision: int, recreate: bool = False):
     logger.debug(f"Attempting to start postgres pod; name: {pod.k8_name}; revision: {revision}")
 
     password = Password.db_get_with_pk(pod.pod_id, pod.tenant_id, pod.site_id)
@@ -46,18 +43,18 @@ def start_postgres_pod(pod, revision: int):
             "POSTGRES_PASSWORD": password.user_password
         },
         "mounts": [volumes, volume_mounts],
-        "mem_request": "250M",
-        "cpu_request": "500",
-        "mem_limit": "4G",
-        "cpu_limit": "3000",
+        **pod_resources(pod),
+        # Ready once postgres accepts connections.
+        "readiness_probe": {"exec": ["pg_isready", "-h", "127.0.0.1", "-p", "5432", "-U", password.user_username]}
     }
 
-    # Create init_container, container, and service.
+    # Create init_container, container, and service. Recreating reuses the existing service.
     create_pod(**container)
-    create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
+    if not recreate:
+        create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
 
 
-def start_neo4j_pod(pod, revision: int):
+def start_neo4j_pod(pod, revision: int, recreate: bool = False):
     logger.debug(f"Attempting to start neo4j pod; name: {pod.k8_name}; revision: {revision}")
 
     password = Password.db_get_with_pk(pod.pod_id, pod.tenant_id, pod.site_id)
@@ -104,28 +101,29 @@ def start_neo4j_pod(pod, revision: int):
             "apoc.initializer.system.2": f"CREATE USER {password.user_username} SET PLAINTEXT PASSWORD '{password.user_password}' SET PASSWORD CHANGE NOT REQUIRED"
         },
         "mounts": [volumes, volume_mounts],
-        "mem_request": "250M",
-        "cpu_request": "500",
-        "mem_limit": "4G",
-        "cpu_limit": "3000",
-        "user": None
+        **pod_resources(pod),
+        "user": None,
+        # Ready once bolt is listening, neo4j opens it after the databases are up.
+        "readiness_probe": {"tcp_port": 7687, "initial_delay_seconds": 5}
     }
 
-    # Create init_container, container, and service.
+    # Create init_container, container, and service. Recreating reuses the existing service.
     create_pod(**container)
-    create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
+    if not recreate:
+        create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
 
 
-def start_generic_pod(pod, custom_image, revision: int):
+def start_generic_pod(pod, custom_image, revision: int, recreate: bool = False):
     logger.debug(f"Attempting to start generic pod; name: {pod.k8_name}; revision: {revision}")
 
     # Volumes
     volumes = []
     volume_mounts = []
 
-    # Create PVC if requested.
+    # Create PVC if requested. Recreating reuses the existing pvc.
     if pod.persistent_volume:
-        create_pvc(name = pod.k8_name)
+        if not recreate:
+            create_pvc(name = pod.k8_name, storage = pod.resources.get("pvc_storage") or DEFAULT_PVC_STORAGE)
         persistent_volume = client.V1PersistentVolumeClaimVolumeSource(claim_name=pod.k8_name)
         volumes.append(client.V1Volume(name='user-volume', persistent_volume_claim = persistent_volume))
         volume_mounts.append(client.V1VolumeMount(name="user-volume", mount_path="/user_volume"))
@@ -140,13 +138,13 @@ def start_generic_pod(pod, custom_image, revision: int):
         },
         "environment": pod.environment_variables.copy(),
         "mounts": [volumes, volume_mounts],
-        "mem_request": "250M",
-        "cpu_request": "500",
-        "mem_limit": "4G",
-        "cpu_limit": "3000",
-        "user": None
+        **pod_resources(pod),
+        "user": None,
+        # Custom images may not serve http on any particular path, so only check the routing port accepts connections.
+        "readiness_probe": {"tcp_port": pod.routing_port}
     }
 
-    # Create init_container, container, and service.
+    # Create init_container, container, and service. Recreating reuses the existing service.
     create_pod(**container)
-    create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
+    if not recreate:
+        create_service(name = pod.k8_name, ports_dict = container["ports_dict"])
@@ -1,13 +1,17 @@
 from fcntl import DN_DELETE
+import re
 import json
 import os
 import time
 import timeit
 import datetime
 import random
+import functools
+import threading
 from typing import Literal, Dict, List
 
 from jinja2 import Environment, FileSystemLoader
+import urllib3
 from kubernetes import client, config
 from requests.exceptions import ReadTimeout, ConnectionError
 
@@ -20,10 +24,9 @@ from stores import SITE_TENANT_DICT
 from stores import pg_store
 from sqlmodel import select
 from models import Pod
-
-# k8 client creation
-config.load_incluster_config()
-k8 = client.CoreV1Api()
+from metrics import K8_API_SECONDS, K8_API_ERRORS, K8_API_RETRIES
+from tracing import span, current_trace_id, current_traceparent, SPAN_KIND_CLIENT, TRACEPARENT_ANNOTATION
+from k8_cache import K8Cache
 
 host_id = os.environ.get('SPAWNER_HOST_ID', conf.spawner_host_id)
 host_ip = conf.spawner_host_ip
@@ -40,6 +43,165 @@ class KubernetesStartContainerError(KubernetesError):
 class KubernetesStopContainerError(KubernetesError):
     pass
 
+class KubernetesCircuitOpenError(KubernetesError):
+    pass
+
+
+class TokenBucket():
+    """
+    Token bucket rate limiter. Allows bursts of up to `burst` calls, refilling at `rate` calls/sec.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class K8Client():
+    """
+    Wraps CoreV1Api so every Kubernetes API call gets, in order:
+    - circuit breaker: after circuit_failure_threshold consecutive transient failures, calls fail fast with
+      KubernetesCircuitOpenError for circuit_reset_timeout seconds, then one trial call is let through.
+    - token bucket rate limit shared by all threads in this process.
+    - default request timeout (_request_timeout) unless the caller gives one.
+    - retries with exponential backoff and full jitter for transient errors (429, 5xx, connection errors).
+    - per verb latency in K8_API_SECONDS.
+    Non-transient errors (404, 409, etc.) are raised right away, unchanged, so call sites keep their handling.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api,
+                 rate: float = 20,
+                 burst: int = 40,
+                 max_retries: int = 4,
+                 backoff_base: float = 0.1,
+                 backoff_max: float = 5,
+                 request_timeout: float = 10,
+                 circuit_failure_threshold: int = 10,
+                 circuit_reset_timeout: float = 30):
+        self.api = api
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.circuit_failure_threshold = circuit_failure_threshold
+        self.circuit_reset_timeout = circuit_reset_timeout
+        self.consecutive_failures = 0
+        self.circuit_opened_at = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, verb):
+        fn = getattr(self.api, verb)
+        if not callable(fn):
+            return fn
+        return functools.partial(self.call, verb, fn)
+
+    def is_transient(self, e):
+        if isinstance(e, client.ApiException):
+            # status 0 is a urllib3 level failure wrapped by the client.
+            return e.status in self.RETRY_STATUSES or not e.status
+        return isinstance(e, (urllib3.exceptions.HTTPError, ConnectionError, ReadTimeout, TimeoutError, OSError))
+
+    def check_circuit(self, verb):
+        with self.lock:
+            if self.circuit_opened_at is None:
+                return
+            if time.monotonic() - self.circuit_opened_at < self.circuit_reset_timeout:
+                raise KubernetesCircuitOpenError(f"Kubernetes API circuit open, not calling {verb}. "
+                                                 f"{self.consecutive_failures} consecutive failures.")
+            # Half open, let this call through as the trial. Reopens on failure.
+            self.circuit_opened_at = None
+            self.consecutive_failures = self.circuit_failure_threshold - 1
+
+    def record_result(self, transient_failure: bool):
+        with self.lock:
+            if not transient_failure:
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.circuit_failure_threshold and self.circuit_opened_at is None:
+                self.circuit_opened_at = time.monotonic()
+                logger.critical(f"Kubernetes API circuit opened after {self.consecutive_failures} consecutive failures.")
+
+    def call(self, verb, fn, *args, **kwargs):
+        # Spans only for calls made as part of a trace (spawner, api), not health's periodic listing.
+        if current_trace_id():
+            with span(f"k8.{verb}", kind=SPAN_KIND_CLIENT):
+                return self._call(verb, fn, *args, **kwargs)
+        return self._call(verb, fn, *args, **kwargs)
+
+    def _call(self, verb, fn, *args, **kwargs):
+        if self.request_timeout and not kwargs.get('watch'):
+            kwargs.setdefault('_request_timeout', self.request_timeout)
+        attempt = 0
+        while True:
+            self.check_circuit(verb)
+            self.bucket.acquire()
+            start = timeit.default_timer()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                K8_API_SECONDS.labels(verb=verb).observe(timeit.default_timer() - start)
+                transient = self.is_transient(e)
+                K8_API_ERRORS.labels(verb=verb, status=str(getattr(e, 'status', None) or type(e).__name__)).inc()
+                self.record_result(transient)
+                if not transient or attempt >= self.max_retries:
+                    raise
+                sleep_s = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                K8_API_RETRIES.labels(verb=verb).inc()
+                logger.warning(f"Transient error calling k8 {verb}, retry {attempt}/{self.max_retries} in {sleep_s:.2f}s. e: {repr(e)}")
+                time.sleep(sleep_s)
+                continue
+            K8_API_SECONDS.labels(verb=verb).observe(timeit.default_timer() - start)
+            self.record_result(False)
+            return result
+
+
+def is_transient_error(e):
+    """
+    True if e, or an exception it was raised from, is a transient k8 API error (429, 5xx, connection
+    errors, open circuit). Spawner retries commands that failed with one later instead of giving up.
+    """
+    while e is not None:
+        if isinstance(e, KubernetesCircuitOpenError) or k8.is_transient(e):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+# k8 client creation. Everything that talks to the Kubernetes API goes through this K8Client.
+config.load_incluster_config()
+k8 = K8Client(client.CoreV1Api(),
+              rate=conf.get("k8_rate_limit_qps", 20),
+              burst=conf.get("k8_rate_limit_burst", 40),
+              max_retries=conf.get("k8_max_retries", 4),
+              request_timeout=conf.get("k8_request_timeout", 10),
+              circuit_failure_threshold=conf.get("k8_circuit_failure_threshold", 10),
+              circuit_reset_timeout=conf.get("k8_circuit_reset_timeout", 30))
+
+
+def trace_annotations():
+    """k8 annotations carrying the current traceparent, so health can continue the trace. None outside of a trace."""
+    traceparent = current_traceparent()
+    return {TRACEPARENT_ANNOTATION: traceparent} if traceparent else None
+
 
 def get_kubernetes_namespace():
     """
@@ -69,6 +231,20 @@ def get_kubernetes_namespace():
 # Get k8 namespace for future use.
 NAMESPACE = get_kubernetes_namespace()
 
+# Watch-backed caches, started on first read (or by DeletionTracker for handlers). Reads fall back
+# to the Kubernetes API while a cache hasn't synced or when k8_cache_enabled is false.
+K8_CACHE_ENABLED = conf.get("k8_cache_enabled", True)
+K8_POD_CACHE = K8Cache("pod", k8.list_namespaced_pod, k8.api.list_namespaced_pod, NAMESPACE,
+                       enabled=K8_CACHE_ENABLED)
+K8_SERVICE_CACHE = K8Cache("service", k8.list_namespaced_service, k8.api.list_namespaced_service, NAMESPACE,
+                           enabled=K8_CACHE_ENABLED)
+K8_PVC_CACHE = K8Cache("pvc", k8.list_namespaced_persistent_volume_claim,
+                       k8.api.list_namespaced_persistent_volume_claim, NAMESPACE,
+                       enabled=K8_CACHE_ENABLED)
+# All configmaps in the namespace, the traefik configmap can be split over pods-traefik-conf-<shard> configmaps.
+K8_CONFIGMAP_CACHE = K8Cache("configmap", k8.list_namespaced_config_map, k8.api.list_namespaced_config_map, NAMESPACE,
+                             enabled=K8_CACHE_ENABLED)
+
 def rm_container(k8_name):
     """
     Remove a container. Async
@@ -82,6 +258,22 @@ def rm_container(k8_name):
         raise KubernetesError(f"Error removing pod {k8_name}, exception: {str(e)}")
     logger.info(f"delete_namespaced_pod ran for pod {k8_name}.")
 
+def wait_for_pod_deletion(k8_name: str, timeout: float = 120, interval: float = 0.5):
+    """
+    Block until k8 pod k8_name is gone. Needed before a pod with the same name can be created again.
+    Raises KubernetesError if the pod still exists after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            k8.read_namespaced_pod(name=k8_name, namespace=NAMESPACE)
+        except client.ApiException as e:
+            if e.status == 404:
+                return
+            raise KubernetesError(f"Error waiting for pod {k8_name} deletion, exception: {str(e)}")
+        time.sleep(interval)
+    raise KubernetesError(f"Pod {k8_name} not deleted after {timeout} seconds.")
+
 def rm_service(service_name):
     """
     Remove a container. Async
@@ -110,11 +302,15 @@ def rm_pvc(pvc_name):
 
 def list_all_containers():
     """Returns a list of all containers in a particular namespace """
+    if K8_POD_CACHE.ready():
+        return K8_POD_CACHE.list()
     pods = k8.list_namespaced_pod(NAMESPACE).items
     return pods
 
 def list_all_services():
     """Returns a list of all containers in a particular namespace """
+    if K8_SERVICE_CACHE.ready():
+        return K8_SERVICE_CACHE.list()
     services = k8.list_namespaced_service(NAMESPACE).items
     return services
 
@@ -149,9 +345,7 @@ def get_current_k8_pods(service_name: str = "pods", site_id: str = conf.site_id)
                                       'pod_id': pod_id,
                                       'k8_name': k8_name})
             except Exception as e:
-                msg = f"Exception parsing k8 pods. e: {e}"
-                print(msg)
-                pass
+                logger.debug(f"Exception parsing k8 pods, skipping {k8_name}. e: {e}")
     return db_containers
 
 def get_current_k8_services(service_name: str = "pods", site_id: str = conf.site_id):
@@ -185,11 +379,40 @@ def get_current_k8_services(service_name: str = "pods", site_id: str = conf.site
                                     'pod_id': pod_id,
                                     'k8_name': k8_name})
             except Exception as e:
-                msg = f"Exception parsing k8 services. e: {e}"
-                print(msg)
-                pass
+                logger.debug(f"Exception parsing k8 services, skipping {k8_name}. e: {e}")
     return db_services
 
+def list_all_pvcs():
+    """Returns a list of all pvcs in a particular namespace """
+    if K8_PVC_CACHE.ready():
+        return K8_PVC_CACHE.list()
+    pvcs = k8.list_namespaced_persistent_volume_claim(NAMESPACE).items
+    return pvcs
+
+def get_current_k8_pvcs(service_name: str = "pods", site_id: str = conf.site_id):
+    """
+    Returns a list of dictionaries for each pods service pvc with the following keys:
+        - pvc_info: The Kubernetes API object for the pvc.
+        - site_id, tenant_id, pod_id: Parsed from the pvc name, pods-<site>-<tenant>-<pod_id>.
+        - k8_name: Name of the pvc.
+    """
+    filter_str = f"{service_name}-{site_id}"
+    db_pvcs = []
+    for k8_pvc in list_all_pvcs():
+        k8_name = k8_pvc.metadata.name
+        if filter_str in k8_name:
+            # pvc name format = "pods-<site>-<tenant>-<pod_id>
+            try:
+                parts = k8_name.split('-')
+                db_pvcs.append({'pvc_info': k8_pvc,
+                                'site_id': parts[1],
+                                'tenant_id': parts[2],
+                                'pod_id': parts[3],
+                                'k8_name': k8_name})
+            except Exception as e:
+                logger.debug(f"Exception parsing k8 pvcs, skipping {k8_name}. e: {e}")
+    return db_pvcs
+
 def get_k8_logs(name: str):
     try:
         logs = k8.read_namespaced_pod_log(namespace=NAMESPACE, name=name)
@@ -214,6 +437,9 @@ def container_running(name: str):
     logger.debug("top of kubernetes_utils.container_running().")
     if not name:
         raise KeyError(f"kubernetes_utils.container_running received name: {name}")
+    if K8_POD_CACHE.ready():
+        k8_pod = K8_POD_CACHE.get(name)
+        return bool(k8_pod and k8_pod.status.phase == 'Running')
     try:
         if k8.read_namespaced_pod(namespace=NAMESPACE, name=name).status.phase == 'Running':
             return True
@@ -227,7 +453,8 @@ def container_running(name: str):
     
 def stop_container(name: str):
     """
-    Attempt to stop running pod, with retry logic. Should only be called with a running pod.
+    Attempt to stop running pod. Should only be called with a running pod.
+    Transient errors are retried with backoff by K8Client.
 
     Args:
         name (str): Name of k8 pod to stop, pods-<site>-<tenant>-<pod_id> format.
@@ -242,19 +469,20 @@ def stop_container(name: str):
     if not name:
         raise KeyError(f"kubernetes_utils.container_running received name: {name}")
 
-    i = 0
-    while i < 10:        
-        try:
-            k8.delete_namespaced_pod(namespace=NAMESPACE, name=name)
-            return True
-        except client.ApiException:
+    try:
+        k8.delete_namespaced_pod(namespace=NAMESPACE, name=name)
+        return True
+    except client.ApiException as e:
+        if e.status == 404:
             # pod not found
             return False
-        except Exception as e:
-            logger.error(f"Got another exception trying to stop the actor container. Exception: {e}")
-            i += 1
-            continue
-    raise KubernetesStopContainerError("Error. Pod not deleted after 10 attempts.")
+        msg = f"Error stopping pod {name}. Exception: {e}"
+        logger.error(msg)
+        raise KubernetesStopContainerError(msg)
+    except Exception as e:
+        msg = f"Error stopping pod {name} after retries. Exception: {e}"
+        logger.error(msg)
+        raise KubernetesStopContainerError(msg)
 
 def create_pod(name: str,
                image: str,
@@ -270,7 +498,8 @@ def create_pod(name: str,
                mem_limit: str | None = None,
                cpu_limit: str | None = None,
                user: str | None = None,
-               image_pull_policy: Literal["Always", "IfNotPresent", "Never"] = "Always"):
+               image_pull_policy: Literal["Always", "IfNotPresent", "Never"] = "Always",
+               readiness_probe: Dict | None = None):
     """
     Creates and runs a k8 pod.
 
@@ -290,6 +519,8 @@ def create_pod(name: str,
         max_cpus (str | None, optional): _description_. Defaults to None.
         user (str | None, optional): _description_. Defaults to None.
         image_pull_policy ("Always" | "IfNotPresent" | "Never"): _description_. Defaults to "Always".
+        readiness_probe (Dict | None, optional): One of {"exec": [cmd, ...]}, {"tcp_port": int}, or
+            {"http_path": str, "http_port": int}, plus optional V1Probe timing kwargs. Defaults to None.
 
     Raises:
         KubernetesStartContainerError: _description_
@@ -370,6 +601,26 @@ def create_pod(name: str,
     if uid and gid:
         security = client.V1SecurityContext(run_as_user=uid, run_as_group=gid)
 
+    ### Readiness probe - health only moves the pod to RUNNING once the container is ready.
+    probe = None
+    if readiness_probe:
+        probe_opts = dict(readiness_probe)
+        probe_kwargs = {"initial_delay_seconds": probe_opts.pop("initial_delay_seconds", 2),
+                        "period_seconds": probe_opts.pop("period_seconds", 2),
+                        "timeout_seconds": probe_opts.pop("timeout_seconds", 2),
+                        "failure_threshold": probe_opts.pop("failure_threshold", 3)}
+        if "exec" in probe_opts:
+            probe_kwargs["_exec"] = client.V1ExecAction(command=probe_opts["exec"])
+        elif "tcp_port" in probe_opts:
+            probe_kwargs["tcp_socket"] = client.V1TCPSocketAction(port=probe_opts["tcp_port"])
+        elif "http_path" in probe_opts:
+            probe_kwargs["http_get"] = client.V1HTTPGetAction(path=probe_opts["http_path"], port=probe_opts["http_port"])
+        else:
+            msg = f"Unrecognized readiness_probe: {readiness_probe}; pod_id: {name}"
+            logger.info(msg)
+            raise KubernetesStartContainerError(msg)
+        probe = client.V1Probe(**probe_kwargs)
+
     ### Init container creation
     if init_command:
         init_container = client.V1Container(
@@ -396,7 +647,8 @@ def create_pod(name: str,
             env=env,
             resources=resources,
             ports=ports,
-            image_pull_policy=image_pull_policy
+            image_pull_policy=image_pull_policy,
+            readiness_probe=probe
         )
         pod_spec = client.V1PodSpec(
             init_containers=init_containers,
@@ -406,9 +658,11 @@ def create_pod(name: str,
             security_context=security_context,
             enable_service_links=False
         )
+        # Service selects on app only, so the service keeps routing across revisions.
         pod_metadata = client.V1ObjectMeta(
             name=name,
-            labels={"app": name}
+            labels={"app": name, "revision": str(revision)},
+            annotations=trace_annotations()
         )
         pod_body = client.V1Pod(
             metadata=pod_metadata,
@@ -420,10 +674,24 @@ def create_pod(name: str,
             namespace=NAMESPACE,
             body=pod_body
         )
+    except client.ApiException as e:
+        # K8Client retries creates on timeouts and 5xx, when the first attempt may have created the pod.
+        # The pod is ours if it has this revision, reuse it like create_service and create_pvc do.
+        if e.status == 409:
+            try:
+                existing = k8.read_namespaced_pod(name=name, namespace=NAMESPACE)
+            except Exception:
+                existing = None
+            if existing and (existing.metadata.labels or {}).get("revision") == str(revision):
+                logger.info(f"Pod {name} revision {revision} already exists, reusing it.")
+                return existing
+        msg = f"Got exception trying to create pod with image: {image}. {repr(e)}. e: {e}"
+        logger.info(msg)
+        raise KubernetesError(msg) from e
     except Exception as e:
         msg = f"Got exception trying to create pod with image: {image}. {repr(e)}. e: {e}"
         logger.info(msg)
-        raise KubernetesError(msg)
+        raise KubernetesError(msg) from e
     logger.info(f"Pod created successfully.")
     return k8_pod
 
@@ -458,7 +726,7 @@ def create_service(name, ports_dict={}):
             ports=ports
         )
         service_body = client.V1Service(
-            metadata=client.V1ObjectMeta(name=name),
+            metadata=client.V1ObjectMeta(name=name, annotations=trace_annotations()),
             spec=service_spec,
             kind="Service",
             api_version="v1"
@@ -467,21 +735,29 @@ def create_service(name, ports_dict={}):
             namespace=NAMESPACE,
             body=service_body
         )
+    except client.ApiException as e:
+        if e.status != 409:
+            msg = f"Got exception trying to start service with name: {name}. {e}"
+            logger.info(msg)
+            raise KubernetesError(msg) from e
+        # Service kept from a previous run (keep_service_on_stop), reuse it.
+        logger.info(f"Pod service {name} already exists, reusing it.")
+        return k8.read_namespaced_service(name=name, namespace=NAMESPACE)
     except Exception as e:
         msg = f"Got exception trying to start service with name: {name}. {e}"
         logger.info(msg)
-        raise KubernetesError(msg)
+        raise KubernetesError(msg) from e
     logger.info(f"Pod service started successfully.")
     return k8_service
 
 
-def create_pvc(name):
+def create_pvc(name, storage: str = "10Gi"):
     logger.debug("top of kubernetes_utils.create_pvc().")
 
     ### Define and create the pvc
     try:
         pvc_resources = client.V1ResourceRequirements(
-            requests={"storage": "10Gi"}
+            requests={"storage": storage}
         )
         pvc_spec = client.V1PersistentVolumeClaimSpec(
             access_modes=["ReadWriteOnce"],
@@ -498,44 +774,87 @@ def create_pvc(name):
             namespace=NAMESPACE,
             body=pvc_body
         )
+    except client.ApiException as e:
+        if e.status != 409:
+            msg = f"Got exception trying to start pvc with name: {name}. {e}"
+            logger.info(msg)
+            raise KubernetesError(msg) from e
+        # Left from an earlier attempt of a retried start command, reuse it.
+        logger.info(f"Pod pvc {name} already exists, reusing it.")
+        return k8.read_namespaced_persistent_volume_claim(name=name, namespace=NAMESPACE)
     except Exception as e:
         msg = f"Got exception trying to start pvc with name: {name}. {e}"
         logger.info(msg)
-        raise KubernetesError(msg)
+        raise KubernetesError(msg) from e
     logger.info(f"Pod pvc started successfully.")
     return k8_pvc
 
 
-def update_traefik_configmap(tcp_proxy_info: Dict[str, Dict[str, str]],
-                             http_proxy_info: Dict[str, Dict[str, str]],
-                             postgres_proxy_info: Dict[str, Dict[str, str]]):
+def render_traefik_template(tcp_proxy_info: Dict[str, Dict[str, str]],
+                            http_proxy_info: Dict[str, Dict[str, str]],
+                            postgres_proxy_info: Dict[str, Dict[str, str]],
+                            shard: bool = False):
     """
-    Update fn for proxy configmap. Will read kubernetes/db data and create proxy server stanza bits where neccessary.
-    Should be site specific.
-
-    Args:
-        proxy_info ({"pod_id1": {"routing_port": int, "url": str}, ...}): Dict of dict that 
-            specifies routing port + url needed to create pod service.
+    Render traefik-template.j2 with proxy info from routes.pod_proxy_info(). shard renders
+    traefik-shard-template.j2 instead, only the pods' routers and services.
     """
     template_env = Environment(loader=FileSystemLoader("service/templates"))
-    template = template_env.get_template('traefik-template.j2')
-    rendered_template = template.render(tcp_proxy_info = tcp_proxy_info,
-                                        http_proxy_info = http_proxy_info,
-                                        postgres_proxy_info = postgres_proxy_info,
-                                        namespace = NAMESPACE)
-
-    # Only update the configmap if the current configmap is out of date.
-    current_template = k8.read_namespaced_config_map(name='pods-traefik-conf', namespace=NAMESPACE)
-    
-    if not current_template.data['traefik.yml'] == rendered_template:
+    template = template_env.get_template('traefik-shard-template.j2' if shard else 'traefik-template.j2')
+    return template.render(tcp_proxy_info = tcp_proxy_info,
+                           http_proxy_info = http_proxy_info,
+                           postgres_proxy_info = postgres_proxy_info,
+                           namespace = NAMESPACE)
+
+def update_traefik_configmap(rendered_template: str, name: str = 'pods-traefik-conf'):
+    """
+    Update fn for proxy configmap. Takes a rendered route table (or shard of one, see routes.RouteShards)
+    and writes it to configmap name, creating it if needed. Only writes if the configmap is out of date.
+    Should be site specific.
+    """
+    current_template = get_traefik_configmap(name)
+    if current_template is None:
+        config_map = client.V1ConfigMap(metadata=client.V1ObjectMeta(name=name), data = {"traefik.yml": rendered_template})
+        k8.create_namespaced_config_map(namespace=NAMESPACE, body=config_map)
+    elif not (current_template.data or {}).get('traefik.yml') == rendered_template:
         # Update the configmap with the new template immediately.
         config_map = client.V1ConfigMap(data = {"traefik.yml": rendered_template})
-        k8.patch_namespaced_config_map(name='pods-traefik-conf', namespace=NAMESPACE, body=config_map)
+        k8.patch_namespaced_config_map(name=name, namespace=NAMESPACE, body=config_map)
         # Auto updates proxxy pod. Changes take place according to kubelet sync frequency duration (60s default).
 
-def get_traefik_configmap():
+def rm_stale_traefik_configmaps(shards: int):
     """
+    Delete pods-traefik-conf-<shard> configmaps of shards that don't exist with this many route_shards,
+    e.g. left over after route_shards was lowered. With 1 there are no shard configmaps.
     """
-    current_template = k8.read_namespaced_config_map(name='pods-traefik-conf', namespace=NAMESPACE)
-    
-    return current_template
\ No newline at end of file
+    if K8_CONFIGMAP_CACHE.ready():
+        config_maps = K8_CONFIGMAP_CACHE.list()
+    else:
+        config_maps = k8.list_namespaced_config_map(NAMESPACE).items
+    for config_map in config_maps:
+        name = config_map.metadata.name
+        shard = re.fullmatch(r"pods-traefik-conf-(base|\d+)", name)
+        if not shard or (shards > 1 and (shard.group(1) == "base" or int(shard.group(1)) < shards)):
+            continue
+        logger.info(f"Deleting stale traefik configmap {name}.")
+        try:
+            k8.delete_namespaced_config_map(name=name, namespace=NAMESPACE)
+        except client.ApiException as e:
+            if e.status != 404:
+                raise
+
+def get_traefik_configmap(name: str = 'pods-traefik-conf'):
+    """
+    Traefik configmap (or shard configmap), from the cache when it's synced. None if it doesn't exist.
+    """
+    if K8_CONFIGMAP_CACHE.ready():
+        current_template = K8_CONFIGMAP_CACHE.get(name)
+        if current_template:
+            return current_template
+    try:
+        current_template = k8.read_namespaced_config_map(name=name, namespace=NAMESPACE)
+    except client.ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+    return current_template
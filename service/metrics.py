@@ -0,0 +1,81 @@
+"""
+Prometheus metrics for the pods service. Health serves these on /metrics with
+start_metrics_server(); other processes can import and record to them as well.
+"""
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from codes import POD_STATUSES
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+# Health loop
+HEALTH_TICK_SECONDS = Histogram(
+    'pods_health_tick_seconds', 'Duration of a full health tick.',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160))
+HEALTH_PHASE_SECONDS = Histogram(
+    'pods_health_phase_seconds', 'Duration of each health tick phase.', ['phase'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40))
+HEALTH_TICKS_OVER_BUDGET = Counter(
+    'pods_health_ticks_over_budget_total', 'Health ticks that took longer than health_tick_budget.')
+HEALTH_DB_QUERIES_LAST_TICK = Gauge(
+    'pods_health_db_queries_last_tick', 'Postgres queries run by the last health tick, not counting other health threads.')
+HEALTH_RECONCILE = Gauge(
+    'pods_health_reconcile', 'Sizes of check_db_pods reconciliation sets during the last tick.', ['set'])
+POD_DELETION_SECONDS = Histogram(
+    'pods_deletion_seconds', 'Time from issuing k8 deletes for a pod to its k8 pod and service being gone.',
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 40, 80, 160, 320))
+PODS_DELETING = Gauge(
+    'pods_deleting', 'Pods with k8 deletions in flight.')
+POD_DELETION_REISSUES = Counter(
+    'pods_deletion_reissues_total', 'k8 deletes reissued for pods still not gone after health_deletion_timeout.')
+PODS_BY_STATUS = Gauge(
+    'pods_status_count', 'Pods in this site by status during the last tick.', ['status'])
+
+# Kubernetes API
+K8_API_SECONDS = Histogram(
+    'pods_k8_api_seconds', 'Kubernetes API call latency.', ['verb'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+K8_API_ERRORS = Counter(
+    'pods_k8_api_errors_total', 'Kubernetes API call errors, by verb and status or exception type.', ['verb', 'status'])
+K8_API_RETRIES = Counter(
+    'pods_k8_api_retries_total', 'Kubernetes API calls retried after transient errors.', ['verb'])
+K8_CACHE_OBJECTS = Gauge(
+    'pods_k8_cache_objects', 'Objects in each watch-backed k8 cache.', ['kind'])
+K8_CACHE_RELISTS = Counter(
+    'pods_k8_cache_relists_total', 'Full lists done by k8 caches, at start and when a watch expires or errors.', ['kind'])
+
+# Spawner
+SPAWNER_COMMANDS = Counter(
+    'pods_spawner_commands_total', 'Spawner commands by outcome: received, coalesced (superseded by a later command for the pod), processed.', ['outcome'])
+
+# Api
+POD_QUOTA_REJECTIONS = Counter(
+    'pods_quota_rejections_total', 'Pod admissions rejected for going over a quota, by scope (tenant, user) and quota.', ['scope', 'quota'])
+
+# Postgres pools. Every process has its own pools, component tells them apart.
+COMPONENT = os.environ.get('PODS_COMPONENT', 'api')
+DB_POOL = Gauge(
+    'pods_db_pool', 'Postgres pool stats per site database, for all threads of the component.', ['component', 'site', 'stat'])
+
+
+def set_pod_status_counts(status_counts):
+    """Set PODS_BY_STATUS from {status: count}. Statuses not in status_counts are set to 0."""
+    for status in set(POD_STATUSES) | set(status_counts.keys()):
+        PODS_BY_STATUS.labels(status=status).set(status_counts.get(status, 0))
+
+
+def set_pool_stats(pool_stats):
+    """Set DB_POOL from stores.get_pg_pool_stats(). Only numeric stats are exported."""
+    for site, stats in pool_stats.items():
+        for stat, val in stats.items():
+            if isinstance(val, (int, float)) and not isinstance(val, bool):
+                DB_POOL.labels(component=COMPONENT, site=site, stat=stat).set(val)
+
+
+def start_metrics_server(port: int | None = None):
+    port = port or conf.get("health_metrics_port", 8001)
+    start_http_server(port)
+    logger.info(f"Serving prometheus metrics on :{port}/metrics")
@@ -5,7 +5,8 @@ from datetime import datetime
 from typing import List, Dict, Literal, Any, Set
 from wsgiref import validate
 from pydantic import BaseModel, Field, validator, root_validator
-from codes import PERMISSION_LEVELS, PermissionLevel
+from codes import PERMISSION_LEVELS, PermissionLevel, READ
+from resources import DEFAULT_RESOURCE_PROFILE, resolve_resources, check_max_pod_resources
 
 from stores import pg_store
 from tapisservice.tapisfastapi.utils import g
@@ -15,14 +16,17 @@ logger = get_logger(__name__)
 
 from __init__ import t
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index, BigInteger, func, cast, tuple_
 from sqlalchemy.inspection import inspect
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlmodel import Field, Session, SQLModel, select, JSON, Column, String
 from models_base import TapisModel, TapisApiModel
 
 
 class Pod(TapisModel, table=True, validate=True):
+    # GIN index backs the permissions.overlap() (`&&`) lookup in db_get_all_with_permission.
+    __table_args__ = (Index('ix_pod_permissions_gin', 'permissions', postgresql_using='gin'),)
+
     # Required
     pod_id: str = Field(..., description = "Name of this pod.", primary_key = True)
     pod_template: str = Field(..., description = "Which pod template to use, or which custom image to run, must be on allowlist.")
@@ -38,11 +42,15 @@ class Pod(TapisModel, table=True, validate=True):
     time_to_stop_default: int = Field(43200, description = "Default time (sec) for pod to run from instance start. -1 for unlimited. 12 hour default.")
     time_to_stop_instance: int | None = Field(None, description = "Time (sec) for pod to run from instance start. Reset each time instance is started. -1 for unlimited. None uses default.")
     routing_port: int = Field(5000, description = "Port proxy points to in Pod.")
+    keep_service_on_stop: bool = Field(conf.get("keep_service_on_stop", False), description = "Keep the k8 service and proxy route while the pod is stopped, http requests get a 503 until it's running again.")
+    resource_profile: str = Field(DEFAULT_RESOURCE_PROFILE, description = "Named resource profile, small, medium, large, or custom.")
+    resources: Dict = Field({}, description = "mem_request, cpu_request, mem_limit, cpu_limit of the pod. Set from resource_profile, only given with custom. Memory as k8 quantity, cpu in millicpus.", sa_column=Column(JSON))
 
     # Provided
     time_to_stop_ts: datetime | None = Field(None, description = "Time (UTC) that this pod is scheduled to be stopped. Change with time_to_stop_instance.")
     tenant_id: str = Field(g.request_tenant_id, description = "Tapis tenant used during creation of this pod.")
     site_id: str = Field(g.site_id, description = "Tapis site used during creation of this pod.")
+    creator: str = Field(None, description = "User who created this pod, their quota is charged for it.")
     k8_name: str = Field(None, description = "Name to use for Kubernetes name.")
     url: str = Field(None, description = "Url used to access this database if it is running.")
     status: str = Field("STOPPED", description = "Current status of pod.")
@@ -55,6 +63,7 @@ class Pod(TapisModel, table=True, validate=True):
     server_protocol: str = Field("http", description = "Protocol to route server with. tcp or http.")
     logs: str = Field("", description = "Logs from kubernetes pods, useful for debugging and reading results.")
     permissions: List[str] = Field([], description = "Pod permissions for each user.", sa_column=Column(ARRAY(String, dimensions=1)))
+    revision: int = Field(1, description = "Revision of the pod's current k8 pod. Incremented each time the k8 pod is replaced by a restart.")
 
     # attempt_naive_import:
     # naive_import_command: str | None = None
@@ -65,7 +74,7 @@ class Pod(TapisModel, table=True, validate=True):
     @validator('pod_id')
     def check_pod_id(cls, v):
         # In case we want to add reserved keywords.
-        reserved_pod_ids = []
+        reserved_pod_ids = ["events", "admin", "quota"]
         if v in reserved_pod_ids:
             raise ValueError(f"pod_id overlaps with reserved pod ids: {reserved_pod_ids}")
         # Regex match full pod_id to ensure a-z0-9.
@@ -85,6 +94,10 @@ class Pod(TapisModel, table=True, validate=True):
     def check_site_id(cls, v):
         return g.site_id
 
+    @validator('creator', always=True)
+    def check_creator(cls, v):
+        return v or g.username
+
     @validator('permissions')
     def check_permissions(cls, v):
         #By default add author permissions to model.
@@ -203,6 +216,7 @@ class Pod(TapisModel, table=True, validate=True):
         display.pop('server_protocol')
         display.pop('permissions')
         display.pop('site_id')
+        display.pop('creator')
         display.pop('data_attached')
         display.pop('roles_inherited')
         return display
@@ -253,6 +267,19 @@ class NewPod(TapisApiModel):
     time_to_stop_default: int = Field(43200, description = "Default time (sec) for pod to run from instance start. -1 for unlimited. 12 hour default.")
     time_to_stop_instance: int | None = Field(None, description = "Time (sec) for pod to run from instance start. Reset each time instance is started. -1 for unlimited. 12 hour default.")
     routing_port: int = Field(5000, description = "Port proxy points to in Pod.")
+    keep_service_on_stop: bool = Field(conf.get("keep_service_on_stop", False), description = "Keep the k8 service and proxy route while the pod is stopped, http requests get a 503 until it's running again.")
+    resource_profile: str = Field(DEFAULT_RESOURCE_PROFILE, description = "Named resource profile, small, medium, large, or custom.")
+    resources: Dict = Field({}, description = "With resource_profile custom: mem_request, cpu_request, mem_limit, cpu_limit. Memory as k8 quantity (e.g. 4G), cpu in millicpus (e.g. 500). pvc_storage sets the persistent_volume size with any profile.", sa_column=Column(JSON))
+
+    @root_validator(pre=False)
+    def set_resources(cls, values):
+        # Resolved and checked once, here at creation. The pod stores them, so spawner starts it with
+        # what was admitted and the quota trigger counts it, even after profiles or max_pod_resources change.
+        values['resources'] = resolve_resources(values.get('resource_profile') or DEFAULT_RESOURCE_PROFILE,
+                                                values.get('resources'),
+                                                persistent_volume=bool(values.get('persistent_volume')))
+        check_max_pod_resources(values['resources'], g.request_tenant_id)
+        return values
 
 
 class UpdatePod(TapisApiModel):
@@ -295,6 +322,10 @@ class PodResponseModel(TapisApiModel):
     time_to_stop_instance: int | None = Field(None, description = "Time (sec) for pod to run from instance start. Reset each time instance is started. -1 for unlimited. 12 hour default.")
     time_to_stop_ts: datetime | None = Field(None, description = "Time (UTC) that this pod is scheduled to be stopped. Change with time_to_stop_instance.")
     routing_port: int = Field(5000, description = "Port proxy points to in Pod.")
+    keep_service_on_stop: bool = Field(False, description = "Keep the k8 service and proxy route while the pod is stopped.")
+    resource_profile: str = Field(DEFAULT_RESOURCE_PROFILE, description = "Named resource profile, small, medium, large, or custom.")
+    resources: Dict = Field({}, description = "mem_request, cpu_request, mem_limit, cpu_limit of the pod.", sa_column=Column(JSON))
+    revision: int = Field(1, description = "Revision of the pod's current k8 pod. Incremented each time the k8 pod is replaced by a restart.")
 
 
 #schema https://pydantic-docs.helpmanual.io/usage/schema/
@@ -353,6 +384,153 @@ class Password(TapisModel, table=True, validate=True):
         return values
 
 
+class PodStatusEvent(TapisModel, table=True, validate=True):
+    """
+    Append only change log of pod status transitions. Rows are written by the pod_status_event
+    trigger on any update of pod.status or pod.status_requested, whichever process made it,
+    and the trigger sends a NOTIFY on the pod_status_events channel.
+
+    event_ids are handed out before commit, so they can commit out of order and a reader that
+    moved past an id could skip a lower one committed later. The GET /pods/events cursor is
+    "<txid>-<event_id>" instead, and only events of transactions older than every one still in
+    progress (pg_snapshot_xmin) are read, no later commit can land behind the cursor.
+    """
+    __tablename__ = "pod_status_events"
+    __table_args__ = (Index('ix_pod_status_events_txid_event_id', 'txid', 'event_id'),)
+
+    event_id: int | None = Field(None, description = "Increasing id of this event.", primary_key = True)
+    txid: int | None = Field(None, description = "Id of the transaction that wrote this event.", sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    pod_id: str = Field(..., description = "Pod this event is for.", index = True)
+    status: str = Field(..., description = "Status of the pod after this transition.")
+    status_requested: str = Field(..., description = "Status requested of the pod after this transition.")
+    event_ts: datetime | None = Field(None, description = "Time (UTC) of this transition.")
+    pod_template: str | None = Field(None, description = "Template of the pod at this transition.")
+    actor: str | None = Field(None, description = "Component that made the transition, api, spawner, or health.")
+    reason: str | None = Field(None, description = "status_container message at this transition, if any.")
+
+    @classmethod
+    def table_name(cls):
+        return cls.__tablename__
+
+    @staticmethod
+    def parse_cursor(cursor: str):
+        """(txid, event_id) of a GET /pods/events cursor. A bare event_id is a cursor from before txids, (0, event_id)."""
+        txid, _, event_id = str(cursor).rpartition("-")
+        return int(txid or 0), int(event_id)
+
+    def cursor(self):
+        return f"{self.txid}-{self.event_id}"
+
+    @classmethod
+    def db_get_since(cls, cursor: str, user: str, tenant: str, site: str, pod_id: str | None = None, limit: int = 500):
+        """
+        Get events after cursor, in commit safe (txid, event_id) order, for pods user has READ on
+        (and optionally only pod_id). Events of transactions that may still have concurrent
+        uncommitted ones before them are left for a later call.
+        """
+        site, tenant, store = cls.get_site_tenant_session(tenant=tenant, site=site)
+        permission_list = [f"{user}:{level}" for level in READ.authorized_levels()]
+        # Every transaction below this has finished, so all of its events are visible.
+        visible_txid = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), String), BigInteger)
+
+        stmt = (select(PodStatusEvent)
+                .join(Pod, Pod.pod_id == PodStatusEvent.pod_id)
+                .where(tuple_(PodStatusEvent.txid, PodStatusEvent.event_id) > tuple_(*cls.parse_cursor(cursor)),
+                       PodStatusEvent.txid < visible_txid,
+                       Pod.permissions.overlap(permission_list))
+                .order_by(PodStatusEvent.txid, PodStatusEvent.event_id)
+                .limit(limit))
+        if pod_id:
+            stmt = stmt.where(PodStatusEvent.pod_id == pod_id)
+
+        return store.run("execute", stmt, scalars=True, all=True)
+
+    @classmethod
+    def db_get_phase_durations(cls, user: str, tenant: str, site: str, since: datetime, pod_template: str | None = None):
+        """
+        p50/p95/p99 seconds spent in each status before moving to the next one, per pod_template,
+        for pods user has READ on with events since `since`.
+        Returns rows of (pod_template, status, next_status, count, p50, p95, p99).
+        """
+        site, tenant, store = cls.get_site_tenant_session(tenant=tenant, site=site)
+        permission_list = [f"{user}:{level}" for level in READ.authorized_levels()]
+
+        # Only rows where status changed, status_requested only changes would split phases.
+        events = (select(PodStatusEvent.pod_id,
+                         PodStatusEvent.pod_template,
+                         PodStatusEvent.status,
+                         PodStatusEvent.event_id,
+                         PodStatusEvent.event_ts,
+                         func.lag(PodStatusEvent.status).over(partition_by=PodStatusEvent.pod_id,
+                                                              order_by=PodStatusEvent.event_id).label("prev_status"))
+                  .join(Pod, Pod.pod_id == PodStatusEvent.pod_id)
+                  .where(PodStatusEvent.event_ts >= since, Pod.permissions.overlap(permission_list)))
+        if pod_template:
+            events = events.where(PodStatusEvent.pod_template == pod_template)
+        events = events.subquery()
+
+        window = {"partition_by": events.c.pod_id, "order_by": events.c.event_id}
+        phases = (select(events.c.pod_template,
+                         events.c.status,
+                         func.lead(events.c.status).over(**window).label("next_status"),
+                         func.extract("epoch", func.lead(events.c.event_ts).over(**window) - events.c.event_ts).label("seconds"))
+                  .where(events.c.prev_status.is_distinct_from(events.c.status))
+                  .subquery())
+
+        stmt = (select(phases.c.pod_template,
+                       phases.c.status,
+                       phases.c.next_status,
+                       func.count().label("count"),
+                       func.percentile_cont(0.5).within_group(phases.c.seconds).label("p50"),
+                       func.percentile_cont(0.95).within_group(phases.c.seconds).label("p95"),
+                       func.percentile_cont(0.99).within_group(phases.c.seconds).label("p99"))
+                .where(phases.c.next_status.is_not(None))
+                .group_by(phases.c.pod_template, phases.c.status, phases.c.next_status)
+                .order_by(phases.c.pod_template, phases.c.status, phases.c.next_status))
+
+        return store.run("execute", stmt, all=True)
+
+
+class PodUsage(TapisModel, table=True, validate=True):
+    """
+    Running totals of what pods claim, per creator and for the whole tenant (username "*").
+    Totals are only written by the pod_quota_usage trigger on pod, admission just creates and locks rows, see quotas.py.
+    """
+    __tablename__ = "pod_usage"
+
+    username: str = Field(..., description = "Pod creator, or * for the tenant total.", primary_key = True)
+    running_pods: int = Field(0, description = "Pods with status_requested ON or RESTART.")
+    cpu: int = Field(0, description = "Summed cpu_limit of running pods, in millicpus.", sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    memory: int = Field(0, description = "Summed mem_limit of running pods, in bytes.", sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    pvc_storage: int = Field(0, description = "Summed pvc_storage of all pods, in bytes.", sa_column=Column(BigInteger, nullable=False, server_default="0"))
+
+    @classmethod
+    def table_name(cls):
+        return cls.__tablename__
+
+    @classmethod
+    def db_get_usage(cls, usernames: List[str], tenant: str, site: str):
+        """Returns {username: PodUsage} for usernames that have a row."""
+        site, tenant, store = cls.get_site_tenant_session(tenant=tenant, site=site)
+        stmt = select(PodUsage).where(PodUsage.username.in_(usernames))
+        return {usage.username: usage for usage in store.run("execute", stmt, scalars=True, all=True)}
+
+    @classmethod
+    def db_lock_usage(cls, session, usernames: List[str]):
+        """
+        In session's transaction, create missing rows for usernames and lock them FOR UPDATE until it ends.
+        Rows are locked "*" first, same as the trigger, so writers can't deadlock. Returns {username: PodUsage}.
+        """
+        usernames = sorted(set(usernames), key=lambda username: (username != "*", username))
+        session.execute(insert(PodUsage).values([{"username": username} for username in usernames])
+                        .on_conflict_do_nothing(index_elements=["username"]))
+        stmt = (select(PodUsage)
+                .where(PodUsage.username.in_(usernames))
+                .order_by(PodUsage.username != "*", PodUsage.username)
+                .with_for_update())
+        return {usage.username: usage for usage in session.execute(stmt).scalars().all()}
+
+
 class SetPermission(TapisApiModel):
     """
     Object with fields that users are allowed to specify for the Pod class.
@@ -434,3 +612,76 @@ class PodCredentialsResponse(TapisApiModel):
     result: CredentialsModel
     status: str
     version: str
+
+
+class PodStatusEventModel(TapisApiModel):
+    event_id: int = Field(..., description = "Increasing id of this event.")
+    pod_id: str = Field(..., description = "Pod this event is for.")
+    status: str = Field(..., description = "Status of the pod after this transition.")
+    status_requested: str = Field(..., description = "Status requested of the pod after this transition.")
+    event_ts: datetime | None = Field(None, description = "Time (UTC) of this transition.")
+
+
+class PodEventsModel(TapisApiModel):
+    events: List[PodStatusEventModel] = Field([], description = "Events after the requested cursor, oldest first.")
+    cursor: str = Field(..., description = "Cursor to use for the next request.")
+
+
+class PodEventsResponse(TapisApiModel):
+    message: str
+    metadata: Dict
+    result: PodEventsModel
+    status: str
+    version: str
+
+
+class PhaseDurationModel(TapisApiModel):
+    pod_template: str | None = Field(None, description = "Pod template.")
+    status: str = Field(..., description = "Status the pod was in.")
+    next_status: str = Field(..., description = "Status the pod moved to.")
+    count: int = Field(..., description = "Number of transitions measured.")
+    p50: float = Field(..., description = "Median seconds in status before moving to next_status.")
+    p95: float = Field(..., description = "95th percentile seconds in status before moving to next_status.")
+    p99: float = Field(..., description = "99th percentile seconds in status before moving to next_status.")
+
+
+class PhaseDurationsResponse(TapisApiModel):
+    message: str
+    metadata: Dict
+    result: List[PhaseDurationModel]
+    status: str
+    version: str
+
+
+class DeadLetterModel(TapisApiModel):
+    pod_id: str = Field(..., description = "Pod the command was for.")
+    command: str = Field(..., description = "Command that failed, start or restart.")
+    attempts: int = Field(..., description = "Attempts made before the command was dead-lettered.")
+    error: str = Field("", description = "Error from the last attempt.")
+    failed_at: str | None = Field(None, description = "Time (UTC) the command was dead-lettered.")
+
+
+class DeadLettersResponse(TapisApiModel):
+    message: str
+    metadata: Dict
+    result: List[DeadLetterModel]
+    status: str
+    version: str
+
+
+class QuotaScopeModel(TapisApiModel):
+    usage: Dict = Field({}, description = "running_pods, cpu (millicpus), memory (bytes), pvc_storage (bytes) in use.")
+    quota: Dict = Field({}, description = "Quota limits, missing keys are unlimited.")
+
+
+class QuotaModel(TapisApiModel):
+    tenant: QuotaScopeModel = Field(..., description = "Usage and quota of the whole tenant.")
+    user: QuotaScopeModel = Field(..., description = "Usage and quota of the user.")
+
+
+class QuotaResponse(TapisApiModel):
+    message: str
+    metadata: Dict
+    result: QuotaModel
+    status: str
+    version: str
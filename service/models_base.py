@@ -1,4 +1,5 @@
 import re
+import operator
 from string import ascii_letters, digits
 from secrets import choice
 from datetime import datetime
@@ -10,11 +11,29 @@ from tapisservice.tapisfastapi.utils import g
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, bindparam
 from sqlalchemy.inspection import inspect
 from sqlmodel import Field, Session, SQLModel, select, JSON, Column
 
 
+# Maps db_get_where oper aliases to column operators. Values are always bound parameters,
+# except None with .eq/.neq, which is compared with IS NULL/IS NOT NULL (= NULL matches nothing).
+OPER_ALIASES = {'.neq': operator.ne,
+                '.eq': operator.eq,
+                '.lte': operator.le,
+                '.lt': operator.lt,
+                '.gte': operator.ge,
+                '.gt': operator.gt,
+                '.nin': lambda column, param: column.not_in(param),
+                '.in': lambda column, param: column.in_(param)}
+
+NULL_OPERS = {'.eq': lambda column: column.is_(None),
+              '.neq': lambda column: column.is_not(None)}
+
+# Select statements keyed by (cls, 'pk'). Built once, then reused with new bound params.
+_STMT_CACHE = {}
+
+
 class TapisApiModel(BaseModel):
     class Config:
         validate_assignment = True
@@ -113,39 +132,46 @@ class TapisModel(SQLModel):
         if not where_params:
             raise ValueError(f"where_dict must be specfied for db_get_where. Got empty")
 
-        oper_aliases = {'.neq': '!=',
-                        '.eq': '==',
-                        '.lte': '<=',
-                        '.lt': '<',
-                        '.gte': '>=',
-                        '.gt': '>',
-                        '.nin': 'laterprocessing',
-                        '.in': 'laterprocessing'}
-
-        # Create base statement
-        stmt = select(cls)
-        for key, oper, val in where_params:
+        # Validate, then build a statement for this shape of where_params. Values are only ever
+        # passed as bound parameters, so SQLAlchemy's compiled cache is reused for a shape.
+        shape = []
+        params = {}
+        for idx, (key, oper, val) in enumerate(where_params):
             if key not in cls.__fields__.keys():
                 raise KeyError(f"key: {key} not found in model attrs: {cls.__fields__.keys()}")
-            if oper not in oper_aliases:
-                raise KeyError(f"oper: {oper} not found in oper aliases: {oper_aliases}")
-            
-            # Create where statement and add to stmt
-            if oper == '.in':
-                stmt = stmt.where(eval(f"cls.{key}.in_({val})")) # User.key.in_([123,456])
-            elif oper == '.nin':
-                stmt = stmt.where(eval(f"cls.{key}.not_in({val})")) # User.key.in_([123,456])
-            else:
-                if isinstance(val, str):
-                    stmt = stmt.where(eval(f"cls.{key} {oper_aliases[oper]} '{val}'"))
-                else:
-                    stmt = stmt.where(eval(f"cls.{key} {oper_aliases[oper]} {val}"))
+            if oper not in OPER_ALIASES:
+                raise KeyError(f"oper: {oper} not found in oper aliases: {list(OPER_ALIASES.keys())}")
+            if oper in ['.in', '.nin'] and not isinstance(val, (list, tuple, set)):
+                raise TypeError(f"oper: {oper} requires a list of values. Got {type(val).__name__}.")
+            if val is None and oper in NULL_OPERS:
+                shape.append((key, f"{oper}.null"))
+                continue
+            shape.append((key, oper))
+            params[f"{key}_{idx}"] = list(val) if oper in ['.in', '.nin'] else val
+        stmt = cls._get_where_stmt(tuple(shape))
 
         # Run command
-        results = store.run("execute", stmt, scalars=True, all=True)
+        results = store.run("execute", stmt, fn_params={"params": params}, scalars=True, all=True)
 
         return results
 
+    @classmethod
+    def _get_where_stmt(cls, shape):
+        """
+        Returns select statement for the given where shape, ((key, oper), ...). oper ".eq.null"
+        and ".neq.null" are IS NULL/IS NOT NULL. Other conditions are bound with bindparam named
+        f"{key}_{idx}" so statements with the same shape compile the same.
+        """
+        stmt = select(cls)
+        for idx, (key, oper) in enumerate(shape):
+            column = getattr(cls, key)
+            if oper.endswith('.null'):
+                stmt = stmt.where(NULL_OPERS[oper.removesuffix('.null')](column))
+                continue
+            param = bindparam(f"{key}_{idx}", expanding=oper in ['.in', '.nin'])
+            stmt = stmt.where(OPER_ALIASES[oper](column, param))
+        return stmt
+
     @classmethod
     def db_get_with_pk(cls, pk_id, tenant, site):
         """
@@ -156,12 +182,16 @@ class TapisModel(SQLModel):
         table_name = cls.table_name()
         logger.info(f'Top of {table_name}.db_get_all() for tenant.site: {tenant}.{site}')
 
-        # Create statement
-        primary_key = inspect(cls).primary_key[0].name
-        stmt = select(cls).where(eval(f"cls.{primary_key}.in_([pk_id])"))
+        # Create statement, cached per class as only pk_id changes between calls.
+        cache_key = (cls, 'pk')
+        stmt = _STMT_CACHE.get(cache_key)
+        if stmt is None:
+            primary_key = inspect(cls).primary_key[0].name
+            stmt = select(cls).where(getattr(cls, primary_key) == bindparam("pk_id"))
+            _STMT_CACHE[cache_key] = stmt
 
         # Run command
-        result = store.run("scalar", stmt)
+        result = store.run("scalar", stmt, fn_params={"params": {"pk_id": pk_id}})
 
         return result
 
@@ -64,7 +64,7 @@ class LegacyQueue(object):
 
 
 class TaskQueue(object):
-    def __init__(self, name=None):
+    def __init__(self, name=None, **queue_args):
         # reuse the singleton rconn
         # self.conn = rconn
         # NOTE -
@@ -76,7 +76,8 @@ class TaskQueue(object):
         self.conn = RabbitConnection()
         self._ch = self.conn._ch
         self.name = name
-        self.queue = rabbitpy.Queue(self._ch, name=name, durable=True)
+        # queue_args are extra rabbitpy.Queue args, e.g. message_ttl and dead_letter_routing_key.
+        self.queue = rabbitpy.Queue(self._ch, name=name, durable=True, **queue_args)
         self.queue.declare()
         # the following added for backwards compatibility so that client code using the ch._queue._queue attribute
         # will continue to work.
@@ -99,8 +100,9 @@ class TaskQueue(object):
         """
         return msg
 
-    def put(self, m):
-        msg = rabbitpy.Message(self.conn._ch, self._pre_process(m), {})
+    def put(self, m, headers: dict | None = None):
+        properties = {'headers': headers} if headers else {}
+        msg = rabbitpy.Message(self.conn._ch, self._pre_process(m), properties)
         msg.publish('', self.name)
 
     # def close(self):
@@ -116,6 +118,19 @@ class TaskQueue(object):
     def delete(self):
         self.queue.delete()
 
+    def get_messages(self, limit: int):
+        """
+        Get up to limit messages without consuming. Messages stay unacked on this channel until
+        each is ack()'d or nack()'d, so they aren't redelivered to this call.
+        """
+        msgs = []
+        while len(msgs) < limit:
+            msg = self.queue.get(acknowledge=True)
+            if not msg:
+                break
+            msgs.append(msg)
+        return msgs
+
     def get_one(self):
         """Blocking method to get a single message without polling."""
         if self._queue is None:
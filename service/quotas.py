@@ -0,0 +1,120 @@
+"""
+Tenant and user quotas on running pods, cpu, memory, and pvc storage, checked when the api admits a
+pod (create, start, restart of a stopped pod). Usage isn't counted per request, the pod_usage table
+keeps running totals per tenant ("*" row) and per pod creator, maintained by the pod_quota_usage
+trigger on every pod insert/update/delete, whichever process made it. admit_pod locks the two
+counter rows (SELECT ... FOR UPDATE), checks them, and writes the pod in one transaction, so
+concurrent admissions for a tenant queue on its "*" row instead of overshooting a quota.
+
+Pods count as running while status_requested is ON or RESTART, cpu and memory are their limits.
+pvc storage counts from creation until the pod is deleted.
+Quotas are set in conf, missing keys are unlimited:
+    tenant_quotas: {"default"|tenant_id: {max_running_pods, max_cpu, max_memory, max_pvc_storage}}
+    user_quotas: {"default"|tenant_id|"<tenant_id>.<username>": {...}}, most specific wins.
+"""
+from errors import ResourceError
+from metrics import POD_QUOTA_REJECTIONS
+from models import PodUsage
+from resources import parse_memory, parse_cpu
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+# pod_usage row holding the whole tenant's usage.
+TENANT_USAGE = "*"
+# usage field: (quota key, parser for the quota value)
+QUOTA_FIELDS = {"running_pods": ("max_running_pods", int),
+                "cpu": ("max_cpu", parse_cpu),
+                "memory": ("max_memory", parse_memory),
+                "pvc_storage": ("max_pvc_storage", parse_memory)}
+
+
+def tenant_quota(tenant_id: str):
+    quotas = conf.get("tenant_quotas", None) or {}
+    return quotas.get(tenant_id) or quotas.get("default") or {}
+
+
+def user_quota(tenant_id: str, username: str):
+    quotas = conf.get("user_quotas", None) or {}
+    return quotas.get(f"{tenant_id}.{username}") or quotas.get(tenant_id) or quotas.get("default") or {}
+
+
+def pod_claim(pod, running: bool = False, storage: bool = False):
+    """Usage pod adds when it starts running and/or when it's created (pvc storage). Same as the trigger counts."""
+    claim = {"running_pods": 0, "cpu": 0, "memory": 0, "pvc_storage": 0}
+    resources = pod.resources or {}
+    if running:
+        claim["running_pods"] = 1
+        claim["cpu"] = parse_cpu(resources.get("cpu_limit", 0))
+        claim["memory"] = parse_memory(resources.get("mem_limit", 0))
+    if storage and resources.get("pvc_storage"):
+        claim["pvc_storage"] = parse_memory(resources["pvc_storage"])
+    return claim
+
+
+def quota_scopes(pod):
+    """(scope, usage username, quota) pod counts against. Pods without a creator only count for the tenant, like pod_usage_add."""
+    scopes = [("tenant", TENANT_USAGE, tenant_quota(pod.tenant_id))]
+    if pod.creator:
+        scopes.append(("user", pod.creator, user_quota(pod.tenant_id, pod.creator)))
+    return scopes
+
+
+def needs_quota_check(pod, claim):
+    return any(claim.values()) and any(quota for _, _, quota in quota_scopes(pod))
+
+
+def check_quota(pod, running: bool = False, storage: bool = False, usage: dict | None = None):
+    """
+    Raises ResourceError (403) if admitting pod would put its tenant or creator over quota.
+    running=True for pods about to be requested ON, storage=True for new pods. usage is
+    {username: PodUsage}, read here if not given. Only admit_pod's check holds, see there.
+    """
+    claim = pod_claim(pod, running=running, storage=storage)
+    if not needs_quota_check(pod, claim):
+        return
+    if usage is None:
+        usage = PodUsage.db_get_usage([username for _, username, _ in quota_scopes(pod)], tenant=pod.tenant_id, site=pod.site_id)
+    for scope, username, quota in quota_scopes(pod):
+        current = usage.get(username)
+        for field, (quota_key, parse) in QUOTA_FIELDS.items():
+            if not claim[field] or quota.get(quota_key) is None:
+                continue
+            used = getattr(current, field) if current else 0
+            if used + claim[field] > parse(quota[quota_key]):
+                POD_QUOTA_REJECTIONS.labels(scope=scope, quota=quota_key).inc()
+                who = f"tenant {pod.tenant_id}" if scope == "tenant" else f"user {pod.creator}"
+                msg = (f"Pod {pod.pod_id} would put {who} over its {quota_key} quota of {quota[quota_key]}. "
+                       f"{field} in use: {used}, pod needs: {claim[field]}.")
+                logger.info(msg)
+                raise ResourceError(msg, 403)
+
+
+def admit_pod(pod, write: str, running: bool = False, storage: bool = False):
+    """
+    Write pod with session `write` ("add" for new pods, "merge" for updates) if it's within quota,
+    else raise ResourceError (403). The usage rows stay locked until the write commits, so the
+    trigger counts it before any other admission in the tenant reads them.
+    """
+    claim = pod_claim(pod, running=running, storage=storage)
+    if not needs_quota_check(pod, claim):
+        return pod.db_create() if write == "add" else pod.db_update()
+    site, tenant, store = pod.get_site_tenant_session(obj=pod)
+    with store.transaction() as session:
+        usage = PodUsage.db_lock_usage(session, [username for _, username, _ in quota_scopes(pod)])
+        check_quota(pod, running=running, storage=storage, usage=usage)
+        getattr(session, write)(pod)
+    logger.info(f"Admitted pod {pod.pod_id} within quota in {tenant}.{site}.")
+    return pod
+
+
+def quota_usage(tenant_id: str, site_id: str, username: str):
+    """{tenant: {usage, quota}, user: {usage, quota}} for username in tenant_id."""
+    usage = PodUsage.db_get_usage([TENANT_USAGE, username], tenant=tenant_id, site=site_id)
+    result = {}
+    for scope, key, quota in [("tenant", TENANT_USAGE, tenant_quota(tenant_id)),
+                              ("user", username, user_quota(tenant_id, username))]:
+        current = usage.get(key)
+        result[scope] = {"usage": {field: getattr(current, field) if current else 0 for field in QUOTA_FIELDS},
+                         "quota": quota}
+    return result
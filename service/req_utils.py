@@ -79,4 +79,33 @@ class HttpUrlRedirectMiddleware:
       response = RedirectResponse(url, status_code=307)
       await response(scope, receive, send)
     else:
-      await self.app(scope, receive, send)
\ No newline at end of file
+      await self.app(scope, receive, send)
+
+from starlette.datastructures import Headers, MutableHeaders
+from tracing import span, SPAN_KIND_SERVER
+
+class TraceMiddleware:
+  """
+  Runs each http request in a tracing span. Continues the caller's trace if it sends a traceparent
+  header, and returns the request's traceparent so clients can correlate their request.
+  Commands put on the command channel during the request carry the trace to the spawner.
+  """
+
+  def __init__(self, app: ASGIApp) -> None:
+    self.app = app
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    traceparent = Headers(scope=scope).get("traceparent")
+    with span(f"{scope['method']} {scope['path']}", traceparent=traceparent, kind=SPAN_KIND_SERVER,
+              attributes={"http.method": scope["method"], "http.target": scope["path"]}) as request_span:
+      async def send_with_trace(message):
+        if message["type"] == "http.response.start":
+          request_span.attributes["http.status_code"] = message["status"]
+          MutableHeaders(scope=message).append("traceparent", request_span.traceparent())
+        await send(message)
+
+      await self.app(scope, receive, send_with_trace)
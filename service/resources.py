@@ -0,0 +1,107 @@
+"""
+Pod resource profiles. Pods pick a named profile (small, medium, large) or "custom" with their own
+resources. Resources are resolved and checked against the tenant's max pod size when the pod is
+created, then stored on the pod so spawner starts exactly what was admitted.
+Memory is a k8 quantity ("512M", "4G", "2Gi", "129e6"), cpu is in millicpus ("500" or "500m" is half a cpu).
+"""
+import math
+import re
+from decimal import Decimal
+
+from tapisservice.config import conf
+
+DEFAULT_RESOURCE_PROFILES = {
+    "small": {"mem_request": "128M", "cpu_request": "250", "mem_limit": "1G", "cpu_limit": "1000"},
+    # What every pod got before profiles.
+    "medium": {"mem_request": "250M", "cpu_request": "500", "mem_limit": "4G", "cpu_limit": "3000"},
+    "large": {"mem_request": "2G", "cpu_request": "2000", "mem_limit": "16G", "cpu_limit": "8000"}
+}
+RESOURCE_PROFILES = conf.get("resource_profiles", None) or DEFAULT_RESOURCE_PROFILES
+DEFAULT_RESOURCE_PROFILE = "medium"
+CUSTOM_RESOURCE_PROFILE = "custom"
+RESOURCE_KEYS = ("mem_request", "cpu_request", "mem_limit", "cpu_limit")
+# Size of the pvc created for pods with persistent_volume, unless resources.pvc_storage is given.
+DEFAULT_PVC_STORAGE = conf.get("pvc_storage_size", "10Gi")
+
+# Every suffix k8 takes on a quantity. m, u, n are fractions of a byte, "400m" is 0.4 bytes.
+MEMORY_UNITS = {"": 1, "n": Decimal("1e-9"), "u": Decimal("1e-6"), "m": Decimal("1e-3"),
+                "k": 1000, "M": 1000 ** 2, "G": 1000 ** 3, "T": 1000 ** 4, "P": 1000 ** 5, "E": 1000 ** 6,
+                "Ki": 1024, "Mi": 1024 ** 2, "Gi": 1024 ** 3, "Ti": 1024 ** 4, "Pi": 1024 ** 5, "Ei": 1024 ** 6}
+# Number, then a unit or a decimal exponent ("129e6"). "1E" is an exabyte, "1E3" is 1000 bytes.
+MEMORY_RE = re.compile(r'(\d+(?:\.\d*)?|\.\d+)(?:[eE]([-+]?\d+)|(n|u|m|k|M|G|T|P|E|Ki|Mi|Gi|Ti|Pi|Ei))?')
+CPU_RE = re.compile(r'(\d+)m?')
+
+
+def parse_memory(quantity) -> int:
+    """Bytes in a k8 memory quantity, e.g. "4G", "512Mi", or "129e6". Fractions of a byte round up, like k8."""
+    match = MEMORY_RE.fullmatch(str(quantity).strip())
+    if not match:
+        raise ValueError(f"Invalid memory quantity: {quantity}. Expected a number with an optional unit, e.g. 512M or 4Gi.")
+    number, exponent, unit = match.groups()
+    scale = Decimal(10) ** int(exponent) if exponent else MEMORY_UNITS[unit or ""]
+    return math.ceil(Decimal(number) * scale)
+
+
+def parse_cpu(millicpus) -> int:
+    """Millicpus as an int, e.g. "500" or "500m"."""
+    match = CPU_RE.fullmatch(str(millicpus).strip())
+    if not match:
+        raise ValueError(f"Invalid cpu: {millicpus}. Expected an int number of millicpus, e.g. 500 or 500m.")
+    return int(match.group(1))
+
+
+def resolve_resources(profile: str, resources: dict | None = None, persistent_volume: bool = False):
+    """
+    Resources for a profile. resources is only used, and then required, with the custom profile,
+    apart from pvc_storage which any pod with persistent_volume may set.
+    Returns {mem_request, cpu_request, mem_limit, cpu_limit[, pvc_storage]} as strs.
+    """
+    pvc_storage = (resources or {}).get("pvc_storage") or DEFAULT_PVC_STORAGE
+    if profile == CUSTOM_RESOURCE_PROFILE:
+        resources = resources or {}
+        missing = [key for key in RESOURCE_KEYS if not resources.get(key)]
+        if missing:
+            raise ValueError(f"resource_profile {CUSTOM_RESOURCE_PROFILE} requires resources with: {list(RESOURCE_KEYS)}. Missing: {missing}.")
+        resources = {key: str(resources[key]) for key in RESOURCE_KEYS}
+    elif profile in RESOURCE_PROFILES:
+        resources = dict(RESOURCE_PROFILES[profile])
+    else:
+        raise ValueError(f"resource_profile must be one of: {list(RESOURCE_PROFILES) + [CUSTOM_RESOURCE_PROFILE]}.")
+    # Stored as plain millicpus, spawner passes them to k8 with an "m" suffix and the quota trigger sums them.
+    for key in ("cpu_request", "cpu_limit"):
+        resources[key] = str(parse_cpu(resources[key]))
+
+    if parse_memory(resources["mem_request"]) > parse_memory(resources["mem_limit"]):
+        raise ValueError(f"mem_request {resources['mem_request']} is more than mem_limit {resources['mem_limit']}.")
+    if parse_cpu(resources["cpu_request"]) > parse_cpu(resources["cpu_limit"]):
+        raise ValueError(f"cpu_request {resources['cpu_request']} is more than cpu_limit {resources['cpu_limit']}.")
+    if persistent_volume:
+        parse_memory(pvc_storage)
+        resources["pvc_storage"] = str(pvc_storage)
+    return resources
+
+
+def max_pod_resources(tenant_id: str):
+    """Largest mem_limit and cpu_limit a pod may have in tenant_id. tenant_max_pod_resources overrides max_pod_resources."""
+    max_resources = dict(conf.get("max_pod_resources", None) or {"mem_limit": "16G", "cpu_limit": "8000"})
+    max_resources.update((conf.get("tenant_max_pod_resources", None) or {}).get(tenant_id, {}))
+    return max_resources
+
+
+def check_max_pod_resources(resources: dict, tenant_id: str):
+    """Raises ValueError if resources are over the tenant's max pod size."""
+    max_resources = max_pod_resources(tenant_id)
+    if parse_memory(resources["mem_limit"]) > parse_memory(max_resources["mem_limit"]):
+        raise ValueError(f"mem_limit {resources['mem_limit']} is over the max of {max_resources['mem_limit']} per pod in tenant {tenant_id}.")
+    if parse_cpu(resources["cpu_limit"]) > parse_cpu(max_resources["cpu_limit"]):
+        raise ValueError(f"cpu_limit {resources['cpu_limit']} is over the max of {max_resources['cpu_limit']} per pod in tenant {tenant_id}.")
+
+
+def pod_resources(pod):
+    """create_pod resource kwargs for pod. Pods from before profiles have no stored resources and use their profile's."""
+    if pod.resources:
+        return {key: pod.resources[key] for key in RESOURCE_KEYS}
+    resources = dict(RESOURCE_PROFILES.get(pod.resource_profile) or RESOURCE_PROFILES[DEFAULT_RESOURCE_PROFILE])
+    for key in ("cpu_request", "cpu_limit"):
+        resources[key] = str(parse_cpu(resources[key]))
+    return resources
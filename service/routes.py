@@ -0,0 +1,170 @@
+"""
+Proxy route table for traefik. Health renders it into the pods-traefik-conf configmap each tick,
+which traefik only sees after the kubelet configmap sync (~60s). /traefik-config serves the same
+table rendered straight from the database, so route changes reach traefik within one provider poll.
+The table is rebuilt in a background thread per site on pod status events (NOTIFY), a burst of them
+being one rebuild after api_route_table_debounce, or after api_route_table_ttl. Requests only read
+the last rendered table, they never query the database.
+
+With route_shards > 1 the table is split by hash of k8_name. The "base" shard has the entrypoints,
+middlewares, tls, and pods-service routes, shard i only the routers and services of its pods. Each is
+its own configmap (pods-traefik-conf-<shard>) and /traefik-config/shards/<shard>, and only shards
+whose pods' routes changed are re-rendered. pods-traefik-conf, the one traefik mounts, keeps the whole table.
+"""
+import threading
+import time
+import zlib
+
+from sqlmodel import select
+from events import get_pod_event_notifier
+from kubernetes_utils import render_traefik_template
+from models import Pod
+from stores import pg_store, SITE_TENANT_DICT
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+ROUTE_SHARDS = conf.get("route_shards", 1)
+
+
+def pod_proxy_info(pods):
+    """
+    Proxy info for the traefik template from pods. Returns (tcp, http, postgres) dicts of
+    {pod.k8_name: {routing_port, url, keep_service}, ...}.
+    Nothing here depends on pod status, so stopping and starting a pod doesn't change its route.
+    """
+    tcp_proxy_info = {}
+    http_proxy_info = {}
+    postgres_proxy_info = {}
+    for pod in pods:
+        template_info = {"routing_port": pod.routing_port,
+                         "url": pod.url,
+                         # http routes of these pods turn the 502/503 of a stopped pod into the api's pod-stopped page.
+                         "keep_service": pod.keep_service_on_stop}
+        match pod.server_protocol:
+            case "tcp":
+                tcp_proxy_info[pod.k8_name] = template_info
+            case "http":
+                http_proxy_info[pod.k8_name] = template_info
+            case "postgres":
+                postgres_proxy_info[pod.k8_name] = template_info
+    return tcp_proxy_info, http_proxy_info, postgres_proxy_info
+
+
+def shard_names(shards: int = ROUTE_SHARDS):
+    return ["base"] + [str(i) for i in range(shards)] if shards > 1 else ["base"]
+
+
+def shard_configmap_name(shard: str, shards: int = ROUTE_SHARDS):
+    return "pods-traefik-conf" if shards == 1 else f"pods-traefik-conf-{shard}"
+
+
+class RouteShards():
+    """Rendered route table shards. update() only re-renders shards whose proxy info changed."""
+    def __init__(self, shards: int = ROUTE_SHARDS):
+        self.shards = shards
+        # shard: rendered traefik.yml
+        self.rendered = {}
+        # shard: proxy info it was rendered from
+        self.proxy_info = {}
+        # shard: bumped each time its rendered text changes
+        self.versions = {}
+
+    def shard_of(self, pod):
+        # crc32, unlike hash(), is the same in every process.
+        return str(zlib.crc32(pod.k8_name.encode("utf-8")) % self.shards)
+
+    def update(self, pods):
+        """Re-render shards for pods. Returns the names of shards whose rendered text changed."""
+        groups = {name: [] for name in shard_names(self.shards)}
+        for pod in pods:
+            groups["base" if self.shards == 1 else self.shard_of(pod)].append(pod)
+
+        changed = []
+        for name, shard_pods in groups.items():
+            proxy_info = pod_proxy_info(shard_pods)
+            if name in self.rendered and self.proxy_info[name] == proxy_info:
+                continue
+            rendered = render_traefik_template(*proxy_info, shard=self.shards > 1 and name != "base")
+            self.proxy_info[name] = proxy_info
+            if rendered != self.rendered.get(name):
+                self.rendered[name] = rendered
+                self.versions[name] = self.versions.get(name, 0) + 1
+                changed.append(name)
+        return changed
+
+
+class RouteTable():
+    def __init__(self, site_id: str, ttl: float = 5, debounce: float = 0.5):
+        self.site_id = site_id
+        # Seconds between rebuilds without a pod event. Covers changes that don't go through pod
+        # status, e.g. pod creation with status_requested OFF or deletion.
+        self.ttl = ttl
+        # Seconds to let a burst of pod events settle before rebuilding once.
+        self.debounce = debounce
+        self.route_shards = RouteShards()
+        # {shard: (version, rendered traefik.yml)} of the last successful rebuild.
+        self.tables = None
+        # Exception of the last rebuild, if it failed.
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, name=f"route-table-{self.site_id}", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        notifier = get_pod_event_notifier(self.site_id)
+        version = notifier.version
+        while True:
+            self.rebuild()
+            # Pod events, or ttl. Events that come in during the debounce are picked up by this same rebuild.
+            if notifier.wait_version(version, self.ttl) != version:
+                time.sleep(self.debounce)
+            version = notifier.version
+
+    def get_site_pods(self):
+        pods = []
+        for tenant in SITE_TENANT_DICT[self.site_id]:
+            pods += pg_store[self.site_id][tenant].run("execute", select(Pod), scalars=True, all=True)
+        return pods
+
+    def rebuild(self):
+        try:
+            changed = self.route_shards.update(self.get_site_pods())
+            if changed:
+                logger.debug(f"Route table shards changed for site {self.site_id}: {changed}.")
+            self.tables = {name: (self.route_shards.versions[name], rendered)
+                           for name, rendered in self.route_shards.rendered.items()}
+            self.error = None
+        except Exception as e:
+            logger.error(f"Error rebuilding route table for site {self.site_id}. e: {repr(e)}")
+            self.error = e
+        self.ready.set()
+
+    def get(self, timeout: float = 10):
+        """
+        Returns {shard: (version, rendered traefik.yml)} of the last rebuild. Only waits for the first one.
+        Raises if the last rebuild couldn't read the database.
+        """
+        self.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"Route table for site {self.site_id} not built after {timeout}s.")
+        if self.error is not None:
+            raise self.error
+        return self.tables
+
+
+ROUTE_TABLES = {}
+
+def get_route_table(site_id: str):
+    route_table = ROUTE_TABLES.get(site_id)
+    if route_table is None:
+        route_table = ROUTE_TABLES.setdefault(site_id, RouteTable(site_id, ttl=conf.get("api_route_table_ttl", 5),
+                                                                  debounce=conf.get("api_route_table_debounce", 0.5)))
+    return route_table
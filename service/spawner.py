@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import time
 
 import rabbitpy
@@ -8,8 +9,11 @@ from codes import ERROR, SPAWNER_SETUP, CREATING_CONTAINER, \
     REQUESTED, SHUTTING_DOWN, ON
 from health import graceful_rm_pod
 from models import Pod, Password
-from channels import CommandChannel
+from channels import CommandChannel, CommandRetryChannel, CommandDeadLetterChannel
 from kubernetes_templates import start_generic_pod, start_neo4j_pod, start_postgres_pod
+from kubernetes_utils import rm_container, wait_for_pod_deletion, is_transient_error, KubernetesError
+from tracing import span, trace_log_handlers, SPAN_KIND_CONSUMER
+from metrics import SPAWNER_COMMANDS
 from tapisservice.config import conf
 from tapisservice.logs import get_logger
 from tapisservice.errors import BaseTapisError
@@ -20,31 +24,166 @@ class SpawnerException(BaseTapisError):
     """Error with spawner."""
     pass
 
+class PendingCommands():
+    """
+    Pending-command index keyed by (site_id, tenant_id, pod_id). A command waits `window` seconds
+    before it's processed, and one that comes in for a pod with a command still pending replaces it,
+    so only the latest intent is processed. Commands for a pod being processed wait until it's done,
+    so the same pod is never processed by two threads at once.
+    """
+    def __init__(self, window: float = 1):
+        self.window = window
+        # key: {'cmd': dict, 'headers': dict, 'coalesced': int}
+        self.pending = {}
+        self.active = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(cmd):
+        return (cmd.get("site_id"), cmd.get("tenant_id"), cmd.get("pod_id"))
+
+    def add(self, cmd, headers):
+        """Index cmd. Returns True if the caller should schedule the pod, False if it's already scheduled."""
+        key = self.key(cmd)
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry:
+                entry['coalesced'] += 1
+                # A start can't supersede a pending restart, the api already moved the pod to a new revision.
+                if entry['cmd'].get("command") == "restart" and cmd.get("command", "start") == "start":
+                    cmd = {**cmd, "command": "restart"}
+                entry['cmd'], entry['headers'] = cmd, headers
+                SPAWNER_COMMANDS.labels(outcome="coalesced").inc()
+                logger.debug(f"Coalesced command for {key}, {entry['coalesced']} superseded so far. Latest: {cmd}")
+                return False
+            self.pending[key] = {'cmd': cmd, 'headers': headers, 'coalesced': 0}
+            return key not in self.active
+
+    def take(self, key):
+        """Pop the latest command for key and mark the pod active. None if there's nothing pending."""
+        with self.lock:
+            entry = self.pending.pop(key, None)
+            if entry:
+                self.active.add(key)
+            return entry
+
+    def done(self, key):
+        """Mark the pod inactive. Returns True if a command came in meanwhile and the pod should be scheduled again."""
+        with self.lock:
+            self.active.discard(key)
+            return key in self.pending
+
+
 class Spawner(object):
     def __init__(self):
         self.queue = os.environ.get('queue', 'tacc')
         self.cmd_ch = CommandChannel(name=self.queue)
         self.host_id = conf.spawner_host_id
+        # Attempts per command, including the first, before it's dead-lettered.
+        self.max_attempts = conf.get("spawner_max_attempts", 5)
+        self.retry_base_delay = conf.get("spawner_retry_base_delay", 5)
+        self.pending = PendingCommands(window=conf.get("spawner_coalesce_window", 1))
+        self.executor = ThreadPoolExecutor(6) # 6 threads, meaning 6 spawning processes at once.
+
+    def schedule(self, key):
+        """Process key's latest command after the coalesce window."""
+        timer = threading.Timer(self.pending.window, self.executor.submit, args=(self.drain, key))
+        timer.daemon = True
+        timer.start()
+
+    def drain(self, key):
+        entry = self.pending.take(key)
+        if not entry:
+            return
+        try:
+            SPAWNER_COMMANDS.labels(outcome="processed").inc()
+            self.process(entry['cmd'], entry['headers'])
+        except Exception as e:
+            logger.error(f"Spawner got an exception processing cmd: {entry['cmd']}. "
+                         f"Exception type: {type(e).__name__}. Exception: {e}")
+        finally:
+            if self.pending.done(key):
+                self.schedule(key)
 
     def run(self):
-        executor = ThreadPoolExecutor(6) # 6 threads, meaning 6 spawning processes at once.
         while True:
             cmd, msg_obj = self.cmd_ch.get_one()
             # directly ack the messages from the command channel; problems generated from starting pods are
-            # handled downstream; e.g., by setting the pod to an ERROR state; command messages should not be re-queued
+            # handled downstream; transient errors put the command on a delay queue, others dead-letter it.
             msg_obj.ack()
+            headers = {key: val.decode('utf-8') if isinstance(val, bytes) else val
+                       for key, val in (msg_obj.properties.get('headers') or {}).items()}
+            SPAWNER_COMMANDS.labels(outcome="received").inc()
             try:
-                executor.submit(self.process, cmd)
+                if self.pending.add(cmd, headers):
+                    self.schedule(PendingCommands.key(cmd))
             except Exception as e:
                 logger.error(f"Spawner got an exception trying to process cmd: {cmd}. "
                              f"Exception type: {type(e).__name__}. Exception: {e}")
 
-    def process(self, cmd):
+    def process(self, cmd, headers=None):
+        """
+        Runs process_cmd in a span continuing the trace from the command's traceparent header.
+        Time the command spent queued is recorded as its own span.
+        """
+        headers = headers or {}
+        attributes = {"pod_id": cmd.get("pod_id"), "tenant_id": cmd.get("tenant_id"),
+                      "site_id": cmd.get("site_id"), "command": cmd.get("command", "start")}
+        traceparent = headers.get("traceparent")
+        if traceparent and headers.get("sent_ns"):
+            with span("command_channel.queued", traceparent=traceparent, attributes=attributes, start_ns=int(headers["sent_ns"])):
+                pass
+        attempt = int(headers.get("attempt", 1))
+        attributes["attempt"] = attempt
+        with span("spawner.process", traceparent=traceparent, kind=SPAN_KIND_CONSUMER, attributes=attributes):
+            self.process_cmd(cmd, attempt=attempt)
+
+    def retry_delay(self, attempt: int):
+        """Seconds before retrying a command that failed on attempt. Doubles each attempt."""
+        return self.retry_base_delay * 2 ** (attempt - 1)
+
+    def retry_cmd(self, pod, cmd, attempt: int, e: Exception):
+        """
+        Put cmd on the delay queue for its next attempt. The partial k8 pod is removed; the service
+        and pvc are reused when the command comes back. Pod waits in REQUESTED meanwhile.
+        """
+        delay = self.retry_delay(attempt)
+        msg = f"Transient error starting pod, retrying in {delay}s (attempt {attempt + 1}/{self.max_attempts}). e: {e}"
+        logger.warning(f"{pod.k8_name}: {msg}")
+        try:
+            rm_container(pod.k8_name)
+        except KubernetesError:
+            pass
+        pod.status = REQUESTED
+        pod.status_container = {"message": msg}
+        pod.db_update()
+        retry_ch = CommandRetryChannel(delay=delay, name=self.queue)
+        try:
+            retry_ch.put_retry(cmd, attempt=attempt + 1, error=repr(e))
+        finally:
+            retry_ch.close()
+
+    def dead_letter_cmd(self, pod, cmd, attempt: int, error: str):
+        """Record cmd on the dead-letter queue for admins to inspect or replay, then shut the pod down."""
+        logger.critical(f"Command for {pod.k8_name} failed on attempt {attempt}, dead-lettering. Running graceful_rm_pod. e: {error}")
+        dead_ch = CommandDeadLetterChannel(name=self.queue)
+        try:
+            dead_ch.put_dead(cmd, attempts=attempt, error=error)
+        except Exception as e:
+            logger.error(f"Error putting command for {pod.k8_name} on the dead-letter queue. e: {repr(e)}")
+        finally:
+            dead_ch.close()
+        pod.status_container = {"message": f"Pod failed to start. e: {error}"}
+        graceful_rm_pod(pod)
+
+    def process_cmd(self, cmd, attempt: int = 1):
         """Main spawner method for processing a command from the CommandChannel."""
-        logger.info(f"top of process; cmd: {cmd}")
+        logger.info(f"top of process; cmd: {cmd}; attempt: {attempt}")
         pod_id = cmd["pod_id"]
         tenant_id = cmd["tenant_id"]
         site_id = cmd["site_id"]
+        # "restart" replaces only the k8 pod of a running pod, the service, pvc, and proxy route are kept.
+        recreate = cmd.get("command", "start") == "restart"
 
         # Get pod while in spawner. Expect REQUESTED. If status_requested = OFF then request was started while waiting
         # for command to startup in queue. In that case, we simply abort and wait for health to delete pod.
@@ -66,25 +205,41 @@ class Spawner(object):
             return
 
         # Pod status was REQUESTED and status_requested was ON; moving on to SPAWNER_SETUP ----
+        # For restarts the api already bumped revision. Health skips k8 pods with an older revision,
+        # so the old pod can't change status while it terminates.
         pod.status = SPAWNER_SETUP
         pod.db_update()
         logger.debug(f"spawner has updated pod status to SPAWNER_SETUP")
 
         try:
+            if recreate or attempt > 1:
+                logger.info(f"Replacing k8 pod only for {pod.k8_name}, revision {pod.revision}, attempt {attempt}.")
+                try:
+                    rm_container(pod.k8_name)
+                except KubernetesError:
+                    # Already gone.
+                    pass
+                # The new k8 pod reuses the name, so the old (or partial, on a retry) one has to be gone first.
+                wait_for_pod_deletion(pod.k8_name, timeout=conf.get("spawner_restart_timeout", 120))
+
             if pod.pod_template.startswith("custom-"):
                 custom_image = pod.pod_template.replace("custom-", "")
-                start_generic_pod(pod=pod, custom_image=custom_image, revision=1)
+                start_generic_pod(pod=pod, custom_image=custom_image, revision=pod.revision, recreate=recreate)
             elif pod.pod_template == 'neo4j':
-                start_neo4j_pod(pod=pod, revision=1)
+                start_neo4j_pod(pod=pod, revision=pod.revision, recreate=recreate)
             elif pod.pod_template == 'postgres':
-                start_postgres_pod(pod=pod, revision=1)
+                start_postgres_pod(pod=pod, revision=pod.revision, recreate=recreate)
             else:
-                logger.critical(f"pod_template found no working functions. Running graceful_rm_pod.")
-                graceful_rm_pod(pod)
+                self.dead_letter_cmd(pod, cmd, attempt, f"pod_template {pod.pod_template} found no working functions.")
                 return
         except Exception as e:
-            logger.critical(f"Got error when creating pod. Running graceful_rm_pod. e: {e}")
-            graceful_rm_pod(pod)
+            if is_transient_error(e) and attempt < self.max_attempts:
+                try:
+                    self.retry_cmd(pod, cmd, attempt, e)
+                    return
+                except Exception as retry_e:
+                    logger.error(f"Error scheduling retry for {pod.k8_name}. e: {repr(retry_e)}")
+            self.dead_letter_cmd(pod, cmd, attempt, repr(e))
             return
 
         # If we get to this point we can update pod status
@@ -112,4 +267,5 @@ def main():
     logger.critical("spawner could not connect to rabbitMQ. Shutting down!")
 
 if __name__ == '__main__':
+    trace_log_handlers()
     main()
@@ -9,8 +9,13 @@ from enum import Enum
 from psycopg2.errors import UniqueViolation, DatabaseError
 
 import re
+import copy
+import contextvars
 import json
 import os
+import time
+import timeit
+import threading
 import urllib.parse
 
 import pprint
@@ -21,7 +26,113 @@ from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
 from sqlmodel import create_engine, Session, select
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
+
+
+# Counts PostgresStore.run() calls made inside count_queries(). Pool metrics count every query in
+# the process, this only counts the caller's, e.g. one health tick and not ttl or deletion threads.
+QUERY_COUNTER = contextvars.ContextVar("query_counter", default=None)
+
+class QueryCounter():
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def inc(self):
+        with self.lock:
+            self.count += 1
+
+@contextmanager
+def count_queries():
+    """Yields a QueryCounter counting queries run in this context. Threads need a copy of it, contextvars.copy_context()."""
+    counter = QueryCounter()
+    token = QUERY_COUNTER.set(counter)
+    try:
+        yield counter
+    finally:
+        QUERY_COUNTER.reset(token)
+
+
+class PoolMetrics():
+    """
+    Connection pool instrumentation for a PostgresStore engine using SQLAlchemy pool events.
+    Tracks checkout wait time, how long connections are held, connection age at checkout,
+    and pool exhaustion. Times are in ms, ages in seconds.
+    """
+    def __init__(self, pool_size: int, max_overflow: int):
+        self.lock = threading.Lock()
+        self.pool_limit = pool_size + max_overflow if max_overflow >= 0 else None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.queries = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.held_ms_total = 0.0
+        self.held_ms_max = 0.0
+        self.conn_age_max = 0.0
+
+    def attach(self, engine):
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        connection_record.info['created_at'] = time.time()
+        with self.lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        now = time.time()
+        connection_record.info['checked_out_at'] = timeit.default_timer()
+        age = now - connection_record.info.get('created_at', now)
+        pool = connection_proxy._pool
+        with self.lock:
+            self.checkouts += 1
+            self.conn_age_max = max(self.conn_age_max, age)
+            # Last connection the pool can hand out, next checkout will wait.
+            if self.pool_limit and pool.checkedout() >= self.pool_limit:
+                self.exhausted += 1
+                logger.warning(f"Postgres pool exhausted. status: {pool.status()}")
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        with self.lock:
+            self.checkins += 1
+            if checked_out_at is not None:
+                held_ms = (timeit.default_timer() - checked_out_at) * 1000
+                self.held_ms_total += held_ms
+                self.held_ms_max = max(self.held_ms_max, held_ms)
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        # Called once per PostgresStore.run(), so also counts queries.
+        with self.lock:
+            self.queries += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self.lock:
+            checkouts = self.checkouts or 1
+            checkins = self.checkins or 1
+            return {"connects": self.connects,
+                    "checkouts": self.checkouts,
+                    "checkins": self.checkins,
+                    "exhausted": self.exhausted,
+                    "timeouts": self.timeouts,
+                    "queries": self.queries,
+                    "wait_ms_avg": self.wait_ms_total / checkouts,
+                    "wait_ms_max": self.wait_ms_max,
+                    "held_ms_avg": self.held_ms_total / checkins,
+                    "held_ms_max": self.held_ms_max,
+                    "conn_age_max_s": self.conn_age_max}
 
 class PostgresStore():
     """
@@ -35,6 +146,12 @@ class PostgresStore():
                  dbname: str | None = None,
                  dbschema: str | None = None,
                  port: int | None = None, # not currently used
+                 pool_size: int = 5,
+                 max_overflow: int = 10,
+                 pool_recycle: int = -1,
+                 pool_timeout: int = 30,
+                 pool_pre_ping: bool = True,
+                 application_name: str | None = None,
                  kwargs: dict[str, str] = {}):
         
         logger.info(f"Top of PostgresStore.__init__().")
@@ -53,15 +170,90 @@ class PostgresStore():
         conninfo = f"postgresql://{username}:{password}@{host}"
         if dbname:
             conninfo += f"/{dbname}"
-        if dbschema:
-            conninfo += f"?options=-csearch_path%3Ddbo,{dbschema}"
         logger.info(f"Using conninfo: {conninfo}, with kwargs: {kwargs}")
 
         # We create SQLAlchemy objects using future=True to get ready for SA:2.0 (we follow that style)
-        self.engine = create_engine(conninfo, future=True)
+        # One engine (and so one connection pool) per database. Tenant schemas share it, see with_schema().
+        self.dbname = dbname
+        self.dbschema = None
+        self.engine = create_engine(conninfo,
+                                    future=True,
+                                    pool_size=pool_size,
+                                    max_overflow=max_overflow,
+                                    pool_recycle=pool_recycle,
+                                    pool_timeout=pool_timeout,
+                                    pool_pre_ping=pool_pre_ping,
+                                    # Shows up in pg_stat_activity, and as the actor in pod_status_events.
+                                    connect_args={"application_name": application_name} if application_name else {})
+        self.metrics = PoolMetrics(pool_size=pool_size, max_overflow=max_overflow)
+        self.metrics.attach(self.engine)
         # expire_on_commit is more of a opinion than something bad according to docs.
         # I believe it's good to keep information. Session.begin flushes.
         self.session = sessionmaker(self.engine, future=True, expire_on_commit=False)
+        if dbschema:
+            self._route_to_schema(dbschema)
+
+    def _route_to_schema(self, dbschema: str):
+        """
+        Routes unqualified tables to dbschema using schema_translate_map. The resulting
+        engine proxies the original, so the connection pool is shared.
+        """
+        self.dbschema = dbschema
+        self.engine = self.engine.execution_options(schema_translate_map={None: dbschema})
+        self.session = sessionmaker(self.engine, future=True, expire_on_commit=False)
+
+    def with_schema(self, dbschema: str):
+        """
+        Returns a new PostgresStore for dbschema that shares this store's engine and pool.
+        Used to get tenant stores from a site store without a pool per tenant.
+        """
+        store = copy.copy(self)
+        store._route_to_schema(dbschema)
+        return store
+
+    def pool_stats(self):
+        """
+        Returns current connection pool stats and PoolMetrics for this store's engine.
+        Shared by all stores created with with_schema().
+        """
+        pool = self.engine.pool
+        return {"dbname": self.dbname,
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "status": pool.status(),
+                **self.metrics.snapshot()}
+
+    def begin(self, session, autocommit: bool = False):
+        """Check out session's connection, timing the pool wait."""
+        # Get connection first so we can time the wait on the pool.
+        wait_start = timeit.default_timer()
+        try:
+            if autocommit:
+                session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            else:
+                session.connection()
+        except PoolTimeoutError as e:
+            self.metrics.record_wait((timeit.default_timer() - wait_start) * 1000, timed_out=True)
+            msg = f"Timed out waiting for postgres connection. pool: {self.engine.pool.status()}. e: {repr(e)}"
+            logger.error(msg)
+            e.args = [msg]
+            raise e
+        self.metrics.record_wait((timeit.default_timer() - wait_start) * 1000)
+        counter = QUERY_COUNTER.get()
+        if counter:
+            counter.inc()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Session for several statements in one transaction, e.g. a SELECT ... FOR UPDATE and the write
+        it guards. Commits on exit, rolls back if the block raises.
+        """
+        with self.session.begin() as session:
+            self.begin(session)
+            yield session
 
     @validate_arguments
     def run(self,
@@ -76,8 +268,7 @@ class PostgresStore():
             autocommit: bool = False):
 
         with self.session.begin() as session:
-            if autocommit:
-                session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            self.begin(session, autocommit=autocommit)
             try:
                 # Following line creates a lot of logs.
                 #logger.info(f"PostgresStore.fn; Command: {fn_name} - Statement/Instance: {fn_input}")
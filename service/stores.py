@@ -1,22 +1,66 @@
 import os
 import time
+import timeit
+import threading
 import subprocess
+from collections.abc import Mapping
 from store import PostgresStore
 from __init__ import t
 from tapisservice.config import conf
 from tapisservice.logs import get_logger
 logger = get_logger(__name__)
 
-# Get all sites and tenants for all sites.
-SITE_TENANT_DICT = {} # {site_id1: [tenant1, tenant2, ...], site_id2: ...}
-for tenant in t.tenant_cache.tenants.values():
-    if not SITE_TENANT_DICT.get(tenant.site_id):
-        SITE_TENANT_DICT[tenant.site_id] = []
-    SITE_TENANT_DICT[tenant.site_id].append(tenant.tenant_id)
-curr_tenant_obj = t.tenant_cache.get_tenant_config(tenant_id=t.tenant_id)
-# Delete excess sites when current site is not primary. Non-primary sites will never have to manage other sites.
-if not curr_tenant_obj.site.primary:
-    SITE_TENANT_DICT = {curr_tenant_obj.site: SITE_TENANT_DICT[curr_tenant_obj.site]}
+_import_start = timeit.default_timer()
+
+
+class LazyMapping(Mapping):
+    """
+    Read-only mapping that calls loader() to get its data on first access.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._loader()
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data)
+
+
+def get_site_tenant_dict():
+    """
+    Get all sites and tenants for all sites. {site_id1: [tenant1, tenant2, ...], site_id2: ...}
+    """
+    site_tenant_dict = {}
+    for tenant in t.tenant_cache.tenants.values():
+        if not site_tenant_dict.get(tenant.site_id):
+            site_tenant_dict[tenant.site_id] = []
+        site_tenant_dict[tenant.site_id].append(tenant.tenant_id)
+    curr_tenant_obj = t.tenant_cache.get_tenant_config(tenant_id=t.tenant_id)
+    # Delete excess sites when current site is not primary. Non-primary sites will never have to manage other sites.
+    if not curr_tenant_obj.site.primary:
+        site_id = curr_tenant_obj.site.site_id
+        site_tenant_dict = {site_id: site_tenant_dict[site_id]}
+    return site_tenant_dict
+
+# Built from the tenant cache on first access, not at import.
+SITE_TENANT_DICT = LazyMapping(get_site_tenant_dict)
 
 
 def get_site_rabbitmq_uri(site):
@@ -173,38 +217,132 @@ def role_init():
     #     t.sk.grantRole(tenant=tenant, roleName='abaco_admin', user='streams', _tapis_set_x_headers_from_service=True)
 
 
-def create_pg_objects():
-    admin_postgres_user = conf.postgres_user
-    admin_postgres_pass = conf.postgres_pass
+# Which process this is (api, spawner, health). Set in deployment. Used for per component config.
+COMPONENT = os.environ.get('PODS_COMPONENT', 'api')
+
+
+def get_pg_pool_kwargs(component: str = COMPONENT):
+    """
+    Connection pool settings from config for PostgresStore. Global postgres_pool_* keys
+    are overwritten by the component's object, e.g. "spawner_postgres_pool": {"pool_size": 10}.
+    """
+    pool_kwargs = {"pool_size": conf.get("postgres_pool_size", 5),
+                   "max_overflow": conf.get("postgres_max_overflow", 10),
+                   "pool_recycle": conf.get("postgres_pool_recycle", -1),
+                   "pool_timeout": conf.get("postgres_pool_timeout", 30),
+                   "pool_pre_ping": conf.get("postgres_pool_pre_ping", True)}
+    component_pool_object = conf.get(f"{component}_postgres_pool") or {}
+    pool_kwargs.update(component_pool_object)
+    logger.info(f"Using postgres pool settings for component: {component}; {pool_kwargs}")
+    return pool_kwargs
+
 
+def create_pg_default():
     # Create default pg object to use later (creating dbs, etc)
-    pg_default = PostgresStore(username=admin_postgres_user,
-                               password=admin_postgres_pass,
-                               host=conf.postgres_host,
-                               dbname="postgres")
-
-    pg_store = {}
-    # Now add in all of the sites and tenant pg engines.
-    for site, tenants in SITE_TENANT_DICT.items():
-        for tenant in tenants:
-            pg = PostgresStore(username=admin_postgres_user,
-                               password=admin_postgres_pass,
-                               host=conf.postgres_host,
-                               dbname=site,
-                               dbschema=tenant)
-            if not pg_store.get(site):
-                pg_store[site] = {}
-            pg_store[site][tenant] = pg
-    return pg_store, pg_default
-
-# We do this outside of a function because the 'store' objects need to be imported
-# by other scripts. Functionalizing it would create more code and make it harder
-# to read in my opinion.
-try:
-    pg_store, pg_default = create_pg_objects()
-except Exception as e:
-    logger.critical(e)
-    raise
+    return PostgresStore(username=conf.postgres_user,
+                         password=conf.postgres_pass,
+                         host=conf.postgres_host,
+                         dbname="postgres")
+
+
+class SiteStores(Mapping):
+    """
+    tenant_id -> PostgresStore for one site. The site's engine/pool is created on first
+    access to any tenant; tenants share it and are routed to their schema with schema_translate_map.
+    """
+    def __init__(self, site: str):
+        self.site = site
+        self.site_pg = None
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get_site_pg(self):
+        if self.site_pg is None:
+            with self._lock:
+                if self.site_pg is None:
+                    start = timeit.default_timer()
+                    self.site_pg = PostgresStore(username=conf.postgres_user,
+                                                 password=conf.postgres_pass,
+                                                 host=conf.postgres_host,
+                                                 dbname=self.site,
+                                                 application_name=COMPONENT,
+                                                 **get_pg_pool_kwargs())
+                    total = (timeit.default_timer() - start) * 1000
+                    logger.info(f"Created postgres engine for site: {self.site} in {total:.1f} ms.")
+        return self.site_pg
+
+    def __getitem__(self, tenant):
+        store = self._stores.get(tenant)
+        if store is None:
+            if tenant not in SITE_TENANT_DICT[self.site]:
+                raise KeyError(tenant)
+            site_pg = self.get_site_pg()
+            with self._lock:
+                store = self._stores.setdefault(tenant, site_pg.with_schema(tenant))
+        return store
+
+    def __iter__(self):
+        return iter(SITE_TENANT_DICT[self.site])
+
+    def __len__(self):
+        return len(SITE_TENANT_DICT[self.site])
+
+
+def create_pg_objects():
+    """
+    Returns {site_id: SiteStores} for all sites in SITE_TENANT_DICT. Engines are created on first use.
+    """
+    return {site: SiteStores(site) for site in SITE_TENANT_DICT.keys()}
+
+
+def get_pg_pool_stats():
+    """
+    Returns connection pool stats for each site engine that has been created. {site_id: {size, checked_out, ...}, ...}
+    """
+    return {site: site_stores.site_pg.pool_stats() for site, site_stores in pg_store.items() if site_stores.site_pg}
+
+
+def warm_pg_stores(background: bool = True):
+    """
+    Creates every site engine and checks out a connection per site so first requests don't pay for it.
+    Runs in a daemon thread when background is True.
+    """
+    def _warm():
+        start = timeit.default_timer()
+        for site, site_stores in pg_store.items():
+            try:
+                with site_stores.get_site_pg().engine.connect():
+                    pass
+                for tenant in site_stores:
+                    site_stores[tenant]
+            except Exception as e:
+                logger.warning(f"Error warming postgres stores for site: {site}. e: {repr(e)}")
+        total = (timeit.default_timer() - start) * 1000
+        logger.info(f"Warmed postgres stores for sites: {list(pg_store.keys())} in {total:.1f} ms.")
+
+    if background:
+        threading.Thread(target=_warm, name="pg-store-warmup", daemon=True).start()
+    else:
+        _warm()
+
+
+# pg_store is {site_id: {tenant_id: PostgresStore}}. Lazy, so importing stores doesn't hit
+# the tenant cache or create engines. pg_default is created on first `stores.pg_default` access.
+pg_store = LazyMapping(create_pg_objects)
+_pg_default = None
+
+def __getattr__(name):
+    global _pg_default
+    if name == "pg_default":
+        if _pg_default is None:
+            _pg_default = create_pg_default()
+        return _pg_default
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if conf.get("postgres_warm_up", False):
+    warm_pg_stores(background=True)
+
+logger.info(f"stores import took {(timeit.default_timer() - _import_start) * 1000:.1f} ms.")
 
 
 if __name__ == "__main__":
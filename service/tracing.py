@@ -0,0 +1,198 @@
+"""
+Correlation ids and spans for following a request across api -> command channel -> spawner -> k8 -> health.
+Trace context follows W3C traceparent, so it's carried in http headers, command message headers, and
+k8 pod annotations the same way. Service log lines get " [trace_id=...]", see trace_log_handlers().
+Finished spans are exported as OTLP/JSON to tracing_otlp_endpoint (a collector's http receiver) and/or
+appended to tracing_export_path as one ExportTraceServiceRequest per line (collector otlpjsonfile format).
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+# k8 annotation holding the traceparent of the spawner span that created the object.
+TRACEPARENT_ANNOTATION = "pods.tapis.io/traceparent"
+
+# (trace_id, span_id) of the current span.
+TRACE_CONTEXT = contextvars.ContextVar("trace_context", default=None)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_PRODUCER = 4
+SPAN_KIND_CONSUMER = 5
+
+
+def parse_traceparent(traceparent):
+    """Returns (trace_id, span_id) from a traceparent header value, or None if it's missing or invalid."""
+    if isinstance(traceparent, bytes):
+        traceparent = traceparent.decode('utf-8')
+    try:
+        version, trace_id, span_id, flags = traceparent.strip().split("-")
+        int(trace_id, 16), int(span_id, 16)
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16:
+        return None
+    return trace_id, span_id
+
+
+def current_trace_id():
+    ctx = TRACE_CONTEXT.get()
+    return ctx[0] if ctx else None
+
+
+def current_traceparent():
+    """traceparent for the current span, to pass on to the next hop. None outside of a span."""
+    ctx = TRACE_CONTEXT.get()
+    return f"00-{ctx[0]}-{ctx[1]}-01" if ctx else None
+
+
+class Span():
+    def __init__(self, name: str, trace_id: str, parent_span_id: str | None, kind: int, attributes: dict, start_ns: int | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        attributes = [{"key": key, "value": {"stringValue": str(val)}} for key, val in self.attributes.items()]
+        status = {"code": 2, "message": self.error} if self.error else {"code": 1}
+        return {"traceId": self.trace_id,
+                "spanId": self.span_id,
+                "parentSpanId": self.parent_span_id or "",
+                "name": self.name,
+                "kind": self.kind,
+                "startTimeUnixNano": str(self.start_ns),
+                "endTimeUnixNano": str(self.end_ns),
+                "attributes": attributes,
+                "status": status}
+
+
+@contextmanager
+def span(name: str, traceparent: str | None = None, kind: int = SPAN_KIND_INTERNAL, attributes: dict | None = None, start_ns: int | None = None):
+    """
+    Run the block in a span. Parent is traceparent if given, else the current span. A new trace is
+    started if there's neither. start_ns backdates the span, e.g. to when a message was published.
+    """
+    parent = parse_traceparent(traceparent) if traceparent else TRACE_CONTEXT.get()
+    if parent:
+        trace_id, parent_span_id = parent
+    else:
+        trace_id, parent_span_id = secrets.token_hex(16), None
+    new_span = Span(name, trace_id, parent_span_id, kind, attributes or {}, start_ns=start_ns)
+    token = TRACE_CONTEXT.set((new_span.trace_id, new_span.span_id))
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.error = repr(e)
+        raise
+    finally:
+        new_span.end_ns = time.time_ns()
+        TRACE_CONTEXT.reset(token)
+        SPAN_EXPORTER.export(new_span)
+
+
+class SpanExporter():
+    """Batches finished spans on a background thread. Does nothing if no export target is configured."""
+    def __init__(self, endpoint: str | None = None, path: str | None = None, batch_size: int = 100, interval: float = 5):
+        self.endpoint = endpoint
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.service_name = f"pods-{os.environ.get('PODS_COMPONENT', 'api')}"
+
+    @property
+    def enabled(self):
+        return bool(self.endpoint or self.path)
+
+    def export(self, finished_span: Span):
+        if not self.enabled:
+            return
+        self.start()
+        try:
+            self.queue.put_nowait(finished_span)
+        except queue.Full:
+            logger.debug(f"Span export queue full, dropping span: {finished_span.name}")
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, name="span-exporter", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "pods"}, "spans": [s.to_otlp() for s in batch]}]}]}
+        if self.path:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(request) + "\n")
+            except Exception as e:
+                logger.error(f"Error writing spans to {self.path}. e: {repr(e)}")
+        if self.endpoint:
+            try:
+                requests.post(f"{self.endpoint.rstrip('/')}/v1/traces", json=request, timeout=5)
+            except Exception as e:
+                logger.error(f"Error exporting spans to {self.endpoint}. e: {repr(e)}")
+
+
+SPAN_EXPORTER = SpanExporter(endpoint=conf.get("tracing_otlp_endpoint", None),
+                             path=conf.get("tracing_export_path", None))
+
+
+class TraceIdFilter(logging.Filter):
+    """Sets record.trace_id to the current span's trace_id, "-" outside of spans."""
+    def filter(self, record):
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+def trace_log_handlers():
+    """
+    Adds TraceIdFilter and a trailing [trace_id=%(trace_id)s] to the handlers of the service's loggers.
+    Call once the service's modules are imported, get_logger() creates their handlers at import.
+    """
+    loggers = [logging.getLogger()] + [log for log in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(log, logging.Logger)]
+    for log in loggers:
+        for handler in log.handlers:
+            if any(isinstance(f, TraceIdFilter) for f in handler.filters):
+                continue
+            formatter = handler.formatter or logging.Formatter()
+            handler.setFormatter(logging.Formatter(f"{formatter._fmt} [trace_id=%(trace_id)s]", formatter.datefmt))
+            handler.addFilter(TraceIdFilter())
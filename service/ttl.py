@@ -0,0 +1,117 @@
+"""
+TTL scheduler for pods. Keeps a min-heap of upcoming time_to_stop_ts expirations and sleeps
+until the next one is due, then sets status_requested = OFF for all due pods in batched
+updates per tenant. Health fills the heap from its sweeps, so pods with long TTLs cost
+nothing between expirations.
+"""
+import heapq
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+from codes import ON, OFF
+from models import Pod
+from stores import pg_store
+from tapisservice.config import conf
+from tapisservice.logs import get_logger
+logger = get_logger(__name__)
+
+
+class TTLScheduler():
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        # Heap of (time_to_stop_ts, site_id, tenant_id, pod_id). Entries are invalidated lazily, an
+        # entry is only live while self.scheduled[(site_id, tenant_id, pod_id)] matches its ts.
+        self.heap = []
+        self.scheduled = {}
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def schedule(self, pod):
+        """Schedule or reschedule pod. Pods not ON or without time_to_stop_ts are unscheduled."""
+        key = (pod.site_id, pod.tenant_id, pod.pod_id)
+        with self.cond:
+            if pod.status_requested != ON or not pod.time_to_stop_ts:
+                self.scheduled.pop(key, None)
+                return
+            if self.scheduled.get(key) == pod.time_to_stop_ts:
+                return
+            self.scheduled[key] = pod.time_to_stop_ts
+            heapq.heappush(self.heap, (pod.time_to_stop_ts, *key))
+            # Wake the scheduler in case this is now the earliest expiration.
+            if self.heap[0][0] == pod.time_to_stop_ts:
+                self.cond.notify()
+
+    def sync(self, pods):
+        """Schedule all pods, unschedule anything that's no longer in pods. Called with each health sweep."""
+        keys = set()
+        for pod in pods:
+            keys.add((pod.site_id, pod.tenant_id, pod.pod_id))
+            self.schedule(pod)
+        with self.cond:
+            for key in list(self.scheduled.keys() - keys):
+                del self.scheduled[key]
+
+    def next_expiration(self):
+        with self.cond:
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self):
+        """Blocks until at least one scheduled pod is due. Returns up to batch_size due keys."""
+        with self.cond:
+            while True:
+                # Drop invalidated entries from the top of the heap.
+                while self.heap and self.scheduled.get(self.heap[0][1:]) != self.heap[0][0]:
+                    heapq.heappop(self.heap)
+                if self.heap:
+                    wait_s = (self.heap[0][0] - datetime.utcnow()).total_seconds()
+                    if wait_s <= 0:
+                        break
+                    self.cond.wait(timeout=wait_s)
+                else:
+                    self.cond.wait()
+            now = datetime.utcnow()
+            due = []
+            while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+                ts, *key = heapq.heappop(self.heap)
+                key = tuple(key)
+                if self.scheduled.get(key) == ts:
+                    del self.scheduled[key]
+                    due.append(key)
+            return due
+
+    def expire(self, due):
+        """Set status_requested = OFF for due pods, one update per tenant."""
+        tenant_pods = {}
+        for site_id, tenant_id, pod_id in due:
+            tenant_pods.setdefault((site_id, tenant_id), []).append(pod_id)
+
+        now = datetime.utcnow()
+        for (site_id, tenant_id), pod_ids in tenant_pods.items():
+            # Conditions make this safe against pods that were restarted or stopped since scheduling.
+            stmt = (update(Pod)
+                    .where(Pod.pod_id.in_(pod_ids),
+                           Pod.status_requested == ON,
+                           Pod.time_to_stop_ts <= now)
+                    .values(status_requested=OFF)
+                    .execution_options(synchronize_session=False))
+            try:
+                pg_store[site_id][tenant_id].run("execute", stmt)
+                logger.info(f"time_to_stop trigger passed, set status_requested = OFF for {len(pod_ids)} pods "
+                            f"in {site_id}.{tenant_id}: {pod_ids}")
+            except Exception as e:
+                logger.error(f"Error expiring pods in {site_id}.{tenant_id}: {pod_ids}. e: {repr(e)}")
+
+    def run(self):
+        logger.info("Top of TTLScheduler.run().")
+        while True:
+            due = self.pop_due()
+            if due:
+                self.expire(due)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="ttl-scheduler", daemon=True)
+        self.thread.start()
+
+
+TTL_SCHEDULER = TTLScheduler(batch_size=conf.get("health_ttl_batch_size", 500))
@@ -0,0 +1,85 @@
+"""
+Benchmark for the Pod.permissions lookup used by GET /pods (Pod.db_get_all_with_permission).
+
+Creates a scratch copy of the permissions column in its own schema, fills it with
+`num_pods` rows server side with generate_series, then times the `&&` overlap
+query with a sequential scan and with the ix_pod_permissions_gin style index.
+The scratch schema is dropped afterwards, so real tenant tables are never touched.
+
+Run inside the pods-api container:
+    python tests/benchmarks/permissions_benchmark.py --num-pods 100000
+"""
+import argparse
+import sys
+import timeit
+sys.path.append('/home/tapis/service')
+
+from sqlalchemy import text
+from tapisservice.config import conf
+from stores import pg_store
+
+
+BENCH_SCHEMA = "pods_bench"
+
+
+def time_query(conn, stmt, params, runs):
+    """Returns the best wall time in ms over `runs` executions of stmt."""
+    best = None
+    for _ in range(runs):
+        start = timeit.default_timer()
+        conn.execute(stmt, params).fetchall()
+        total = (timeit.default_timer() - start) * 1000
+        best = total if best is None else min(best, total)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-pods", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=5000, help="Distinct users permissions are spread over.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--site", default=conf.site_id)
+    args = parser.parse_args()
+
+    tenant = next(iter(pg_store[args.site]))
+    engine = pg_store[args.site][tenant].engine
+    # Same shape as Pod.db_get_all_with_permission with level=READ.
+    stmt = text(f'SELECT pod_id FROM "{BENCH_SCHEMA}".pod WHERE permissions && CAST(:perms AS VARCHAR[])')
+    user = "benchuser42"
+    params = {"perms": [f"{user}:READ", f"{user}:USER", f"{user}:ADMIN"]}
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA "{BENCH_SCHEMA}"'))
+        try:
+            conn.execute(text(f'CREATE TABLE "{BENCH_SCHEMA}".pod (pod_id VARCHAR PRIMARY KEY, permissions VARCHAR[])'))
+            # Every pod has an ADMIN owner plus a READ grant, spread over `users` distinct users.
+            conn.execute(text(
+                f'INSERT INTO "{BENCH_SCHEMA}".pod (pod_id, permissions) '
+                f"SELECT 'pod' || i, ARRAY['benchuser' || (i % :users) || ':ADMIN', "
+                f"'benchuser' || ((i * 7) % :users) || ':READ']::VARCHAR[] "
+                f'FROM generate_series(1, :num_pods) AS i'),
+                {"users": args.users, "num_pods": args.num_pods})
+            conn.execute(text(f'ANALYZE "{BENCH_SCHEMA}".pod'))
+
+            seq_ms = time_query(conn, stmt, params, args.runs)
+            matches = len(conn.execute(stmt, params).fetchall())
+
+            conn.execute(text(f'CREATE INDEX ix_bench_pod_permissions_gin ON "{BENCH_SCHEMA}".pod USING gin (permissions)'))
+            conn.execute(text(f'ANALYZE "{BENCH_SCHEMA}".pod'))
+            gin_ms = time_query(conn, stmt, params, args.runs)
+            plan = conn.execute(text(f"EXPLAIN {stmt.text}"), params).fetchall()
+        finally:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE'))
+
+    print(f"pods: {args.num_pods}; users: {args.users}; matching rows: {matches}")
+    print(f"seq scan:  {seq_ms:.2f} ms (best of {args.runs})")
+    print(f"gin index: {gin_ms:.2f} ms (best of {args.runs})")
+    print("plan with index:")
+    for row in plan:
+        print(f"  {row[0]}")
+
+
+if __name__ == "__main__":
+    main()
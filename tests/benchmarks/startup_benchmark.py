@@ -0,0 +1,58 @@
+"""
+Cold start benchmark for the pods service modules.
+
+Each run imports the given modules in a fresh interpreter and reports the import time,
+then the time for the first pg_store lookup (site engine + tenant store creation) and
+the first query on it. Import time should no longer include tenant cache or engine creation.
+
+Run inside the pods-api container:
+    python tests/benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+
+PROBE = """
+import json, sys, timeit
+sys.path.append('/home/tapis/service')
+start = timeit.default_timer()
+for module in {modules!r}:
+    __import__(module)
+import_ms = (timeit.default_timer() - start) * 1000
+
+from sqlalchemy import text
+from tapisservice.config import conf
+from stores import pg_store
+start = timeit.default_timer()
+tenant = next(iter(pg_store[conf.site_id]))
+store = pg_store[conf.site_id][tenant]
+first_store_ms = (timeit.default_timer() - start) * 1000
+start = timeit.default_timer()
+store.run("execute", text("SELECT 1"), scalar_one=True)
+first_query_ms = (timeit.default_timer() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "first_store_ms": first_store_ms, "first_query_ms": first_query_ms}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=["stores", "models", "api"])
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(modules=args.modules)],
+                             capture_output=True, text=True, check=True, cwd="/home/tapis/service")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"modules: {args.modules}; runs: {args.runs}")
+    for key in ["import_ms", "first_store_ms", "first_query_ms"]:
+        values = sorted(r[key] for r in results)
+        print(f"{key:>15}: min {values[0]:.1f} ms; median {values[len(values) // 2]:.1f} ms; max {values[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
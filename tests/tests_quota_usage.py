@@ -0,0 +1,79 @@
+import sys
+
+import pytest
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+from sqlalchemy import insert, update, delete, select, text
+from models import Pod, PodUsage
+from stores import pg_store
+from tapisservice.config import conf
+
+from utils import testuser_tenant
+
+# Initial pod_usage fill of migration 9d3c6f1a8e54, as a select.
+USAGE_BACKFILL = """
+    SELECT CASE WHEN GROUPING(creator) = 1 THEN '*' ELSE creator END,
+           count(*) FILTER (WHERE status_requested IN ('ON', 'RESTART')),
+           COALESCE(sum((resources->>'cpu_limit')::bigint) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+           COALESCE(sum(pod_quota_bytes(resources->>'mem_limit')) FILTER (WHERE status_requested IN ('ON', 'RESTART')), 0),
+           COALESCE(sum(pod_quota_bytes(resources->>'pvc_storage')), 0)
+    FROM pod
+    GROUP BY GROUPING SETS ((creator), ())
+    HAVING GROUPING(creator) = 1 OR creator IS NOT NULL;
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+@pytest.fixture
+def session():
+    """Session in a transaction that's rolled back after the test, nothing it writes is kept."""
+    store = pg_store[conf.site_id][testuser_tenant]
+    try:
+        with store.transaction() as session:
+            yield session
+            raise Rollback()
+    except Rollback:
+        pass
+
+def counted(session):
+    rows = session.execute(select(PodUsage)).scalars().all()
+    return {row.username: (row.running_pods, row.cpu, row.memory, row.pvc_storage) for row in rows
+            if any([row.running_pods, row.cpu, row.memory, row.pvc_storage])}
+
+def backfilled(session):
+    return {row[0]: tuple(row[1:]) for row in session.execute(text(USAGE_BACKFILL)) if any(row[1:])}
+
+def add_pod(session, pod_id, creator, status_requested, **resources):
+    session.execute(insert(Pod).values(pod_id=pod_id, pod_template="template/postgres", creator=creator,
+                                       status_requested=status_requested, tenant_id=testuser_tenant,
+                                       site_id=conf.site_id, k8_name=f"pods-{conf.site_id}-{testuser_tenant}-{pod_id}",
+                                       resources={"mem_request": "1G", "cpu_request": "500", **resources}))
+
+
+def test_trigger_counts_match_backfill(session):
+    assert counted(session) == backfilled(session)
+    before = counted(session).get("quotausageuser", (0, 0, 0, 0))
+
+    add_pod(session, "quotausagetest1", "quotausageuser", "ON", mem_limit="2Gi", cpu_limit="1000")
+    add_pod(session, "quotausagetest2", "quotausageuser", "OFF", mem_limit="4G", cpu_limit="2000", pvc_storage="10Gi")
+    add_pod(session, "quotausagetest3", "quotausageother", "RESTART", mem_limit="129e6", cpu_limit="250")
+    assert counted(session)["quotausageuser"] == (before[0] + 1, before[1] + 1000,
+                                                  before[2] + 2 * 1024 ** 3, before[3] + 10 * 1024 ** 3)
+
+    session.execute(update(Pod).where(Pod.pod_id == "quotausagetest1").values(status_requested="OFF"))
+    session.execute(update(Pod).where(Pod.pod_id == "quotausagetest2").values(status_requested="ON"))
+    session.execute(update(Pod).where(Pod.pod_id == "quotausagetest3")
+                    .values(resources={"mem_request": "1G", "cpu_request": "500", "mem_limit": "1G", "cpu_limit": "500"}))
+    session.execute(delete(Pod).where(Pod.pod_id == "quotausagetest2"))
+    assert counted(session).get("quotausageuser", (0, 0, 0, 0)) == before
+    assert counted(session) == backfilled(session)
+
+def test_lock_usage_creates_missing_rows(session):
+    usage = PodUsage.db_lock_usage(session, ["quotausagenew", "*"])
+    assert set(usage) == {"*", "quotausagenew"}
+    assert usage["quotausagenew"].running_pods == 0
@@ -0,0 +1,127 @@
+import sys
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+import quotas
+from errors import ResourceError
+from quotas import TENANT_USAGE, check_quota, admit_pod, pod_claim
+
+
+QUOTA_CONF = {"tenant_quotas": {"default": {"max_running_pods": 10, "max_memory": "64G"},
+                                "small": {"max_running_pods": 1}},
+              "user_quotas": {"default": {"max_cpu": "4000"},
+                              "tacc.big": {"max_cpu": "16000", "max_pvc_storage": "100Gi"}}}
+
+
+def make_pod(creator="testuser", tenant_id="tacc", **resources):
+    return SimpleNamespace(pod_id="quotatest", site_id="tacc", tenant_id=tenant_id, creator=creator,
+                           resources={"mem_limit": "4G", "cpu_limit": "1000", **resources})
+
+def usage(running_pods=0, cpu=0, memory=0, pvc_storage=0):
+    return SimpleNamespace(running_pods=running_pods, cpu=cpu, memory=memory, pvc_storage=pvc_storage)
+
+
+@pytest.fixture(autouse=True)
+def quota_conf(monkeypatch):
+    monkeypatch.setattr(quotas, "conf", QUOTA_CONF)
+
+
+def test_pod_claim():
+    pod = make_pod(pvc_storage="10Gi")
+    assert pod_claim(pod) == {"running_pods": 0, "cpu": 0, "memory": 0, "pvc_storage": 0}
+    assert pod_claim(pod, running=True) == {"running_pods": 1, "cpu": 1000, "memory": 4 * 1000 ** 3, "pvc_storage": 0}
+    assert pod_claim(pod, storage=True)["pvc_storage"] == 10 * 1024 ** 3
+
+def test_within_quota():
+    check_quota(make_pod(), running=True, usage={TENANT_USAGE: usage(running_pods=9), "testuser": usage(cpu=3000)})
+
+def test_no_usage_rows_yet():
+    check_quota(make_pod(), running=True, usage={})
+
+def test_tenant_over_quota():
+    with pytest.raises(ResourceError, match="tenant tacc over its max_running_pods"):
+        check_quota(make_pod(), running=True, usage={TENANT_USAGE: usage(running_pods=10)})
+
+def test_user_over_quota():
+    with pytest.raises(ResourceError, match="user testuser over its max_cpu"):
+        check_quota(make_pod(), running=True, usage={"testuser": usage(cpu=3500)})
+
+def test_memory_quota_parses_quantities():
+    with pytest.raises(ResourceError, match="max_memory"):
+        check_quota(make_pod(mem_limit="4Gi"), running=True, usage={TENANT_USAGE: usage(memory=60 * 1000 ** 3)})
+
+def test_most_specific_quota_wins():
+    check_quota(make_pod(creator="big"), running=True, usage={"big": usage(cpu=8000)})
+    with pytest.raises(ResourceError, match="max_running_pods"):
+        check_quota(make_pod(tenant_id="small"), running=True, usage={TENANT_USAGE: usage(running_pods=1)})
+
+def test_storage_only_counted_for_new_pods():
+    pod = make_pod(creator="big", pvc_storage="50Gi")
+    full = {"big": usage(pvc_storage=60 * 1024 ** 3)}
+    check_quota(pod, running=False, usage=full)
+    with pytest.raises(ResourceError, match="max_pvc_storage"):
+        check_quota(pod, storage=True, usage=full)
+
+def test_no_quota_skips_usage_read(monkeypatch):
+    monkeypatch.setattr(quotas, "conf", {})
+    monkeypatch.setattr(quotas.PodUsage, "db_get_usage", lambda *args, **kwargs: pytest.fail("usage read"))
+    check_quota(make_pod(), running=True, storage=True)
+
+
+class FakeSession():
+    def __init__(self):
+        self.written = []
+
+    def add(self, pod):
+        self.written.append(("add", pod))
+
+    def merge(self, pod):
+        self.written.append(("merge", pod))
+
+
+class FakeStore():
+    def __init__(self):
+        self.session = FakeSession()
+        self.committed = False
+
+    @contextmanager
+    def transaction(self):
+        yield self.session
+        self.committed = True
+
+
+def admit(monkeypatch, pod, store, locked_usage, write="add"):
+    """admit_pod with store's session and locked_usage as the locked rows. Returns the usernames locked."""
+    pod.get_site_tenant_session = lambda obj: (pod.site_id, pod.tenant_id, store)
+    locked = []
+    def db_lock_usage(session, usernames):
+        locked.append(usernames)
+        return locked_usage
+    monkeypatch.setattr(quotas.PodUsage, "db_lock_usage", db_lock_usage)
+    admit_pod(pod, write, running=True)
+    return locked
+
+def test_admit_pod_locks_then_writes(monkeypatch):
+    pod = make_pod()
+    store = FakeStore()
+    assert admit(monkeypatch, pod, store, {TENANT_USAGE: usage(running_pods=1)}, write="merge") == [[TENANT_USAGE, "testuser"]]
+    assert store.session.written == [("merge", pod)]
+    assert store.committed
+
+def test_admit_pod_over_quota_doesnt_write(monkeypatch):
+    pod = make_pod()
+    store = FakeStore()
+    with pytest.raises(ResourceError):
+        admit(monkeypatch, pod, store, {"testuser": usage(cpu=4000)})
+    assert store.session.written == []
+    assert not store.committed
+
+def test_pod_without_creator_only_counts_for_tenant(monkeypatch):
+    monkeypatch.setattr(quotas, "conf", {"user_quotas": {"tacc.None": {"max_cpu": "1"}}})
+    assert [scope for scope, _, _ in quotas.quota_scopes(make_pod(creator=None))] == ["tenant"]
+    check_quota(make_pod(creator=None), running=True, usage={})
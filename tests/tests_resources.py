@@ -0,0 +1,107 @@
+import sys
+
+import pytest
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+import resources
+from resources import parse_memory, parse_cpu, resolve_resources, check_max_pod_resources
+
+
+@pytest.mark.parametrize("quantity, expected", [
+    ("4G", 4 * 1000 ** 3),
+    ("512Mi", 512 * 1024 ** 2),
+    ("1Ki", 1024),
+    ("1k", 1000),
+    ("123", 123),
+    (0, 0),
+    ("0.5Gi", 1024 ** 3 // 2),
+    (".5Ki", 512),
+    ("129e6", 129 * 1000 ** 2),
+    ("129E6", 129 * 1000 ** 2),
+    ("1E", 1000 ** 6),
+    ("1Pi", 1024 ** 5),
+    # Fractions of a byte round up, like k8.
+    ("400m", 1),
+    ("1500m", 2),
+    ("1e-3", 1),
+])
+def test_parse_memory(quantity, expected):
+    assert parse_memory(quantity) == expected
+
+@pytest.mark.parametrize("quantity", ["4g", "4GB", "Mi", "-1G", "1.5.3", "", "1e", None])
+def test_parse_memory_invalid(quantity):
+    with pytest.raises(ValueError):
+        parse_memory(quantity)
+
+@pytest.mark.parametrize("millicpus, expected", [("500", 500), ("500m", 500), (" 250 ", 250), (1000, 1000)])
+def test_parse_cpu(millicpus, expected):
+    assert parse_cpu(millicpus) == expected
+
+@pytest.mark.parametrize("millicpus", ["0.5", "1.5m", "abc", "m", "500mm", "-1"])
+def test_parse_cpu_invalid(millicpus):
+    with pytest.raises(ValueError):
+        parse_cpu(millicpus)
+
+
+def test_resolve_named_profile():
+    assert resolve_resources("small") == resources.DEFAULT_RESOURCE_PROFILES["small"]
+
+def test_resolve_named_profile_ignores_resources():
+    assert resolve_resources("small", {"mem_limit": "64G"}) == resources.DEFAULT_RESOURCE_PROFILES["small"]
+
+def test_resolve_unknown_profile():
+    with pytest.raises(ValueError, match="resource_profile must be one of"):
+        resolve_resources("huge")
+
+def test_resolve_custom_profile():
+    custom = {"mem_request": "1Gi", "cpu_request": "250m", "mem_limit": "2Gi", "cpu_limit": 1000}
+    assert resolve_resources("custom", custom) == {"mem_request": "1Gi", "cpu_request": "250",
+                                                   "mem_limit": "2Gi", "cpu_limit": "1000"}
+
+def test_resolve_custom_profile_requires_resources():
+    with pytest.raises(ValueError, match="Missing"):
+        resolve_resources("custom", {"mem_request": "1G", "mem_limit": "2G"})
+
+def test_resolve_request_over_limit():
+    with pytest.raises(ValueError, match="mem_request"):
+        resolve_resources("custom", {"mem_request": "2Gi", "cpu_request": "250", "mem_limit": "2G", "cpu_limit": "1000"})
+    with pytest.raises(ValueError, match="cpu_request"):
+        resolve_resources("custom", {"mem_request": "1G", "cpu_request": "2000", "mem_limit": "2G", "cpu_limit": "1000"})
+
+def test_resolve_pvc_storage():
+    assert resolve_resources("small", persistent_volume=True)["pvc_storage"] == resources.DEFAULT_PVC_STORAGE
+    assert resolve_resources("small", {"pvc_storage": "50Gi"}, persistent_volume=True)["pvc_storage"] == "50Gi"
+    # Only pods with a persistent_volume get a pvc.
+    assert "pvc_storage" not in resolve_resources("small", {"pvc_storage": "50Gi"})
+    with pytest.raises(ValueError):
+        resolve_resources("small", {"pvc_storage": "lots"}, persistent_volume=True)
+
+
+def test_check_max_pod_resources(monkeypatch):
+    monkeypatch.setattr(resources, "conf", {"max_pod_resources": {"mem_limit": "16G", "cpu_limit": "8000"},
+                                            "tenant_max_pod_resources": {"big": {"mem_limit": "64Gi"}}})
+    check_max_pod_resources({"mem_limit": "16G", "cpu_limit": "8000m"}, "tacc")
+    with pytest.raises(ValueError, match="mem_limit 16Gi is over the max of 16G"):
+        check_max_pod_resources({"mem_limit": "16Gi", "cpu_limit": "1000"}, "tacc")
+    with pytest.raises(ValueError, match="cpu_limit"):
+        check_max_pod_resources({"mem_limit": "1G", "cpu_limit": "8001"}, "tacc")
+    # Tenant override only replaces the keys it sets.
+    check_max_pod_resources({"mem_limit": "64Gi", "cpu_limit": "8000"}, "big")
+    with pytest.raises(ValueError, match="cpu_limit"):
+        check_max_pod_resources({"mem_limit": "1G", "cpu_limit": "9000"}, "big")
+
+
+def test_status_assignment_keeps_admitted_resources(monkeypatch):
+    # Pod validates on assignment, health/spawner/ttl status updates must not re-resolve resources.
+    from models import Pod
+    admitted = dict(resources.DEFAULT_RESOURCE_PROFILES["small"])
+    pod = Pod.construct(pod_id="resourcestest", pod_template="neo4j", tenant_id="dev", site_id="tacc",
+                        resource_profile="small", resources=dict(admitted), persistent_volume={})
+    # Profile and max pod size changed since the pod was admitted.
+    monkeypatch.setitem(resources.RESOURCE_PROFILES, "small", {"mem_request": "1G", "cpu_request": "500",
+                                                               "mem_limit": "2G", "cpu_limit": "2000"})
+    monkeypatch.setattr(resources, "conf", {"max_pod_resources": {"mem_limit": "512M", "cpu_limit": "500"}})
+    pod.status = "RUNNING"
+    assert pod.resources == admitted
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+import api_pods_podid_func
+import health
+from codes import ON, RUNNING, REQUESTED
+
+
+class FakePod(SimpleNamespace):
+    def db_update(self):
+        self.updates += 1
+
+    def display(self):
+        return vars(self)
+
+
+class FakeChannel():
+    sent = []
+
+    def __init__(self, name):
+        pass
+
+    def put_cmd(self, **cmd):
+        FakeChannel.sent.append(cmd)
+
+    def close(self):
+        pass
+
+
+def running_k8_pod(pod, revision):
+    """get_current_k8_pods entry for pod's old k8 pod, still running and ready."""
+    container_status = SimpleNamespace(state=SimpleNamespace(waiting=None, terminated=None, running=True), ready=True)
+    pod_info = SimpleNamespace(metadata=SimpleNamespace(labels={"app": pod.k8_name, "revision": str(revision)}, annotations={}),
+                               status=SimpleNamespace(phase="Running", start_time=None, container_statuses=[container_status]))
+    return {"pod_info": pod_info, "k8_name": pod.k8_name, "site_id": pod.site_id,
+            "tenant_id": pod.tenant_id, "pod_id": pod.pod_id}
+
+
+def test_health_tick_before_spawner_keeps_in_place_restart(monkeypatch):
+    pod = FakePod(pod_id="restarttest", site_id="tacc", tenant_id="tacc", k8_name="pods-tacc-tacc-restarttest",
+                  status=RUNNING, status_requested=ON, revision=1, updates=0)
+    monkeypatch.setattr(api_pods_podid_func.Pod, "db_get_with_pk", lambda *args, **kwargs: pod)
+    monkeypatch.setattr(health.Pod, "db_get_with_pk", lambda *args, **kwargs: pod)
+    monkeypatch.setattr(api_pods_podid_func, "CommandChannel", FakeChannel)
+    monkeypatch.setattr(api_pods_podid_func, "ok", lambda result, msg: result)
+
+    asyncio.run(api_pods_podid_func.restart_pod(pod.pod_id))
+    assert FakeChannel.sent[-1]["command"] == "restart"
+    assert pod.status == REQUESTED
+    assert pod.revision == 2
+    updates = pod.updates
+
+    # Health tick while the old k8 pod is still up, before spawner has run.
+    health.check_k8_pods([running_k8_pod(pod, revision=1)])
+
+    # Pod is still REQUESTED, so spawner will process the restart command.
+    assert pod.status == REQUESTED
+    assert pod.updates == updates
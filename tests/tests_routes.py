@@ -0,0 +1,60 @@
+import sys
+import time
+from types import SimpleNamespace
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+import routes
+from events import PodEventNotifier
+
+
+class FakeNotifier(PodEventNotifier):
+    def start(self):
+        pass
+
+
+def make_table(monkeypatch, ttl=60, debounce=0.2):
+    notifier = FakeNotifier("tacc")
+    monkeypatch.setattr(routes, "get_pod_event_notifier", lambda site_id: notifier)
+    table = routes.RouteTable("tacc", ttl=ttl, debounce=debounce)
+    table.builds = 0
+    def get_site_pods():
+        table.builds += 1
+        return []
+    monkeypatch.setattr(table, "get_site_pods", get_site_pods)
+    monkeypatch.setattr(routes, "render_traefik_template", lambda *proxy_info, shard=False: str(proxy_info))
+    return table, notifier
+
+
+def test_get_serves_background_build(monkeypatch):
+    table, _ = make_table(monkeypatch)
+    assert "base" in table.get()
+    assert table.builds == 1
+
+def test_burst_of_events_is_one_rebuild(monkeypatch):
+    table, notifier = make_table(monkeypatch)
+    table.get()
+    for _ in range(5):
+        notifier.bump_version()
+        time.sleep(0.01)
+    time.sleep(0.5)
+    assert table.builds == 2
+
+def test_failed_rebuild_raises(monkeypatch):
+    table, _ = make_table(monkeypatch)
+    def get_site_pods():
+        raise ConnectionError("database down")
+    monkeypatch.setattr(table, "get_site_pods", get_site_pods)
+    try:
+        table.get()
+        assert False, "expected the rebuild error"
+    except ConnectionError:
+        pass
+
+def test_stop_start_keeps_proxy_info():
+    pod = SimpleNamespace(k8_name="pods-tacc-tacc-pod", routing_port=5000, url="pod.tacc", server_protocol="http",
+                          keep_service_on_stop=True, status="RUNNING")
+    running = routes.pod_proxy_info([pod])
+    pod.status = "STOPPED"
+    assert routes.pod_proxy_info([pod]) == running
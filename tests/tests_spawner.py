@@ -0,0 +1,70 @@
+import sys
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+from spawner import PendingCommands
+
+
+def make_cmd(command, pod_id="pod", **kwargs):
+    return {"command": command, "site_id": "tacc", "tenant_id": "tacc", "pod_id": pod_id, **kwargs}
+
+def key(pod_id="pod"):
+    return ("tacc", "tacc", pod_id)
+
+
+def test_first_command_schedules_pod():
+    pending = PendingCommands()
+    assert pending.add(make_cmd("start"), {}) is True
+    assert pending.take(key())['cmd']["command"] == "start"
+    assert pending.take(key()) is None
+
+def test_later_command_coalesces_pending_one():
+    pending = PendingCommands()
+    assert pending.add(make_cmd("start"), {"traceparent": "first"}) is True
+    assert pending.add(make_cmd("restart"), {"traceparent": "second"}) is False
+    entry = pending.take(key())
+    assert entry['cmd']["command"] == "restart"
+    assert entry['headers'] == {"traceparent": "second"}
+    assert entry['coalesced'] == 1
+
+def test_pods_are_coalesced_separately():
+    pending = PendingCommands()
+    assert pending.add(make_cmd("start", pod_id="one"), {}) is True
+    assert pending.add(make_cmd("start", pod_id="two"), {}) is True
+    assert pending.take(key("one"))['coalesced'] == 0
+    assert pending.take(key("two"))['coalesced'] == 0
+
+def test_start_keeps_pending_restart():
+    pending = PendingCommands()
+    pending.add(make_cmd("restart"), {})
+    pending.add(make_cmd("start", attempt=2), {})
+    cmd = pending.take(key())['cmd']
+    assert cmd["command"] == "restart"
+    assert cmd["attempt"] == 2
+
+def test_start_without_command_keeps_pending_restart():
+    # Commands without a "command" are starts.
+    pending = PendingCommands()
+    pending.add(make_cmd("restart"), {})
+    pending.add({"site_id": "tacc", "tenant_id": "tacc", "pod_id": "pod"}, {})
+    assert pending.take(key())['cmd']["command"] == "restart"
+
+def test_restart_supersedes_pending_start():
+    pending = PendingCommands()
+    pending.add(make_cmd("start"), {})
+    pending.add(make_cmd("restart"), {})
+    pending.add(make_cmd("start"), {})
+    assert pending.take(key())['cmd']["command"] == "restart"
+
+def test_command_for_active_pod_waits_for_done():
+    pending = PendingCommands()
+    pending.add(make_cmd("start"), {})
+    pending.take(key())
+    # Pod is being processed, the new command isn't scheduled now.
+    assert pending.add(make_cmd("restart"), {}) is False
+    # done() reschedules it instead.
+    assert pending.done(key()) is True
+    assert pending.take(key())['cmd']["command"] == "restart"
+    assert pending.done(key()) is False
+    assert pending.active == set()
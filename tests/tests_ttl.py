@@ -0,0 +1,82 @@
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Allows us to import pods' modules.
+sys.path.append('/home/tapis/service')
+
+from codes import ON, OFF
+from ttl import TTLScheduler
+
+
+def make_pod(pod_id, seconds, status_requested=ON):
+    return SimpleNamespace(site_id="tacc", tenant_id="tacc", pod_id=pod_id,
+                           status_requested=status_requested,
+                           time_to_stop_ts=datetime.utcnow() + timedelta(seconds=seconds))
+
+def key(pod_id):
+    return ("tacc", "tacc", pod_id)
+
+
+def test_pop_due_returns_due_pods():
+    ttl = TTLScheduler()
+    ttl.schedule(make_pod("due", -5))
+    assert ttl.pop_due() == [key("due")]
+    assert ttl.scheduled == {}
+
+def test_reschedule_invalidates_earlier_entry():
+    ttl = TTLScheduler()
+    ttl.schedule(make_pod("pod", -5))
+    ttl.schedule(make_pod("pod", 0.3))
+    # Both entries are in the heap, only the later one is live.
+    assert len(ttl.heap) == 2
+    start = time.monotonic()
+    assert ttl.pop_due() == [key("pod")]
+    assert time.monotonic() - start >= 0.2
+    assert ttl.scheduled == {}
+
+def test_schedule_same_ts_is_noop():
+    ttl = TTLScheduler()
+    pod = make_pod("pod", 60)
+    ttl.schedule(pod)
+    ttl.schedule(pod)
+    assert len(ttl.heap) == 1
+
+def test_stopped_pod_is_unscheduled():
+    ttl = TTLScheduler()
+    pod = make_pod("stopped", -5)
+    ttl.schedule(pod)
+    pod.status_requested = OFF
+    ttl.schedule(pod)
+    ttl.schedule(make_pod("other", 0.1))
+    # Invalidated entry is dropped, not returned.
+    assert ttl.pop_due() == [key("other")]
+
+def test_sync_unschedules_missing_pods():
+    ttl = TTLScheduler()
+    ttl.schedule(make_pod("gone", -5))
+    kept = make_pod("kept", -5)
+    ttl.sync([kept])
+    assert set(ttl.scheduled) == {key("kept")}
+    assert ttl.pop_due() == [key("kept")]
+
+def test_batch_size_limits_due():
+    ttl = TTLScheduler(batch_size=2)
+    for i in range(3):
+        ttl.schedule(make_pod(f"pod{i}", -5 + i * 0.001))
+    assert len(ttl.pop_due()) == 2
+    assert len(ttl.pop_due()) == 1
+
+def test_earlier_pod_wakes_waiting_scheduler():
+    ttl = TTLScheduler()
+    ttl.schedule(make_pod("later", 3600))
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(ttl.pop_due()), daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    ttl.schedule(make_pod("sooner", -1))
+    waiter.join(timeout=2)
+    assert result == [[key("sooner")]]
+    assert ttl.next_expiration() is not None